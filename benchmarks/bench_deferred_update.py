@@ -0,0 +1,117 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 3
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# Compare rebuild time of node trees that are in use (materials and worlds used by objects and scenes, node groups
+# used by modifiers and materials), with and without the deferred update option of generated scripts. Usage:
+#   blender -b file.blend --python benchmarks/bench_deferred_update.py -- [--repeat N] [--json FILE]
+# Without deferred update, the nodes of a material or world are re-created in place (the script's function is called
+# with the material or world), while node groups are re-created as a new node group that is not used (so its users are
+# not updated). With deferred update, nodes are created in a datablock that is not used, which then replaces the old
+# datablock in all its users. Each rebuild is timed until the dependency graph is evaluated again, so the time includes
+# the updates of users. Scripts are run in the loaded file (not saved).
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import bpy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from material2python.code_sink import StringSink
+from material2python.mat2py import (create_code_text, OUTPUT_STYLE_UNROLLED, LOC_DEC_PLACES_UNI_NODE_OPT,
+    WRITE_DEFAULTS_UNI_NODE_OPT, WRITE_LINKED_DEFAULTS_UNI_NODE_OPT, WRITE_ATTR_NAME_UNI_NODE_OPT,
+    WRITE_ATTR_WIDTH_HEIGHT_UNI_NODE_OPT, WRITE_ATTR_SELECT_UNI_NODE_OPT)
+
+UNI_NODE_OPTIONS = {
+    LOC_DEC_PLACES_UNI_NODE_OPT: 0,
+    WRITE_DEFAULTS_UNI_NODE_OPT: False,
+    WRITE_LINKED_DEFAULTS_UNI_NODE_OPT: False,
+    WRITE_ATTR_NAME_UNI_NODE_OPT: True,
+    WRITE_ATTR_WIDTH_HEIGHT_UNI_NODE_OPT: True,
+    WRITE_ATTR_SELECT_UNI_NODE_OPT: False,
+}
+
+# get (data collection name, datablock name) of the trees in use
+def get_bench_trees():
+    trees = [("materials", mat.name) for mat in bpy.data.materials if mat.users > 0 and mat.use_nodes and
+             mat.node_tree != None]
+    trees.extend([("worlds", world.name) for world in bpy.data.worlds if world.users > 0 and world.use_nodes and
+                  world.node_tree != None])
+    trees.extend([("node_groups", ng.name) for ng in bpy.data.node_groups if ng.users > 0])
+    return trees
+
+def get_tree_and_owner(data_collection, name):
+    owner = getattr(bpy.data, data_collection)[name]
+    if data_collection == "node_groups":
+        return owner, owner
+    return owner.node_tree, owner
+
+# run the function of the script that re-creates the tree, and evaluate the dependency graph, returns time taken
+def time_rebuild(code_obj, data_collection, name):
+    script_globals = {}
+    exec(code_obj, script_globals)
+    start_time = time.perf_counter()
+    if data_collection == "node_groups":
+        new_node_group = script_globals["add_group_nodes"](name)
+    else:
+        script_globals["add_shader_nodes"](getattr(bpy.data, data_collection)[name])
+    bpy.context.view_layer.update()
+    rebuild_time = time.perf_counter() - start_time
+    # node group re-created without deferred update is not used, remove it
+    if data_collection == "node_groups" and new_node_group.name != name:
+        bpy.data.node_groups.remove(new_node_group)
+    return rebuild_time
+
+def bench_tree(data_collection, name, repeat):
+    node_tree, tree_owner = get_tree_and_owner(data_collection, name)
+    result = { "type": data_collection, "name": name, "nodes": len(node_tree.nodes), "links": len(node_tree.links),
+               "users": tree_owner.users }
+    for deferred_update in (False, True):
+        code = create_code_text(node_tree, tree_owner, 4, False, True, True, False, UNI_NODE_OPTIONS,
+                                sink=StringSink(), output_style=OUTPUT_STYLE_UNROLLED, call_function=False,
+                                deferred_update=deferred_update)
+        code_obj = compile(code, "<m2p deferred_update=%s>" % deferred_update, "exec")
+        result["deferred" if deferred_update else "immediate"] = min([time_rebuild(code_obj, data_collection, name)
+                                                                     for _ in range(repeat)])
+        # datablock was replaced by deferred update
+        node_tree, tree_owner = get_tree_and_owner(data_collection, name)
+    return result
+
+def main(argv=None):
+    if argv == None:
+        argv = sys.argv[sys.argv.index("--")+1:] if "--" in sys.argv else []
+    parser = argparse.ArgumentParser(prog="bench_deferred_update")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of rebuilds per tree, best time is kept")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args(argv)
+
+    results = [bench_tree(data_collection, name, args.repeat) for data_collection, name in get_bench_trees()]
+    print("%-11s %-32s %6s %6s %5s | %12s %12s %7s" % ("type", "tree", "nodes", "links", "users", "immediate",
+                                                       "deferred", "speedup"))
+    for r in results:
+        print("%-11s %-32s %6d %6d %5d | %10.1fms %10.1fms %6.2fx" % (r["type"], r["name"][:32], r["nodes"],
+            r["links"], r["users"], r["immediate"]*1000, r["deferred"]*1000, r["immediate"] / max(r["deferred"],
+            1e-9)))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=1)
+
+if __name__ == "__main__":
+    main()
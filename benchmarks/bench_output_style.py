@@ -0,0 +1,104 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 3
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# Compare output styles (unrolled, compact) of generated scripts: file size, parse+compile time, and exec time of
+# the script that re-creates each material and node group of a .blend file. Usage:
+#   blender -b file.blend --python benchmarks/bench_output_style.py -- [--repeat N] [--json FILE]
+# Scripts are run in the loaded file (not saved), datablocks created by each script are removed after timing.
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import bpy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from material2python.code_sink import StringSink
+from material2python.mat2py import (create_code_text, OUTPUT_STYLE_UNROLLED, OUTPUT_STYLE_COMPACT,
+    LOC_DEC_PLACES_UNI_NODE_OPT, WRITE_DEFAULTS_UNI_NODE_OPT, WRITE_LINKED_DEFAULTS_UNI_NODE_OPT,
+    WRITE_ATTR_NAME_UNI_NODE_OPT, WRITE_ATTR_WIDTH_HEIGHT_UNI_NODE_OPT, WRITE_ATTR_SELECT_UNI_NODE_OPT)
+
+OUTPUT_STYLES = [OUTPUT_STYLE_UNROLLED, OUTPUT_STYLE_COMPACT]
+
+UNI_NODE_OPTIONS = {
+    LOC_DEC_PLACES_UNI_NODE_OPT: 0,
+    WRITE_DEFAULTS_UNI_NODE_OPT: False,
+    WRITE_LINKED_DEFAULTS_UNI_NODE_OPT: False,
+    WRITE_ATTR_NAME_UNI_NODE_OPT: True,
+    WRITE_ATTR_WIDTH_HEIGHT_UNI_NODE_OPT: True,
+    WRITE_ATTR_SELECT_UNI_NODE_OPT: False,
+}
+
+def get_bench_trees():
+    trees = [(mat.node_tree, mat) for mat in bpy.data.materials if mat.use_nodes and mat.node_tree != None]
+    trees.extend([(ng, ng) for ng in bpy.data.node_groups])
+    return trees
+
+# run the script, and remove the materials and node groups it created, returns exec time
+def time_exec(code_obj):
+    old_materials = set(bpy.data.materials[:])
+    old_node_groups = set(bpy.data.node_groups[:])
+    start_time = time.perf_counter()
+    exec(code_obj, {})
+    exec_time = time.perf_counter() - start_time
+    for mat in [m for m in bpy.data.materials if m not in old_materials]:
+        bpy.data.materials.remove(mat)
+    for ng in [g for g in bpy.data.node_groups if g not in old_node_groups]:
+        bpy.data.node_groups.remove(ng)
+    return exec_time
+
+def bench_tree(node_tree, tree_owner, repeat):
+    result = { "name": tree_owner.name, "nodes": len(node_tree.nodes), "links": len(node_tree.links) }
+    for style in OUTPUT_STYLES:
+        code = create_code_text(node_tree, tree_owner, 4, False, True, True, False, UNI_NODE_OPTIONS,
+                                sink=StringSink(), output_style=style)
+        compile_times = []
+        exec_times = []
+        for _ in range(repeat):
+            start_time = time.perf_counter()
+            code_obj = compile(code, "<m2p " + style + ">", "exec")
+            compile_times.append(time.perf_counter() - start_time)
+            exec_times.append(time_exec(code_obj))
+        result[style] = { "bytes": len(code.encode()), "lines": code.count("\n"), "compile_time": min(compile_times),
+                          "exec_time": min(exec_times) }
+    return result
+
+def main(argv=None):
+    if argv == None:
+        argv = sys.argv[sys.argv.index("--")+1:] if "--" in sys.argv else []
+    parser = argparse.ArgumentParser(prog="bench_output_style")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs per script, best time is kept")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args(argv)
+
+    results = [bench_tree(node_tree, tree_owner, args.repeat) for node_tree, tree_owner in get_bench_trees()]
+    print("%-32s %6s %6s | %-28s | %-28s" % ("tree", "nodes", "links", "unrolled bytes/compile/exec",
+                                            "compact bytes/compile/exec"))
+    for r in results:
+        print("%-32s %6d %6d | %9d %7.1fms %7.1fms | %9d %7.1fms %7.1fms" % (r["name"][:32], r["nodes"], r["links"],
+            r[OUTPUT_STYLE_UNROLLED]["bytes"], r[OUTPUT_STYLE_UNROLLED]["compile_time"]*1000,
+            r[OUTPUT_STYLE_UNROLLED]["exec_time"]*1000, r[OUTPUT_STYLE_COMPACT]["bytes"],
+            r[OUTPUT_STYLE_COMPACT]["compile_time"]*1000, r[OUTPUT_STYLE_COMPACT]["exec_time"]*1000))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 3
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# Value serializer microbenchmarks, runs with plain Python (no Blender needed) by using the fake 'bpy' layer in
+# fake_bpy.py. Usage:
+#   python benchmarks/bench_values.py [--count N] [--repeat N] [--json FILE]
+# For each kind of value (float, int, bool, string, enum set, Vector, Color, datablock reference, ...) times
+# bpy_value_to_string, i.e. capture (snapshot.capture_value) and formatting (codegen.format_value), and compares the
+# time per value with the isinstance/hasattr chain serializer that was used before the type-dispatch registry (kept
+# below as legacy_value_to_string).
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import fake_bpy
+bpy = fake_bpy.install()
+from mathutils import Color, Vector
+
+from material2python.mat2py import bpy_value_to_string
+from material2python.tree_ir import IDRef
+
+RESULTS_FORMAT_VERSION = 1
+
+# datablock types known to the legacy serializer, and the bpy.data collection of each type
+LEGACY_ID_TYPE_COLLECTIONS = {}
+for type_name, collection_name in [("Image", "images"), ("Mask", "masks"), ("Scene", "scenes"),
+                                   ("Material", "materials"), ("Object", "objects"), ("Collection", "collections"),
+                                   ("GeometryNodeTree", "node_groups"), ("ShaderNodeTree", "node_groups"),
+                                   ("Text", "texts")]:
+    if hasattr(bpy.types, type_name):
+        LEGACY_ID_TYPE_COLLECTIONS[getattr(bpy.types, type_name)] = collection_name
+
+def legacy_capture_value(value):
+    if isinstance(value, (str, bool, int, float)):
+        return value
+    elif hasattr(value, '__len__'):
+        if isinstance(value, set):
+            return set(value)
+        return tuple([legacy_capture_value(value[val_index]) for val_index in range(len(value))])
+    elif hasattr(value, 'name'):
+        collection_name = LEGACY_ID_TYPE_COLLECTIONS.get(type(value))
+        if collection_name != None:
+            return IDRef(collection_name, value.name)
+    return None
+
+def legacy_format_value(value):
+    if isinstance(value, str):
+        return "\"%s\"" % value
+    elif isinstance(value, bool):
+        return "%s" % value
+    elif isinstance(value, int):
+        return "%d" % value
+    elif isinstance(value, float):
+        return "%f" % value
+    elif isinstance(value, set):
+        return "{" + ", ".join(["\"" + item + "\"" if isinstance(item, str) else str(item) for item in value]) + "}"
+    elif isinstance(value, tuple):
+        return "(" + ", ".join(["\"" + item + "\"" if isinstance(item, str) else str(item) for item in value]) + ")"
+    elif isinstance(value, IDRef):
+        return "bpy.data." + value.collection + ".get(\"" + value.name + "\")"
+    return None
+
+def legacy_value_to_string(value):
+    return legacy_format_value(legacy_capture_value(value))
+
+# get sample values of each kind, (kind name, list of 'count' values)
+def get_value_kinds(count):
+    image = bpy.data.images.new("Image")
+    material = bpy.data.materials.new("Material")
+    node_group = bpy.data.node_groups.new("Group", "GeometryNodeTree")
+    return [
+        ("float", [i * 0.125 for i in range(count)]),
+        ("int", list(range(count))),
+        ("bool", [i % 2 == 0 for i in range(count)]),
+        ("string", ["MULTIPLY_%d" % i for i in range(count)]),
+        ("enum_set", [{"X", "Y"} for _ in range(count)]),
+        ("vector", [Vector((i * 0.5, 1.0, -2.0)) for i in range(count)]),
+        ("color", [Color((0.1, 0.2, i * 0.001)) for i in range(count)]),
+        ("float_tuple", [(0.25, 0.5, 0.75, 1.0) for _ in range(count)]),
+        ("id_image", [image] * count),
+        ("id_material", [material] * count),
+        ("id_node_group", [node_group] * count),
+        ("none", [None] * count),
+    ]
+
+# run func on all values 'repeat' times, returns best time per value in nanoseconds
+def time_per_value(func, values, repeat):
+    best_time = None
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        for value in values:
+            func(value)
+        elapsed = time.perf_counter() - start_time
+        if best_time == None or elapsed < best_time:
+            best_time = elapsed
+    return best_time * 1000000000.0 / len(values)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="bench_values", description="Benchmark value serializer, per kind of value")
+    parser.add_argument("--count", type=int, default=20000, help="Number of values of each kind")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of timed runs per kind, best time is kept")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args(argv)
+
+    results = {
+        "format_version": RESULTS_FORMAT_VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "count": args.count,
+        "repeat": args.repeat,
+        "results": [],
+    }
+    print("%-14s %12s %12s %8s" % ("kind", "legacy ns", "ns", "speedup"))
+    for kind_name, values in get_value_kinds(args.count):
+        legacy_time = time_per_value(legacy_value_to_string, values, args.repeat)
+        new_time = time_per_value(bpy_value_to_string, values, args.repeat)
+        print("%-14s %12.1f %12.1f %7.2fx" % (kind_name, legacy_time, new_time, legacy_time / new_time))
+        results["results"].append({ "kind": kind_name, "legacy_ns": legacy_time, "ns": new_time })
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=1)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,954 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 3
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# Lightweight stand-in for the parts of 'bpy' and 'mathutils' used by the material2python addon, so that export
+# code can be driven (and generated scripts can be executed) on a machine without Blender installed.
+# Only the behaviour needed by the addon is modelled, e.g. RNA property definitions, node/socket/link collections,
+# Color Ramps, Curve Mappings, node group interfaces, and text-blocks.
+
+import sys
+import types
+from array import array
+
+BLENDER_VERSION = (3, 3, 0)
+
+FLOAT_MAX = 340282346638528859811704183484516925440.0
+
+########################################
+# mathutils
+########################################
+
+class Vector(tuple):
+    def __new__(cls, seq=(0.0, 0.0, 0.0)):
+        return tuple.__new__(cls, [float(v) for v in seq])
+
+    x = property(lambda self: self[0])
+    y = property(lambda self: self[1])
+    z = property(lambda self: self[2])
+
+class Color(tuple):
+    def __new__(cls, seq=(0.0, 0.0, 0.0)):
+        return tuple.__new__(cls, [float(v) for v in seq])
+
+    r = property(lambda self: self[0])
+    g = property(lambda self: self[1])
+    b = property(lambda self: self[2])
+
+########################################
+# RNA definitions
+########################################
+
+class RNAProperty:
+    def __init__(self, identifier, prop_type, fixed_type=None, is_readonly=False, array_length=0,
+                 is_enum_flag=False):
+        self.identifier = identifier
+        self.type = prop_type
+        self.fixed_type = fixed_type
+        self.is_readonly = is_readonly
+        self.array_length = array_length
+        self.is_enum_flag = is_enum_flag
+
+class RNAStruct:
+    def __init__(self, identifier, base=None, properties=()):
+        self.identifier = identifier
+        self.base = base
+        self.properties = RNACollection(properties)
+
+class RNACollection(list):
+    def get(self, key, default=None):
+        for item in self:
+            if item.identifier == key:
+                return item
+        return default
+
+    def keys(self):
+        return [item.identifier for item in self]
+
+# flat array helper, shared by foreach_get/foreach_set of collections
+def flatten_values(items, attr):
+    out = []
+    for item in items:
+        v = getattr(item, attr)
+        if isinstance(v, (tuple, list)):
+            out.extend(v)
+        else:
+            out.append(v)
+    return out
+
+class PropCollection(list):
+    def get(self, key, default=None):
+        for item in self:
+            if getattr(item, "name", None) == key:
+                return item
+        return default
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            item = self.get(key)
+            if item is None:
+                raise KeyError("bpy_prop_collection[key]: key \"%s\" not found" % key)
+            return item
+        return list.__getitem__(self, key)
+
+    def keys(self):
+        return [item.name for item in self]
+
+    def values(self):
+        return list(self)
+
+    def foreach_get(self, attr, seq):
+        values = flatten_values(self, attr)
+        if len(values) != len(seq):
+            raise RuntimeError("internal error setting the array")
+        for i, v in enumerate(values):
+            seq[i] = v
+
+    def foreach_set(self, attr, seq):
+        seq = list(seq)
+        if len(self) == 0:
+            return
+        current = getattr(self[0], attr)
+        width = len(current) if isinstance(current, (tuple, list)) else 1
+        if len(seq) != width * len(self):
+            raise RuntimeError("internal error setting the array")
+        for i, item in enumerate(self):
+            if width == 1:
+                setattr(item, attr, type(current)(seq[i]))
+            else:
+                setattr(item, attr, type(current)(seq[i*width:(i+1)*width]))
+
+class bpy_struct:
+    bl_rna = RNAStruct("bpy_struct")
+
+    def as_pointer(self):
+        return id(self)
+
+########################################
+# ID datablocks
+########################################
+
+class ID(bpy_struct):
+    bl_rna = RNAStruct("ID")
+
+    def __init__(self, name=""):
+        self.name = name
+        self.users = 0
+        self.use_fake_user = False
+
+    def user_remap(self, new_id):
+        for coll in all_id_collections():
+            for block in coll:
+                for attr, value in list(vars(block).items()):
+                    if value is self:
+                        setattr(block, attr, new_id)
+        for tree in all_node_trees():
+            for node in tree.nodes:
+                for attr, value in list(vars(node).items()):
+                    if value is self:
+                        setattr(node, attr, new_id)
+
+    def copy(self):
+        raise NotImplementedError
+
+def make_id_type(name, base=ID):
+    cls = type(name, (base,), {})
+    cls.bl_rna = RNAStruct(name, base.bl_rna)
+    return cls
+
+Image = make_id_type("Image")
+Mask = make_id_type("Mask")
+Object = make_id_type("Object")
+Collection = make_id_type("Collection")
+Text = make_id_type("Text")
+Texture = make_id_type("Texture")
+MovieClip = make_id_type("MovieClip")
+Library = make_id_type("Library")
+
+class TextBlock(Text):
+    bl_rna = Text.bl_rna
+
+    def __init__(self, name=""):
+        Text.__init__(self, name)
+        self.lines_list = [""]
+        self.current_line_index = 0
+        self.write_calls = 0
+
+    def write(self, s):
+        self.write_calls = self.write_calls + 1
+        lines = s.split("\n")
+        self.lines_list[-1] = self.lines_list[-1] + lines[0]
+        self.lines_list.extend(lines[1:])
+
+    def from_string(self, s):
+        self.lines_list = s.split("\n")
+
+    def as_string(self):
+        return "\n".join(self.lines_list)
+
+    def clear(self):
+        self.lines_list = [""]
+
+    def cursor_set(self, line, character=0, select=False):
+        self.current_line_index = line
+
+    @property
+    def lines(self):
+        return self.lines_list
+
+########################################
+# nodes, sockets, links
+########################################
+
+class NodeSocket(bpy_struct):
+    bl_rna = RNAStruct("NodeSocket")
+
+    def __init__(self, node, bl_idname, name, identifier, default=None, is_output=False):
+        self.node = node
+        self.bl_idname = bl_idname
+        self.name = name
+        self.identifier = identifier
+        self.is_output = is_output
+        self.hide = False
+        self.hide_value = False
+        self.enabled = True
+        self.link_count = 0
+        if default is not None:
+            self.default_value = default
+
+    @property
+    def is_linked(self):
+        return self.link_count > 0
+
+    @property
+    def links(self):
+        tree = self.node.id_data
+        return [l for l in tree.links if l.from_socket is self or l.to_socket is self]
+
+class NodeSocketInterface(bpy_struct):
+    bl_rna = RNAStruct("NodeSocketInterface")
+
+    def __init__(self, bl_socket_idname, name):
+        self.bl_socket_idname = bl_socket_idname
+        self.name = name
+        self.identifier = name
+        self.hide_value = False
+        default = SOCKET_DEFAULTS.get(bl_socket_idname)
+        if default is not None:
+            self.default_value = default
+            if isinstance(default, float) or (isinstance(default, tuple) and bl_socket_idname != 'NodeSocketColor'):
+                self.min_value = -FLOAT_MAX
+                self.max_value = FLOAT_MAX
+        self.attribute_domain = "POINT"
+        self.default_attribute_name = ""
+
+class InterfaceCollection(PropCollection):
+    def new(self, type, name):
+        item = NodeSocketInterface(type, name)
+        self.append(item)
+        return item
+
+    def clear(self):
+        del self[:]
+
+    def remove(self, item):
+        list.remove(self, item)
+
+class NodeLink(bpy_struct):
+    bl_rna = RNAStruct("NodeLink")
+
+    def __init__(self, from_socket, to_socket):
+        self.from_socket = from_socket
+        self.to_socket = to_socket
+        self.from_node = from_socket.node
+        self.to_node = to_socket.node
+        self.is_valid = True
+        self.is_muted = False
+
+class LinkCollection(PropCollection):
+    def __init__(self, tree):
+        PropCollection.__init__(self)
+        self.tree = tree
+
+    def new(self, input, output, verify_limits=True):
+        # remove existing link into same (single input) socket
+        if output.link_count > 0:
+            for l in list(self):
+                if l.to_socket is output:
+                    self.remove(l)
+        link = NodeLink(input, output)
+        input.link_count = input.link_count + 1
+        output.link_count = output.link_count + 1
+        self.append(link)
+        return link
+
+    def remove(self, link):
+        link.from_socket.link_count = link.from_socket.link_count - 1
+        link.to_socket.link_count = link.to_socket.link_count - 1
+        list.remove(self, link)
+
+    def clear(self):
+        for link in list(self):
+            self.remove(link)
+
+# round values to 32 bit floats, like values stored in Blender's C structs (e.g. Color Ramp elements, curve points)
+def float32_values(values):
+    return tuple(array('f', values).tolist())
+
+class ColorRampElement(bpy_struct):
+    bl_rna = RNAStruct("ColorRampElement")
+
+    def __init__(self, position, color):
+        self.position = position
+        self.color = color
+
+    @property
+    def position(self):
+        return self._position
+
+    @position.setter
+    def position(self, value):
+        self._position = float32_values([value])[0]
+
+    @property
+    def color(self):
+        return self._color
+
+    @color.setter
+    def color(self, value):
+        self._color = float32_values(value)
+
+    @property
+    def alpha(self):
+        return self._color[3]
+
+class ColorRampElements(PropCollection):
+    def new(self, position):
+        color = self[0].color if len(self) else (0.0, 0.0, 0.0, 1.0)
+        el = ColorRampElement(position, tuple(color))
+        self.append(el)
+        self.sort(key=lambda e: e.position)
+        return el
+
+    def remove(self, element):
+        if len(self) < 2:
+            raise RuntimeError("Error: Unable to remove, ColorRamp must have at least one element")
+        list.remove(self, element)
+
+class ColorRamp(bpy_struct):
+    bl_rna = RNAStruct("ColorRamp")
+
+    def __init__(self):
+        self.color_mode = "RGB"
+        self.interpolation = "LINEAR"
+        self.hue_interpolation = "NEAR"
+        self.elements = ColorRampElements([ColorRampElement(0.0, (0.0, 0.0, 0.0, 1.0)),
+                                           ColorRampElement(1.0, (1.0, 1.0, 1.0, 1.0))])
+
+    def evaluate(self, position):
+        return (0.0, 0.0, 0.0, 1.0)
+
+class CurveMapPoint(bpy_struct):
+    bl_rna = RNAStruct("CurveMapPoint")
+
+    def __init__(self, x, y):
+        self.location = (x, y)
+        self.handle_type = "AUTO"
+        self.select = False
+
+    @property
+    def location(self):
+        return self._location
+
+    @location.setter
+    def location(self, value):
+        self._location = Vector(float32_values(value))
+
+class CurveMapPoints(PropCollection):
+    def new(self, position, value):
+        p = CurveMapPoint(position, value)
+        self.append(p)
+        return p
+
+    def remove(self, point):
+        if len(self) < 3:
+            raise RuntimeError("Error: Unable to remove curve point")
+        list.remove(self, point)
+
+class CurveMap(bpy_struct):
+    bl_rna = RNAStruct("CurveMap")
+
+    def __init__(self):
+        self.points = CurveMapPoints([CurveMapPoint(0.0, 0.0), CurveMapPoint(1.0, 1.0)])
+
+class CurveMapping(bpy_struct):
+    bl_rna = RNAStruct("CurveMapping")
+
+    def __init__(self, num_curves=1):
+        self.use_clip = True
+        self.clip_min_x = 0.0
+        self.clip_min_y = 0.0
+        self.clip_max_x = 1.0
+        self.clip_max_y = 1.0
+        self.extend = "EXTRAPOLATED"
+        self.curves = PropCollection([CurveMap() for _ in range(num_curves)])
+
+    def reset_view(self):
+        pass
+
+    def update(self):
+        pass
+
+    def initialize(self):
+        pass
+
+class Node(bpy_struct):
+    bl_rna = RNAStruct("Node")
+
+    def __init__(self, tree):
+        self.id_data = tree
+        self.name = ""
+        self.label = ""
+        self.location = Vector((0.0, 0.0))
+        self.width = 140.0
+        self.width_hidden = 42.0
+        self.height = 100.0
+        self.color = Color((0.608, 0.608, 0.608))
+        self.use_custom_color = False
+        self.mute = False
+        self.hide = False
+        self.select = True
+        self._parent = None
+        self.show_options = True
+        self.show_preview = False
+        self.show_texture = False
+        self.inputs = PropCollection()
+        self.outputs = PropCollection()
+        self.internal_links = PropCollection()
+
+    @property
+    def location(self):
+        return self._location
+
+    @location.setter
+    def location(self, value):
+        self._location = Vector(value)
+
+    # location in view space, i.e. with the locations of all parents added
+    def get_view_location(self):
+        x, y = self._location
+        parent = self._parent
+        while parent is not None:
+            x = x + parent._location[0]
+            y = y + parent._location[1]
+            parent = parent._parent
+        return x, y
+
+    @property
+    def parent(self):
+        return self._parent
+
+    # like Blender's nodeAttachNode/nodeDetachNode, the node keeps its position in the view, so its location is
+    # converted to/from the space of the parent
+    @parent.setter
+    def parent(self, value):
+        x, y = self.get_view_location()
+        if value is not None:
+            parent_x, parent_y = value.get_view_location()
+            x = x - parent_x
+            y = y - parent_y
+        self._parent = value
+        self._location = Vector((x, y))
+
+    @property
+    def dimensions(self):
+        return Vector((self.width, self.height))
+
+    @property
+    def rna_type(self):
+        return self.bl_rna
+
+    @property
+    def type(self):
+        return self.bl_idname.upper()
+
+    def socket_value_update(self, context):
+        pass
+
+    def update(self):
+        pass
+
+# RNA properties shared by all nodes
+NODE_BASE_PROPS = [
+    RNAProperty("rna_type", 'POINTER', RNAStruct("Struct"), is_readonly=True),
+    RNAProperty("type", 'ENUM', is_readonly=True),
+    RNAProperty("location", 'FLOAT', array_length=2),
+    RNAProperty("width", 'FLOAT'),
+    RNAProperty("width_hidden", 'FLOAT'),
+    RNAProperty("height", 'FLOAT'),
+    RNAProperty("dimensions", 'FLOAT', is_readonly=True, array_length=2),
+    RNAProperty("name", 'STRING'),
+    RNAProperty("label", 'STRING'),
+    RNAProperty("inputs", 'COLLECTION', RNAStruct("NodeSocket"), is_readonly=True),
+    RNAProperty("outputs", 'COLLECTION', RNAStruct("NodeSocket"), is_readonly=True),
+    RNAProperty("internal_links", 'COLLECTION', RNAStruct("NodeLink"), is_readonly=True),
+    RNAProperty("parent", 'POINTER', Node.bl_rna),
+    RNAProperty("use_custom_color", 'BOOLEAN'),
+    RNAProperty("color", 'FLOAT', array_length=3),
+    RNAProperty("select", 'BOOLEAN'),
+    RNAProperty("show_options", 'BOOLEAN'),
+    RNAProperty("show_preview", 'BOOLEAN'),
+    RNAProperty("hide", 'BOOLEAN'),
+    RNAProperty("mute", 'BOOLEAN'),
+    RNAProperty("show_texture", 'BOOLEAN'),
+    RNAProperty("bl_idname", 'STRING'),
+    RNAProperty("bl_label", 'STRING'),
+    RNAProperty("bl_description", 'STRING'),
+    RNAProperty("bl_icon", 'ENUM'),
+    RNAProperty("bl_static_type", 'ENUM', is_readonly=True),
+    RNAProperty("bl_width_default", 'FLOAT'),
+]
+
+SOCKET_DEFAULTS = {
+    'NodeSocketFloat': 0.0,
+    'NodeSocketFloatFactor': 0.0,
+    'NodeSocketInt': 0,
+    'NodeSocketBool': False,
+    'NodeSocketVector': (0.0, 0.0, 0.0),
+    'NodeSocketColor': (0.0, 0.0, 0.0, 1.0),
+    'NodeSocketString': "",
+}
+
+# node specs: bl_idname -> (list of (prop identifier, RNA type, default, fixed_type name or None),
+#                            list of input socket specs, list of output socket specs)
+# socket spec: (socket bl_idname, name, default value or None)
+NODE_SPECS = {}
+
+def node_spec(bl_idname, props=(), inputs=(), outputs=()):
+    NODE_SPECS[bl_idname] = (list(props), list(inputs), list(outputs))
+
+node_spec("ShaderNodeMath",
+          props=[("operation", 'ENUM', "ADD", None), ("use_clamp", 'BOOLEAN', False, None)],
+          inputs=[('NodeSocketFloat', "Value", 0.5), ('NodeSocketFloat', "Value", 0.5),
+                  ('NodeSocketFloat', "Value", 0.5)],
+          outputs=[('NodeSocketFloat', "Value", 0.0)])
+node_spec("ShaderNodeVectorMath",
+          props=[("operation", 'ENUM', "ADD", None)],
+          inputs=[('NodeSocketVector', "Vector", (0.0, 0.0, 0.0)), ('NodeSocketVector', "Vector", (0.0, 0.0, 0.0)),
+                  ('NodeSocketVector', "Vector", (0.0, 0.0, 0.0)), ('NodeSocketFloat', "Scale", 1.0)],
+          outputs=[('NodeSocketVector', "Vector", (0.0, 0.0, 0.0)), ('NodeSocketFloat', "Value", 0.0)])
+node_spec("ShaderNodeMixRGB",
+          props=[("blend_type", 'ENUM', "MIX", None), ("use_alpha", 'BOOLEAN', False, None),
+                 ("use_clamp", 'BOOLEAN', False, None)],
+          inputs=[('NodeSocketFloatFactor', "Fac", 0.5), ('NodeSocketColor', "Color1", (0.5, 0.5, 0.5, 1.0)),
+                  ('NodeSocketColor', "Color2", (0.5, 0.5, 0.5, 1.0))],
+          outputs=[('NodeSocketColor', "Color", (0.0, 0.0, 0.0, 1.0))])
+node_spec("ShaderNodeValToRGB",
+          props=[("color_ramp", 'POINTER', None, "ColorRamp")],
+          inputs=[('NodeSocketFloatFactor', "Fac", 0.5)],
+          outputs=[('NodeSocketColor', "Color", (0.0, 0.0, 0.0, 1.0)), ('NodeSocketFloat', "Alpha", 0.0)])
+node_spec("ShaderNodeFloatCurve",
+          props=[("mapping", 'POINTER', None, "CurveMapping")],
+          inputs=[('NodeSocketFloatFactor', "Factor", 1.0), ('NodeSocketFloat', "Value", 1.0)],
+          outputs=[('NodeSocketFloat', "Value", 0.0)])
+node_spec("ShaderNodeRGBCurve",
+          props=[("mapping", 'POINTER', None, "CurveMapping")],
+          inputs=[('NodeSocketFloatFactor', "Fac", 1.0), ('NodeSocketColor', "Color", (1.0, 1.0, 1.0, 1.0))],
+          outputs=[('NodeSocketColor', "Color", (0.0, 0.0, 0.0, 1.0))])
+node_spec("ShaderNodeTexImage",
+          props=[("image", 'POINTER', None, "Image"), ("interpolation", 'ENUM', "Linear", None),
+                 ("projection", 'ENUM', "FLAT", None), ("extension", 'ENUM', "REPEAT", None),
+                 ("image_user", 'POINTER', None, "ImageUser")],
+          inputs=[('NodeSocketVector', "Vector", (0.0, 0.0, 0.0))],
+          outputs=[('NodeSocketColor', "Color", (0.0, 0.0, 0.0, 1.0)), ('NodeSocketFloat', "Alpha", 0.0)])
+node_spec("ShaderNodeBsdfPrincipled",
+          props=[("distribution", 'ENUM', "GGX", None), ("subsurface_method", 'ENUM', "RANDOM_WALK", None)],
+          inputs=[('NodeSocketColor', "Base Color", (0.8, 0.8, 0.8, 1.0)), ('NodeSocketFloat', "Metallic", 0.0),
+                  ('NodeSocketFloat', "Roughness", 0.5), ('NodeSocketVector', "Normal", (0.0, 0.0, 0.0))],
+          outputs=[('NodeSocketShader', "BSDF", None)])
+node_spec("ShaderNodeOutputMaterial",
+          props=[("target", 'ENUM', "ALL", None)],
+          inputs=[('NodeSocketShader', "Surface", None), ('NodeSocketShader', "Volume", None),
+                  ('NodeSocketVector', "Displacement", (0.0, 0.0, 0.0))],
+          outputs=[])
+node_spec("ShaderNodeValue",
+          outputs=[('NodeSocketFloat', "Value", 0.5)])
+node_spec("ShaderNodeRGB",
+          outputs=[('NodeSocketColor', "Color", (0.5, 0.5, 0.5, 1.0))])
+node_spec("NodeFrame",
+          props=[("label_size", 'INT', 20, None), ("shrink", 'BOOLEAN', True, None), ("text", 'POINTER', None, "Text")])
+node_spec("NodeReroute",
+          inputs=[('NodeSocketColor', "Input", (0.0, 0.0, 0.0, 1.0))],
+          outputs=[('NodeSocketColor', "Output", (0.0, 0.0, 0.0, 1.0))])
+node_spec("ShaderNodeGroup",
+          props=[("node_tree", 'POINTER', None, "ShaderNodeTree")])
+node_spec("GeometryNodeGroup",
+          props=[("node_tree", 'POINTER', None, "GeometryNodeTree")])
+node_spec("NodeGroupInput")
+node_spec("NodeGroupOutput", props=[("is_active_output", 'BOOLEAN', True, None)])
+node_spec("GeometryNodeSetPosition",
+          inputs=[('NodeSocketGeometry', "Geometry", None), ('NodeSocketBool', "Selection", True),
+                  ('NodeSocketVector', "Position", (0.0, 0.0, 0.0)), ('NodeSocketVector', "Offset", (0.0, 0.0, 0.0))],
+          outputs=[('NodeSocketGeometry', "Geometry", None)])
+node_spec("GeometryNodeCaptureAttribute",
+          props=[("data_type", 'ENUM', "FLOAT", None), ("domain", 'ENUM', "POINT", None)],
+          inputs=[('NodeSocketGeometry', "Geometry", None), ('NodeSocketFloat', "Value", 0.0)],
+          outputs=[('NodeSocketGeometry', "Geometry", None), ('NodeSocketFloat', "Attribute", 0.0)])
+node_spec("CompositorNodeValue",
+          outputs=[('NodeSocketFloat', "Value", 0.5)])
+node_spec("CompositorNodeMixRGB",
+          props=[("blend_type", 'ENUM', "MIX", None), ("use_alpha", 'BOOLEAN', False, None)],
+          inputs=[('NodeSocketFloatFactor', "Fac", 1.0), ('NodeSocketColor', "Image", (1.0, 1.0, 1.0, 1.0)),
+                  ('NodeSocketColor', "Image", (1.0, 1.0, 1.0, 1.0))],
+          outputs=[('NodeSocketColor', "Image", (0.0, 0.0, 0.0, 1.0))])
+node_spec("CompositorNodeComposite",
+          props=[("use_alpha", 'BOOLEAN', True, None)],
+          inputs=[('NodeSocketColor', "Image", (0.0, 0.0, 0.0, 1.0)), ('NodeSocketFloat', "Alpha", 1.0)])
+
+NODE_TYPES = {}
+
+# name of struct type for RNA pointer types defined in this module
+def struct_for_name(type_name):
+    cls = getattr(TYPES_MODULE, type_name, None)
+    if cls is not None:
+        return cls.bl_rna
+    return RNAStruct(type_name)
+
+def get_node_type(bl_idname):
+    cls = NODE_TYPES.get(bl_idname)
+    if cls is not None:
+        return cls
+    props, inputs, outputs = NODE_SPECS.get(bl_idname, ([], [], []))
+    rna_props = list(NODE_BASE_PROPS)
+    for ident, prop_type, default, fixed_name in props:
+        fixed = struct_for_name(fixed_name) if fixed_name else None
+        # Color Ramp and Curve Mapping pointers are read-only in Blender
+        readonly = fixed_name in ("ColorRamp", "CurveMapping", "ImageUser")
+        rna_props.append(RNAProperty(ident, prop_type, fixed, is_readonly=readonly))
+    cls = type(bl_idname, (Node,), {"bl_idname": bl_idname, "bl_label": bl_idname})
+    cls.bl_rna = RNAStruct(bl_idname, Node.bl_rna, rna_props)
+    NODE_TYPES[bl_idname] = cls
+    return cls
+
+def make_socket_identifiers(specs):
+    seen = {}
+    idents = []
+    for _, name, _ in specs:
+        count = seen.get(name, 0)
+        seen[name] = count + 1
+        idents.append(name if count == 0 else "%s_%03d" % (name, count))
+    return idents
+
+def create_node(tree, bl_idname):
+    cls = get_node_type(bl_idname)
+    node_props, input_specs, output_specs = NODE_SPECS.get(bl_idname, ([], [], []))
+    node = cls(tree)
+    for ident, prop_type, default, fixed_name in node_props:
+        if fixed_name == "ColorRamp":
+            default = ColorRamp()
+        elif fixed_name == "CurveMapping":
+            default = CurveMapping(4 if bl_idname == "ShaderNodeRGBCurve" else 1)
+        elif fixed_name == "ImageUser":
+            default = bpy_struct()
+        setattr(node, ident, default)
+    idents = make_socket_identifiers(input_specs)
+    for (sock_type, name, default), ident in zip(input_specs, idents):
+        node.inputs.append(NodeSocket(node, sock_type, name, ident, default))
+    idents = make_socket_identifiers(output_specs)
+    for (sock_type, name, default), ident in zip(output_specs, idents):
+        node.outputs.append(NodeSocket(node, sock_type, name, ident, default, is_output=True))
+    # group input/output nodes get one socket per interface item, plus the virtual socket
+    if bl_idname == "NodeGroupInput":
+        for item in tree.inputs:
+            node.outputs.append(NodeSocket(node, item.bl_socket_idname, item.name, item.identifier,
+                                           getattr(item, "default_value", None), is_output=True))
+        node.outputs.append(NodeSocket(node, 'NodeSocketVirtual', "", "__extend__", is_output=True))
+    elif bl_idname == "NodeGroupOutput":
+        for item in tree.outputs:
+            node.inputs.append(NodeSocket(node, item.bl_socket_idname, item.name, item.identifier,
+                                          getattr(item, "default_value", None)))
+        node.inputs.append(NodeSocket(node, 'NodeSocketVirtual', "", "__extend__"))
+    return node
+
+class NodeCollection(PropCollection):
+    def __init__(self, tree):
+        PropCollection.__init__(self)
+        self.tree = tree
+
+    def new(self, type):
+        node = create_node(self.tree, type)
+        base_name = node.bl_label
+        name = base_name
+        count = 0
+        existing = set(n.name for n in self)
+        while name in existing:
+            count = count + 1
+            name = "%s.%03d" % (base_name, count)
+        node.name = name
+        self.append(node)
+        return node
+
+    def remove(self, node):
+        for l in list(self.tree.links):
+            if l.from_node is node or l.to_node is node:
+                self.tree.links.remove(l)
+        for n in self:
+            if n.parent is node:
+                n.parent = None
+        list.remove(self, node)
+
+    def clear(self):
+        self.tree.links.clear()
+        del self[:]
+
+    @property
+    def active(self):
+        return self[-1] if len(self) else None
+
+class NodeTree(ID):
+    bl_rna = RNAStruct("NodeTree", ID.bl_rna)
+    tree_type_name = 'SHADER'
+
+    def __init__(self, name=""):
+        ID.__init__(self, name)
+        self.nodes = NodeCollection(self)
+        self.links = LinkCollection(self)
+        self.inputs = InterfaceCollection()
+        self.outputs = InterfaceCollection()
+        self.is_embedded_data = False
+        # counts updates, similar to Blender tagging the tree for re-evaluation
+        self.update_count = 0
+
+    @property
+    def type(self):
+        return self.tree_type_name
+
+    @property
+    def bl_idname(self):
+        return type(self).__name__
+
+def make_tree_type(name, tree_type):
+    cls = type(name, (NodeTree,), {"tree_type_name": tree_type})
+    cls.bl_rna = RNAStruct(name, NodeTree.bl_rna)
+    return cls
+
+ShaderNodeTree = make_tree_type("ShaderNodeTree", 'SHADER')
+GeometryNodeTree = make_tree_type("GeometryNodeTree", 'GEOMETRY')
+CompositorNodeTree = make_tree_type("CompositorNodeTree", 'COMPOSITING')
+TextureNodeTree = make_tree_type("TextureNodeTree", 'TEXTURE')
+
+TREE_TYPES = {
+    'ShaderNodeTree': ShaderNodeTree,
+    'GeometryNodeTree': GeometryNodeTree,
+    'CompositorNodeTree': CompositorNodeTree,
+    'TextureNodeTree': TextureNodeTree,
+}
+
+# ID types that own an embedded node tree
+class NodeTreeOwner(ID):
+    embedded_tree_type = ShaderNodeTree
+
+    def __init__(self, name=""):
+        ID.__init__(self, name)
+        self.node_tree = None
+        self._use_nodes = False
+
+    @property
+    def use_nodes(self):
+        return self._use_nodes
+
+    @use_nodes.setter
+    def use_nodes(self, value):
+        self._use_nodes = value
+        if value and self.node_tree is None:
+            self.node_tree = self.embedded_tree_type("Shader Nodetree")
+            self.node_tree.is_embedded_data = True
+            self.add_default_nodes()
+
+    def add_default_nodes(self):
+        pass
+
+class Material(NodeTreeOwner):
+    bl_rna = RNAStruct("Material", ID.bl_rna)
+
+    def add_default_nodes(self):
+        bsdf = self.node_tree.nodes.new("ShaderNodeBsdfPrincipled")
+        out = self.node_tree.nodes.new("ShaderNodeOutputMaterial")
+        self.node_tree.links.new(bsdf.outputs[0], out.inputs[0])
+
+class World(NodeTreeOwner):
+    bl_rna = RNAStruct("World", ID.bl_rna)
+
+class FreestyleLineStyle(NodeTreeOwner):
+    bl_rna = RNAStruct("FreestyleLineStyle", ID.bl_rna)
+
+class Scene(NodeTreeOwner):
+    bl_rna = RNAStruct("Scene", ID.bl_rna)
+    embedded_tree_type = CompositorNodeTree
+
+########################################
+# bpy.data
+########################################
+
+class IDCollection(PropCollection):
+    def __init__(self, id_type):
+        PropCollection.__init__(self)
+        self.id_type = id_type
+
+    def unique_name(self, name):
+        existing = set(b.name for b in self)
+        if name not in existing:
+            return name
+        count = 1
+        while "%s.%03d" % (name, count) in existing:
+            count = count + 1
+        return "%s.%03d" % (name, count)
+
+    def new(self, name, type=None):
+        if self.id_type is NodeTree:
+            block = TREE_TYPES[type](self.unique_name(name))
+        else:
+            block = self.id_type(self.unique_name(name))
+        self.append(block)
+        return block
+
+    def remove(self, block, do_unlink=True):
+        list.remove(self, block)
+
+class BlendData:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.node_groups = IDCollection(NodeTree)
+        self.materials = IDCollection(Material)
+        self.worlds = IDCollection(World)
+        self.linestyles = IDCollection(FreestyleLineStyle)
+        self.scenes = IDCollection(Scene)
+        self.texts = IDCollection(TextBlock)
+        self.images = IDCollection(Image)
+        self.masks = IDCollection(Mask)
+        self.objects = IDCollection(Object)
+        self.collections = IDCollection(Collection)
+        self.textures = IDCollection(Texture)
+        self.movieclips = IDCollection(MovieClip)
+        self.libraries = IDCollection(Library)
+        self.filepath = ""
+
+BLEND_DATA_COLLECTIONS = [
+    ("node_groups", NodeTree), ("materials", Material), ("worlds", World), ("linestyles", FreestyleLineStyle),
+    ("scenes", Scene), ("texts", Text), ("images", Image), ("masks", Mask), ("objects", Object),
+    ("collections", Collection), ("textures", Texture), ("movieclips", MovieClip), ("libraries", Library),
+]
+
+BlendData.bl_rna = RNAStruct("BlendData", None, [RNAProperty(name, 'COLLECTION', cls.bl_rna)
+                                                 for name, cls in BLEND_DATA_COLLECTIONS])
+
+def all_id_collections():
+    return [getattr(data, name) for name, _ in BLEND_DATA_COLLECTIONS]
+
+def all_node_trees():
+    trees = list(data.node_groups)
+    for coll in (data.materials, data.worlds, data.linestyles, data.scenes):
+        for block in coll:
+            if block.node_tree is not None:
+                trees.append(block.node_tree)
+    return trees
+
+data = BlendData()
+
+########################################
+# bpy.types / bpy.props / bpy.app / bpy.utils
+########################################
+
+class Operator:
+    bl_idname = ""
+    bl_label = ""
+
+    def report(self, type, message):
+        print("%s: %s" % (",".join(sorted(type)), message))
+
+class Panel:
+    pass
+
+class PropertyGroup:
+    pass
+
+class UIList:
+    pass
+
+def prop_func(*args, **kwargs):
+    return (args, kwargs)
+
+TYPES_MODULE = types.ModuleType("bpy.types")
+for _name, _value in list(globals().items()):
+    if isinstance(_value, type) and (issubclass(_value, bpy_struct) or _value in (Operator, Panel, PropertyGroup,
+                                                                                  UIList)):
+        setattr(TYPES_MODULE, _name, _value)
+TYPES_MODULE.ImageUser = type("ImageUser", (bpy_struct,), {"bl_rna": RNAStruct("ImageUser")})
+TYPES_MODULE.Struct = type("Struct", (bpy_struct,), {"bl_rna": RNAStruct("Struct")})
+
+class AppModule(types.ModuleType):
+    pass
+
+# create fresh 'bpy' and 'mathutils' modules and register them in sys.modules, so that later imports of the addon
+# pick them up
+def install():
+    if "bpy" in sys.modules and getattr(sys.modules["bpy"], "IS_FAKE_BPY", False):
+        return sys.modules["bpy"]
+    bpy_mod = types.ModuleType("bpy")
+    bpy_mod.IS_FAKE_BPY = True
+    bpy_mod.types = TYPES_MODULE
+    bpy_mod.data = data
+    props_mod = types.ModuleType("bpy.props")
+    for name in ("BoolProperty", "IntProperty", "FloatProperty", "StringProperty", "EnumProperty",
+                 "PointerProperty", "CollectionProperty"):
+        setattr(props_mod, name, prop_func)
+    bpy_mod.props = props_mod
+    app_mod = types.ModuleType("bpy.app")
+    app_mod.version = BLENDER_VERSION
+    app_mod.background = True
+    app_mod.binary_path = ""
+    handlers_mod = types.ModuleType("bpy.app.handlers")
+    handlers_mod.depsgraph_update_post = []
+    handlers_mod.load_post = []
+    handlers_mod.save_pre = []
+    handlers_mod.persistent = lambda func: func
+    app_mod.handlers = handlers_mod
+    app_mod.timers = types.SimpleNamespace(register=lambda *a, **k: None, unregister=lambda *a, **k: None,
+                                           is_registered=lambda f: False)
+    bpy_mod.app = app_mod
+    utils_mod = types.ModuleType("bpy.utils")
+    utils_mod.register_class = lambda cls: None
+    utils_mod.unregister_class = lambda cls: None
+    bpy_mod.utils = utils_mod
+    bpy_mod.context = types.SimpleNamespace(scene=None)
+    bpy_mod.ops = types.SimpleNamespace()
+    math_mod = types.ModuleType("mathutils")
+    math_mod.Vector = Vector
+    math_mod.Color = Color
+    sys.modules["bpy"] = bpy_mod
+    sys.modules["bpy.types"] = TYPES_MODULE
+    sys.modules["bpy.props"] = props_mod
+    sys.modules["bpy.app"] = app_mod
+    sys.modules["bpy.app.handlers"] = handlers_mod
+    sys.modules["bpy.utils"] = utils_mod
+    sys.modules["mathutils"] = math_mod
+    return bpy_mod
+
+def reset_data():
+    data.reset()
@@ -0,0 +1,295 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 3
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# Export benchmark suite on synthetic node trees, runs with plain Python (no Blender needed) by using the fake 'bpy'
+# layer in fake_bpy.py. Usage:
+#   python benchmarks/run_benchmarks.py [--quick] [--case PATTERN] [--repeat N] [--json FILE]
+#                                       [--compare OLD_FILE] [--threshold RATIO] [--workers N]
+# Each case builds one synthetic tree (see synthetic.py) and times create_code_text (for each output style, and for
+# unrolled style with shared node configurations), write_filtered_attribs, and bpy_value_to_string on it, recording
+# wall time (best of N runs), peak memory (traced by tracemalloc in a separate run), and output size, plus time per
+# export phase and per node type of one profiled run of create_code_text, and the time to compile (parse) the
+# generated script, and to load its compiled code from a code cache (see code_cache.py) instead. Results are written
+# as JSON, and can be compared with the results of a previous run (e.g. of another commit) to find regressions. With
+# --workers, create_code_text is also timed with code of large trees generated by worker processes.
+
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import fake_bpy
+bpy = fake_bpy.install()
+import synthetic
+
+from material2python.code_cache import make_code_cache_data, load_code_cache_data
+from material2python.code_sink import StringSink
+from material2python.mat2py import (create_code_text, write_filtered_attribs, bpy_value_to_string,
+    OUTPUT_STYLE_UNROLLED, OUTPUT_STYLE_COMPACT, LOC_DEC_PLACES_UNI_NODE_OPT, WRITE_DEFAULTS_UNI_NODE_OPT,
+    WRITE_LINKED_DEFAULTS_UNI_NODE_OPT, WRITE_ATTR_NAME_UNI_NODE_OPT, WRITE_ATTR_WIDTH_HEIGHT_UNI_NODE_OPT,
+    WRITE_ATTR_SELECT_UNI_NODE_OPT)
+from material2python.snapshot import FILTER_OUT_ATTRIBS
+from material2python.worker_pool import get_num_workers
+
+RESULTS_FORMAT_VERSION = 1
+
+UNI_NODE_OPTIONS = {
+    LOC_DEC_PLACES_UNI_NODE_OPT: 0,
+    WRITE_DEFAULTS_UNI_NODE_OPT: False,
+    WRITE_LINKED_DEFAULTS_UNI_NODE_OPT: False,
+    WRITE_ATTR_NAME_UNI_NODE_OPT: True,
+    WRITE_ATTR_WIDTH_HEIGHT_UNI_NODE_OPT: True,
+    WRITE_ATTR_SELECT_UNI_NODE_OPT: False,
+}
+
+# benchmark cases, (case name, synthetic tree parameters), each case varies one dimension of tree size/shape
+BENCH_CASES = [
+    ("nodes_100", synthetic.make_params(num_nodes=100)),
+    ("nodes_500", synthetic.make_params(num_nodes=500)),
+    ("nodes_2000", synthetic.make_params(num_nodes=2000)),
+    ("nodes_8000", synthetic.make_params(num_nodes=8000)),
+    ("material_500", synthetic.make_params(tree_type="ShaderNodeTree", num_nodes=500)),
+    ("links_dense_500", synthetic.make_params(num_nodes=500, link_density=4.0)),
+    ("frames_deep_500", synthetic.make_params(num_nodes=500, num_frames=32, frame_depth=16)),
+    ("interface_128", synthetic.make_params(num_nodes=100, interface_size=128)),
+    ("color_ramps_64x32", synthetic.make_params(num_nodes=100, num_ramps=64, ramp_size=32)),
+    ("curve_mappings_64x32", synthetic.make_params(num_nodes=100, num_curves=64, curve_size=32)),
+    ("repeated_500", synthetic.make_params(num_nodes=500, repeat_ratio=0.8)),
+]
+
+# cases run with --quick
+QUICK_CASES = ["nodes_100", "material_500", "interface_128", "color_ramps_64x32", "curve_mappings_64x32",
+               "repeated_500"]
+
+# suffix of name of create_code_text benchmark with shared node configurations (dedupe configs option)
+DEDUPE_BENCH_SUFFIX = ":dedupe"
+# suffix of name of create_code_text benchmark with code generated by worker processes (--workers)
+WORKERS_BENCH_SUFFIX = ":workers"
+
+# run func() 'repeat' times and return (best wall time, result of last call), then run it once more with memory
+# tracing on and return peak traced memory (tracing slows down the run, so it is not timed)
+def measure(func, repeat):
+    times = []
+    result = None
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start_time)
+    tracemalloc.start()
+    func()
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(times), peak_memory, result
+
+def bench_create_code_text(node_tree, tree_owner, output_style, stats=None, dedupe_configs=False, workers=1):
+    return create_code_text(node_tree, tree_owner, 4, False, True, True, False, UNI_NODE_OPTIONS, sink=StringSink(),
+                            output_style=output_style, stats=stats, profile=stats != None,
+                            dedupe_configs=dedupe_configs, workers=workers)
+
+# get export stats (time per phase and per node type, see export_stats.py) of one profiled run of create_code_text
+def get_profile_stats(node_tree, tree_owner, output_style, dedupe_configs=False, workers=1):
+    stats = {}
+    bench_create_code_text(node_tree, tree_owner, output_style, stats, dedupe_configs, workers)
+    return stats
+
+# get best time to compile (parse) generated script
+def measure_compile(code, repeat):
+    times = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        compile(code, "<m2p bench>", "exec")
+        times.append(time.perf_counter() - start_time)
+    return min(times)
+
+# get best time to load the compiled code of generated script from its code cache data, including the check of the
+# source hash
+def measure_cached_load(code, repeat):
+    source = code.encode()
+    cache_data = make_code_cache_data(compile(source, "<m2p bench>", "exec"), source)
+    times = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        load_code_cache_data(cache_data, source)
+        times.append(time.perf_counter() - start_time)
+    return min(times)
+
+def bench_write_filtered_attribs(node_tree):
+    sink = StringSink()
+    for tree_node in node_tree.nodes:
+        write_filtered_attribs(sink, "    ", tree_node, [])
+    return sink.close()
+
+# values read from the tree's nodes (socket defaults, node attributes, Color Ramp element colors, and Curve Mapping
+# point locations), collected before timing so only bpy_value_to_string is timed
+def get_bench_values(node_tree):
+    values = []
+    for tree_node in node_tree.nodes:
+        for socket in tree_node.inputs:
+            if hasattr(socket, "default_value"):
+                values.append(socket.default_value)
+        for rna_prop in tree_node.bl_rna.properties:
+            if rna_prop.identifier.startswith('bl_') or rna_prop.identifier in FILTER_OUT_ATTRIBS or \
+                    rna_prop.type in ('POINTER', 'COLLECTION'):
+                continue
+            values.append(getattr(tree_node, rna_prop.identifier))
+        color_ramp = getattr(tree_node, "color_ramp", None)
+        if color_ramp != None:
+            values.extend([el.color for el in color_ramp.elements])
+        mapping = getattr(tree_node, "mapping", None)
+        if mapping != None:
+            for curve in mapping.curves:
+                values.extend([p.location for p in curve.points])
+    return values
+
+def bench_bpy_value_to_string(values):
+    return "\n".join([bpy_value_to_string(value) for value in values])
+
+# if 'workers' is not 1 then create_code_text is also timed with code generated by this number of worker processes
+# (only trees large enough for worker processes, see worker_pool.get_num_workers)
+def get_bench_funcs(node_tree, tree_owner, workers=1):
+    values = get_bench_values(node_tree)
+    bench_funcs = [
+        ("create_code_text:" + OUTPUT_STYLE_UNROLLED,
+         lambda: bench_create_code_text(node_tree, tree_owner, OUTPUT_STYLE_UNROLLED)),
+        ("create_code_text:" + OUTPUT_STYLE_COMPACT,
+         lambda: bench_create_code_text(node_tree, tree_owner, OUTPUT_STYLE_COMPACT)),
+        ("create_code_text:" + OUTPUT_STYLE_UNROLLED + DEDUPE_BENCH_SUFFIX,
+         lambda: bench_create_code_text(node_tree, tree_owner, OUTPUT_STYLE_UNROLLED, dedupe_configs=True)),
+        ("write_filtered_attribs", lambda: bench_write_filtered_attribs(node_tree)),
+        ("bpy_value_to_string", lambda: bench_bpy_value_to_string(values)),
+    ]
+    if workers != 1 and get_num_workers(workers, len(node_tree.nodes)) > 1:
+        bench_funcs.insert(3, ("create_code_text:" + OUTPUT_STYLE_UNROLLED + WORKERS_BENCH_SUFFIX,
+            lambda: bench_create_code_text(node_tree, tree_owner, OUTPUT_STYLE_UNROLLED, workers=workers)))
+    return bench_funcs
+
+def run_case(case_name, params, repeat, workers=1):
+    fake_bpy.reset_data()
+    node_tree, tree_owner = synthetic.build_tree(params, case_name)
+    if tree_owner == None:
+        tree_owner = node_tree
+    results = []
+    for bench_name, func in get_bench_funcs(node_tree, tree_owner, workers):
+        wall_time, peak_memory, output = measure(func, repeat)
+        result = {
+            "case": case_name,
+            "bench": bench_name,
+            "params": params,
+            "nodes": len(node_tree.nodes),
+            "links": len(node_tree.links),
+            "wall_time": wall_time,
+            "peak_memory": peak_memory,
+            "output_bytes": len(output.encode()),
+            "output_lines": output.count("\n"),
+        }
+        if bench_name.startswith("create_code_text:"):
+            profile_stats = get_profile_stats(node_tree, tree_owner, bench_name.split(":")[1],
+                                              bench_name.endswith(DEDUPE_BENCH_SUFFIX),
+                                              workers if bench_name.endswith(WORKERS_BENCH_SUFFIX) else 1)
+            result["phase_times"] = profile_stats["phase_times"]
+            result["node_type_times"] = profile_stats["node_type_times"]
+            result["shared_configs"] = profile_stats["shared_configs"]
+            result["compile_time"] = measure_compile(output, repeat)
+            result["cached_load_time"] = measure_cached_load(output, repeat)
+        results.append(result)
+    return results
+
+# get short hash of current git commit, or None if not in a git checkout
+def get_git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# compare results with old results (loaded from JSON file), returns list of (case, bench, old time, new time, ratio)
+# for benchmarks found in both
+def compare_results(old_results, new_results):
+    old_by_key = { (r["case"], r["bench"]): r for r in old_results["results"] }
+    comparison = []
+    for r in new_results["results"]:
+        old = old_by_key.get((r["case"], r["bench"]))
+        if old == None or old["wall_time"] <= 0.0:
+            continue
+        comparison.append((r["case"], r["bench"], old["wall_time"], r["wall_time"], r["wall_time"] / old["wall_time"]))
+    return comparison
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="run_benchmarks", description="Benchmark export of synthetic node trees")
+    parser.add_argument("--quick", action="store_true", help="Run only a few small cases")
+    parser.add_argument("--case", help="Run only cases whose name matches this pattern (fnmatch)")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timed runs per benchmark, best time is kept")
+    parser.add_argument("--workers", type=int, default=1, help="Also time create_code_text with code of large " +
+                        "trees generated by this number of worker processes (0 is one per CPU)")
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--compare", help="Compare wall times with results of a previous run, read from this file")
+    parser.add_argument("--threshold", type=float, default=1.10, help="Time ratio (new/old) above which a " +
+                        "benchmark is reported as a regression, exit status is 1 if there are regressions")
+    args = parser.parse_args(argv)
+
+    cases = BENCH_CASES
+    if args.quick:
+        cases = [c for c in cases if c[0] in QUICK_CASES]
+    if args.case:
+        cases = [c for c in cases if fnmatch.fnmatchcase(c[0], args.case)]
+
+    results = {
+        "format_version": RESULTS_FORMAT_VERSION,
+        "commit": get_git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "results": [],
+    }
+    print("%-22s %-33s %6s %6s %10s %10s %10s %10s %10s" % ("case", "bench", "nodes", "links", "time ms", "peak KiB",
+                                                             "bytes", "compile ms", "cached ms"))
+    for case_name, params in cases:
+        for r in run_case(case_name, params, args.repeat, args.workers):
+            print("%-22s %-33s %6d %6d %10.2f %10.1f %10d %10s %10s" % (r["case"], r["bench"], r["nodes"],
+                r["links"], r["wall_time"]*1000, r["peak_memory"]/1024.0, r["output_bytes"],
+                "%.2f" % (r["compile_time"]*1000) if "compile_time" in r else "-",
+                "%.2f" % (r["cached_load_time"]*1000) if "cached_load_time" in r else "-"))
+            results["results"].append(r)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=1)
+
+    regressions = 0
+    if args.compare:
+        with open(args.compare, "r") as f:
+            old_results = json.load(f)
+        print("\ncompared with commit %s:" % old_results.get("commit"))
+        for case_name, bench_name, old_time, new_time, ratio in compare_results(old_results, results):
+            is_regression = ratio > args.threshold
+            if is_regression:
+                regressions = regressions + 1
+            print("%-22s %-26s %10.2f -> %10.2f ms  x%.2f%s" % (case_name, bench_name, old_time*1000, new_time*1000,
+                                                              ratio, "  REGRESSION" if is_regression else ""))
+    return 1 if regressions > 0 else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 3
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# Synthetic node tree generator for benchmarks, builds trees in the fake 'bpy' layer (see fake_bpy.py) with
+# configurable size and shape.
+
+import random
+
+import fake_bpy
+
+# node types used to fill synthetic trees, weighted towards the common 'math' nodes
+SHADER_FILL_TYPES = ["ShaderNodeMath", "ShaderNodeMath", "ShaderNodeMath", "ShaderNodeVectorMath",
+                     "ShaderNodeMixRGB", "ShaderNodeValue", "ShaderNodeRGB", "ShaderNodeTexImage"]
+GEOMETRY_FILL_TYPES = ["ShaderNodeMath", "ShaderNodeMath", "ShaderNodeVectorMath", "GeometryNodeCaptureAttribute",
+                       "GeometryNodeSetPosition"]
+MATH_OPERATIONS = ["ADD", "SUBTRACT", "MULTIPLY", "DIVIDE", "POWER", "SINE"]
+BLEND_TYPES = ["MIX", "MULTIPLY", "ADD", "SCREEN"]
+
+# default parameters of a synthetic tree
+DEFAULT_PARAMS = {
+    "tree_type": "GeometryNodeTree",
+    "num_nodes": 200,
+    "link_density": 1.0,
+    "frame_depth": 2,
+    "num_frames": 4,
+    "interface_size": 8,
+    "ramp_size": 8,
+    "num_ramps": 2,
+    "curve_size": 8,
+    "num_curves": 2,
+    "repeat_ratio": 0.0,
+    "seed": 1,
+}
+
+def make_params(**kwargs):
+    params = dict(DEFAULT_PARAMS)
+    params.update(kwargs)
+    return params
+
+def randomize_node(node, rnd):
+    if node.bl_idname == "ShaderNodeMath":
+        node.operation = rnd.choice(MATH_OPERATIONS)
+        node.use_clamp = rnd.random() < 0.2
+        for sock in node.inputs:
+            sock.default_value = round(rnd.uniform(-10.0, 10.0), 3)
+    elif node.bl_idname == "ShaderNodeVectorMath":
+        node.operation = rnd.choice(MATH_OPERATIONS)
+        node.inputs[0].default_value = (rnd.random(), rnd.random(), rnd.random())
+    elif node.bl_idname == "ShaderNodeMixRGB":
+        node.blend_type = rnd.choice(BLEND_TYPES)
+        node.inputs[1].default_value = (rnd.random(), rnd.random(), rnd.random(), 1.0)
+    elif node.bl_idname in ("ShaderNodeValue", "CompositorNodeValue"):
+        node.outputs[0].default_value = round(rnd.uniform(0.0, 5.0), 3)
+    elif node.bl_idname == "ShaderNodeRGB":
+        node.outputs[0].default_value = (rnd.random(), rnd.random(), rnd.random(), 1.0)
+    elif node.bl_idname == "ShaderNodeTexImage":
+        images = fake_bpy.data.images
+        img = images.get("tex_%d" % rnd.randint(0, 3))
+        if img is None:
+            img = images.new("tex_%d" % len(images))
+        node.image = img
+        node.interpolation = rnd.choice(["Linear", "Closest", "Cubic"])
+    elif node.bl_idname == "GeometryNodeCaptureAttribute":
+        node.data_type = rnd.choice(["FLOAT", "FLOAT_VECTOR", "FLOAT_COLOR"])
+        node.domain = rnd.choice(["POINT", "EDGE", "FACE"])
+    elif node.bl_idname == "GeometryNodeSetPosition":
+        node.inputs[3].default_value = (rnd.random(), 0.0, rnd.random())
+
+def fill_color_ramp(ramp, size, rnd):
+    ramp.interpolation = rnd.choice(["LINEAR", "EASE", "CONSTANT"])
+    for i in range(size - 2):
+        el = ramp.elements.new((i + 1) / float(size))
+        el.color = (rnd.random(), rnd.random(), rnd.random(), 1.0)
+
+def fill_curve_mapping(mapping, size, rnd):
+    for curve in mapping.curves:
+        for i in range(size - 2):
+            p = curve.points.new((i + 1) / float(size), rnd.random())
+            p.handle_type = rnd.choice(["AUTO", "VECTOR", "AUTO_CLAMPED"])
+
+# build a synthetic node tree and return it, trees with tree_type 'ShaderNodeTree' are created as materials (and the
+# material is returned as second value), other trees are created as node groups (second value is None)
+def build_tree(params=None, name="SyntheticTree"):
+    if params is None:
+        params = make_params()
+    rnd = random.Random(params["seed"])
+    owner = None
+    if params["tree_type"] == "ShaderNodeTree":
+        owner = fake_bpy.data.materials.new(name)
+        owner.use_nodes = True
+        tree = owner.node_tree
+        tree.nodes.clear()
+        fill_types = SHADER_FILL_TYPES
+    elif params["tree_type"] == "CompositorNodeTree":
+        owner = fake_bpy.data.scenes.new(name)
+        owner.use_nodes = True
+        tree = owner.node_tree
+        fill_types = ["CompositorNodeMixRGB", "CompositorNodeValue"]
+    else:
+        tree = fake_bpy.data.node_groups.new(name, params["tree_type"])
+        fill_types = GEOMETRY_FILL_TYPES if params["tree_type"] == "GeometryNodeTree" else SHADER_FILL_TYPES
+        for i in range(params["interface_size"]):
+            sock_type = rnd.choice(['NodeSocketFloat', 'NodeSocketVector', 'NodeSocketColor'])
+            item = tree.inputs.new(type=sock_type, name="Input %d" % i)
+            if sock_type == 'NodeSocketFloat':
+                item.default_value = round(rnd.uniform(0.0, 1.0), 3)
+                item.min_value = 0.0
+            item.hide_value = rnd.random() < 0.1
+            tree.outputs.new(type=sock_type, name="Output %d" % i)
+
+    nodes = tree.nodes
+    # frames, nested up to frame_depth
+    frames = []
+    for i in range(params["num_frames"]):
+        frame = nodes.new("NodeFrame")
+        frame.label = "Frame %d" % i
+        frame.location = fake_bpy.Vector((i * 400.0, 0.0))
+        if frames and params["frame_depth"] > 1 and i % params["frame_depth"] != 0:
+            frame.parent = frames[-1]
+        frames.append(frame)
+
+    if params["tree_type"] not in ("ShaderNodeTree", "CompositorNodeTree"):
+        nodes.new("NodeGroupInput").location = fake_bpy.Vector((-400.0, 0.0))
+        nodes.new("NodeGroupOutput").location = fake_bpy.Vector((4000.0, 0.0))
+
+    # repeated nodes share the exact same settings, i.e. they differ only in name and location
+    template_node = None
+    body = []
+    for i in range(params["num_nodes"]):
+        if template_node is not None and rnd.random() < params["repeat_ratio"]:
+            node = nodes.new(template_node.bl_idname)
+            node.operation = template_node.operation
+            node.use_clamp = template_node.use_clamp
+            for src_sock, sock in zip(template_node.inputs, node.inputs):
+                sock.default_value = src_sock.default_value
+        else:
+            node = nodes.new(rnd.choice(fill_types))
+            randomize_node(node, rnd)
+            if template_node is None and node.bl_idname == "ShaderNodeMath":
+                template_node = node
+        node.location = fake_bpy.Vector((rnd.uniform(0.0, 4000.0), rnd.uniform(-2000.0, 2000.0)))
+        if frames and rnd.random() < 0.3:
+            node.parent = rnd.choice(frames)
+        if rnd.random() < 0.05:
+            node.label = "Label %d" % i
+        body.append(node)
+    for i in range(params["num_ramps"]):
+        node = nodes.new("ShaderNodeValToRGB")
+        fill_color_ramp(node.color_ramp, params["ramp_size"], rnd)
+        body.append(node)
+    for i in range(params["num_curves"]):
+        node = nodes.new("ShaderNodeFloatCurve")
+        fill_curve_mapping(node.mapping, params["curve_size"], rnd)
+        body.append(node)
+    if params["tree_type"] == "ShaderNodeTree":
+        body.append(nodes.new("ShaderNodeBsdfPrincipled"))
+        body.append(nodes.new("ShaderNodeOutputMaterial"))
+
+    # links go "forward" only, from earlier node to later node, so the tree stays acyclic
+    num_links = int(len(body) * params["link_density"])
+    for _ in range(num_links):
+        a = rnd.randrange(0, len(body) - 1)
+        b = rnd.randrange(a + 1, len(body))
+        from_node = body[a]
+        to_node = body[b]
+        if len(from_node.outputs) == 0 or len(to_node.inputs) == 0:
+            continue
+        tree.links.new(rnd.choice(from_node.outputs), rnd.choice(to_node.inputs))
+    return tree, owner
@@ -28,9 +28,12 @@ bl_info = {
 
 import bpy
 from bpy.types import PropertyGroup
-from bpy.props import (BoolProperty, IntProperty, PointerProperty)
+from bpy.props import (BoolProperty, EnumProperty, FloatProperty, IntProperty, PointerProperty, StringProperty)
 
-from .mat2py import M2P_CreateText
+from .export_stats import get_stats_summary
+from .live_export import (disable_live_export, get_live_export_summary, live_export_load_post, update_live_export)
+from .mat2py import (M2P_CreateText, M2P_CreateTextModal, M2P_SetBaseline, last_export_stats,
+    modal_export_progress)
 
 if bpy.app.version < (2, 80, 0):
     Region = "TOOLS"
@@ -48,14 +51,37 @@ class M2P_PT_MaterialToPython(bpy.types.Panel):
         scn = context.scene
         layout = self.layout
         box = layout.box()
-        box.operator("mat2py.awesome")
+        if len(modal_export_progress) > 0:
+            box.label(text="Exporting: %d%% (Esc to cancel)" % int(modal_export_progress["progress"] * 100))
+        elif scn.Mat2Py.modal_export:
+            box.operator("mat2py.awesome_modal")
+        else:
+            box.operator("mat2py.awesome")
+        box.prop(scn.Mat2Py, "modal_export")
+        box.prop(scn.Mat2Py, "export_scope")
+        box.prop(scn.Mat2Py, "export_target")
+        if scn.Mat2Py.export_target == "FILE":
+            box.prop(scn.Mat2Py, "export_filepath")
+            box.prop(scn.Mat2Py, "export_gzip")
+            box.prop(scn.Mat2Py, "export_atomic")
         box = layout.box()
         box.label(text="General Options")
+        box.prop(scn.Mat2Py, "output_style")
+        sub_box = box.box()
+        sub_box.active = scn.Mat2Py.output_style == "UNROLLED"
+        sub_box.prop(scn.Mat2Py, "dedupe_configs")
+        box.prop(scn.Mat2Py, "incremental_export")
+        row = box.row()
+        row.prop(scn.Mat2Py, "patch_export")
+        row.operator("mat2py.set_baseline")
         box.prop(scn.Mat2Py, "num_space_pad")
         box.prop(scn.Mat2Py, "keep_links")
+        box.prop(scn.Mat2Py, "link_socket_identifiers")
         box.prop(scn.Mat2Py, "make_function")
         box.prop(scn.Mat2Py, "delete_existing")
+        box.prop(scn.Mat2Py, "deferred_update")
         box.prop(scn.Mat2Py, "ng_output_min_max_def")
+        box.prop(scn.Mat2Py, "export_node_groups")
         box = layout.box()
         box.label(text="Node Attribute Options")
         box.prop(scn.Mat2Py, "write_attrib_name")
@@ -67,21 +93,96 @@ class M2P_PT_MaterialToPython(bpy.types.Panel):
         box.label(text="Write Defaults Options")
         box.prop(scn.Mat2Py, "write_default_values")
         box.prop(scn.Mat2Py, "write_linked_default_values")
+        box = layout.box()
+        box.label(text="Live Export")
+        box.prop(scn.Mat2Py, "live_export")
+        sub_box = box.box()
+        sub_box.active = scn.Mat2Py.live_export
+        sub_box.prop(scn.Mat2Py, "live_export_debounce")
+        if scn.Mat2Py.live_export:
+            col = box.column(align=True)
+            for line in get_live_export_summary():
+                col.label(text=line)
+        box = layout.box()
+        box.label(text="Export Stats")
+        box.prop(scn.Mat2Py, "export_stats")
+        sub_box = box.box()
+        sub_box.active = scn.Mat2Py.export_stats
+        sub_box.prop(scn.Mat2Py, "export_stats_header")
+        if scn.Mat2Py.export_stats and len(last_export_stats) > 0:
+            col = box.column(align=True)
+            for line in get_stats_summary(last_export_stats):
+                col.label(text=line)
 
 class M2P_PropGrp(PropertyGroup):
+    export_scope: EnumProperty(name="Export Nodes", description="Which nodes of the node tree to export (frames " +
+        "of exported nodes are always exported, links to other nodes are reported instead of exported)",
+        items=[("ALL", "All", "Export all nodes"),
+               ("SELECTED", "Selected", "Export only the selected nodes"),
+               ("UPSTREAM", "Selected and Upstream", "Export the selected nodes, and all nodes linked (directly or " +
+                "indirectly) to their inputs"),
+               ("DOWNSTREAM", "Selected and Downstream", "Export the selected nodes, and all nodes linked (directly " +
+                "or indirectly) from their outputs")],
+        default="ALL")
+    export_target: EnumProperty(name="Export To", description="Where to write the Python code",
+        items=[("TEXT", "Text-block", "Write Python code to a new text-block"),
+               ("FILE", "File", "Stream Python code to a file on disk, without keeping the whole script in memory " +
+                "(nothing is added to the .blend file)")],
+        default="TEXT")
+    export_filepath: StringProperty(name="File Path", description="Path of .py file to write Python code to " +
+        "(existing file is replaced)", default="//m2p_export.py", subtype='FILE_PATH')
+    export_gzip: BoolProperty(name="Compress (gzip)", description="Write gzip compressed file", default=False)
+    export_atomic: BoolProperty(name="Atomic Write", description="Write to a temporary file, and replace the " +
+        "file only when export is complete, so the file is never left partly written", default=True)
+    modal_export: BoolProperty(name="Non-blocking", description="Export in small chunks of work, so the UI " +
+        "stays responsive and shows progress while huge node trees are exported (press Esc to cancel)",
+        default=False)
+    output_style: EnumProperty(name="Output Style", description="Style of Python code output in text-block",
+        items=[("UNROLLED", "Unrolled", "Write lines of code for each node attribute and link"),
+               ("COMPACT", "Compact", "Write tables of nodes and links, applied by loops (smaller script, faster " +
+                "to compile for large node trees)")],
+        default="UNROLLED")
+    dedupe_configs: BoolProperty(name="Share Node Configs", description="Nodes with the same type and " +
+        "settings (differing only in name and location) are created by calling a function written once per " +
+        "configuration, instead of repeating the code of each node (smaller script, faster to compile)",
+        default=False)
+    incremental_export: BoolProperty(name="Incremental Update", description="Update the text-block written by " +
+        "the previous export of this node tree, re-using code of unchanged nodes (faster re-export of large trees)",
+        default=False)
+    patch_export: BoolProperty(name="Patch From Baseline", description="Write a script that changes the node " +
+        "tree from its baseline (see Set Baseline) to its current state, adding, removing, and changing only the " +
+        "nodes, values, and links that changed, instead of re-creating all nodes", default=False)
+    codegen_workers: IntProperty(name="Worker Processes", description="Number of processes that generate the " +
+        "code of very large node trees (at least 2000 nodes, Unrolled style without Share Node Configs), 0 is one " +
+        "process per CPU, the code is the same as the code generated by one process. Used only in background " +
+        "Blender, e.g. by scripts that run the export operators", default=1, min=0)
+    live_export: BoolProperty(name="Live Export", description="Watch node trees exported while this is enabled, " +
+        "and export them again to the same text-block or file when they change", default=False,
+        update=update_live_export)
+    live_export_debounce: FloatProperty(name="Delay", description="Seconds without changes to watched node " +
+        "trees before changed trees are exported, so a burst of edits is exported once", default=1.0, min=0.1,
+        subtype='TIME', unit='TIME')
     num_space_pad: IntProperty(name="Num Space Pad", description="Number of spaces to prepend to each " +
         "line of code output in text-block", default=4, min=0)
     keep_links: BoolProperty(name="Keep Links List", description="Add created links to a list variable",
         default=False)
+    link_socket_identifiers: BoolProperty(name="Link by Identifier", description="Find link sockets by " +
+        "their identifier, instead of only by index, so links stay correct when sockets are hidden or unavailable",
+        default=False)
     make_function: BoolProperty(name="Make into Function", description="Add lines of Python code to " +
         "create runnable script (instead of just the bare essential code)", default=True)
     delete_existing: BoolProperty(name="Delete Existing Shader",
         description="Include code in the output that deletes all nodes in Shader Material / Geometry Node Setup " +
         "before creating new nodes", default=True)
+    deferred_update: BoolProperty(name="Deferred Update", description="Script creates nodes in a node group or " +
+        "material that is not used yet, and replaces the existing node group or material of the same name with it " +
+        "in all users when complete, so objects and modifiers using it are updated once instead of after each " +
+        "change (not for Compositor)", default=False)
     write_loc_decimal_places: IntProperty(name="Location Decimal Places", description="Number of " +
         "decimal places to use when writing location values", default=0)
-    write_default_values: BoolProperty(name="Write Defaults", description="Write node attributes " +
-        "that are set to default values (e.g. node attributes: label, name)", default=False)
+    write_default_values: BoolProperty(name="Write Defaults", description="Write node attributes and socket " +
+        "values that are set to default values (e.g. node attributes: label, name), instead of skipping values " +
+        "equal to the defaults of a new node of the same type (full output)", default=False)
     write_linked_default_values: BoolProperty(name="Linked Default Values", description="Write default " +
         "values, of node inputs and outputs, where the input/output is linked to another node", default=False)
     write_attrib_name: BoolProperty(name="Name", description="Include node attribute 'name'", default=False)
@@ -91,10 +192,20 @@ class M2P_PropGrp(PropertyGroup):
         "attribute for select state (e.g. selected nodes can be 'marked' for easy search later)", default=False)
     ng_output_min_max_def: BoolProperty(name="Output Min/Max/Default", description="Include Minimum, Maximum, " +
         "and Default value for each node group output", default=False)
+    export_node_groups: BoolProperty(name="Include Node Groups", description="Also write code to create the " +
+        "node groups used by group nodes (recursively), each node group is written once, in dependency order",
+        default=False)
+    export_stats: BoolProperty(name="Show Stats", description="Measure time taken by each phase of export, " +
+        "and by each node type, and show these stats (with counts of nodes, links, lines, and bytes written) in " +
+        "this panel", default=False)
+    export_stats_header: BoolProperty(name="Stats Header", description="Write export stats as a comment at the " +
+        "top of the Python code", default=False)
 
 classes = [
     M2P_PT_MaterialToPython,
     M2P_CreateText,
+    M2P_CreateTextModal,
+    M2P_SetBaseline,
     M2P_PropGrp,
 ]
 
@@ -102,8 +213,11 @@ def register():
     for cls in classes:
         bpy.utils.register_class(cls)
     bpy.types.Scene.Mat2Py = PointerProperty(type=M2P_PropGrp)
+    bpy.app.handlers.load_post.append(live_export_load_post)
 
 def unregister():
+    disable_live_export()
+    bpy.app.handlers.load_post.remove(live_export_load_post)
     for cls in classes:
         bpy.utils.unregister_class(cls)
     del bpy.types.Scene.Mat2Py
@@ -0,0 +1,150 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 3
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# Batch export driver, runs with plain Python (not inside Blender) and fans .blend files out across a pool of
+# background Blender worker processes, each worker runs batch_export.py on one .blend file. Usage:
+#   python batch_driver.py --blender /path/to/blender --output-dir DIR [--workers N] [--report FILE] \
+#       [batch_export options, e.g. --materials --node-groups] file.blend [dir_with_blend_files ...]
+# Note: this file does not import bpy, or the rest of the addon, so it must be run by file path.
+
+import argparse
+import concurrent.futures
+import glob
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# Python expression run by each Blender worker, the addon's parent directory is added to the module search path so
+# the addon does not need to be installed
+WORKER_EXPR = "import sys; sys.path.insert(0, %r); from material2python import batch_export; " + \
+    "sys.exit(batch_export.main())"
+
+# batch_export.py options that make all workers write the same file (named by the option, not by the .blend file), so
+# only the last worker's trees would be in it
+SHARED_FILE_EXPORT_OPTIONS = ["--package", "--save-baseline"]
+
+# expand directories into the .blend files they contain (recursive)
+def find_blend_files(paths):
+    blend_files = []
+    for path in paths:
+        if os.path.isdir(path):
+            blend_files.extend(sorted(glob.glob(os.path.join(path, "**", "*.blend"), recursive=True)))
+        else:
+            blend_files.append(path)
+    return blend_files
+
+# run one Blender worker process to export the trees of one .blend file, returns a file report dict
+def export_blend_file(blender_path, blend_file, export_args, timeout):
+    addon_parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    report_fd, report_path = tempfile.mkstemp(prefix="m2p_report_", suffix=".json")
+    os.close(report_fd)
+    cmd = [blender_path, "--background", "--factory-startup", "--python-exit-code", "1", blend_file,
+           "--python-expr", WORKER_EXPR % addon_parent_dir, "--"] + export_args + ["--report", report_path]
+    file_report = { "blend_file": blend_file, "error": None, "trees": [] }
+    start_time = time.perf_counter()
+    try:
+        proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=timeout,
+                              universal_newlines=True)
+        if proc.returncode != 0:
+            file_report["error"] = "Blender exited with code %d\n%s" % (proc.returncode, proc.stdout[-4000:])
+    except subprocess.TimeoutExpired:
+        file_report["error"] = "Timeout after %s seconds" % timeout
+    except OSError as e:
+        file_report["error"] = "Unable to run Blender: %s" % e
+    file_report["seconds"] = time.perf_counter() - start_time
+    try:
+        with open(report_path) as f:
+            file_report["trees"] = json.load(f)["trees"]
+    except (OSError, ValueError):
+        pass
+    os.remove(report_path)
+    return file_report
+
+def make_arg_parser():
+    parser = argparse.ArgumentParser(prog="batch_driver", description="Export node trees of many .blend files " +
+                                     "to Python scripts, using a pool of background Blender processes. Unknown " +
+                                     "options are passed to batch_export.py (e.g. --materials, --node-groups)")
+    parser.add_argument("paths", nargs="+", help=".blend files, or directories to search for .blend files")
+    parser.add_argument("--blender", default=os.environ.get("BLENDER", "blender"), help="Blender executable")
+    parser.add_argument("--output-dir", required=True, help="Directory to write .py files into")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Number of Blender processes")
+    parser.add_argument("--timeout", type=float, default=None, help="Timeout (seconds) per .blend file")
+    parser.add_argument("--report", help="Write JSON report (per file timing and failures) to this file")
+    return parser
+
+# get mapping of the files written by the workers to the trees exported to them, as dict of file path to list of
+# {"blend_file", "type", "name"} dicts
+def get_output_files(file_reports):
+    output_files = {}
+    for file_report in file_reports:
+        for t in file_report["trees"]:
+            output_files.setdefault(t["file"], []).append({ "blend_file": file_report["blend_file"], "type": t["type"],
+                                                            "name": t["name"] })
+    return output_files
+
+def main(argv=None):
+    parser = make_arg_parser()
+    args, export_args = parser.parse_known_args(argv)
+    # options may be abbreviated, as argparse allows
+    shared_file_options = [option for option in SHARED_FILE_EXPORT_OPTIONS
+                           if any(len(arg.split("=")[0]) > 2 and option.startswith(arg.split("=")[0])
+                                  for arg in export_args)]
+    if len(shared_file_options) > 0:
+        parser.error("%s cannot be used with the driver, run batch_export.py for each .blend file instead" %
+                     ", ".join(shared_file_options))
+    blend_files = find_blend_files(args.paths)
+    export_args = ["--output-dir", args.output_dir] + export_args
+
+    start_time = time.perf_counter()
+    file_reports = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        futures = [executor.submit(export_blend_file, args.blender, f, export_args, args.timeout)
+                   for f in blend_files]
+        for future in concurrent.futures.as_completed(futures):
+            file_report = future.result()
+            failed_trees = [t for t in file_report["trees"] if t["error"] != None]
+            status = "FAILED" if file_report["error"] != None or failed_trees else "ok"
+            print("%s: %s, %d trees, %.3f sec" % (status, file_report["blend_file"], len(file_report["trees"]),
+                                                  file_report["seconds"]))
+            if file_report["error"] != None:
+                print(file_report["error"])
+            for t in failed_trees:
+                print("  tree failed: %s %s\n%s" % (t["type"], t["name"], t["error"]))
+            file_reports.append(file_report)
+
+    num_failed = len([r for r in file_reports if r["error"] != None or
+                      any(t["error"] != None for t in r["trees"])])
+    total_seconds = time.perf_counter() - start_time
+    output_files = get_output_files(file_reports)
+    for filepath, trees in sorted(output_files.items()):
+        # trees of one .blend file may share a file, e.g. a tree file (see batch_export.py --format)
+        if len(set(t["blend_file"] for t in trees)) > 1:
+            print("file overwritten: %s, by %s" % (filepath, ", ".join("%s %s %s" % (t["blend_file"], t["type"],
+                                                                                    t["name"]) for t in trees)))
+    print("%d files, %d failed, %.3f sec total" % (len(file_reports), num_failed, total_seconds))
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({ "files": file_reports, "outputs": output_files, "failed": num_failed,
+                        "seconds": total_seconds }, f, indent=1)
+    return 1 if num_failed > 0 else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
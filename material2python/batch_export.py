@@ -0,0 +1,325 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 3
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# Headless batch export, runs inside Blender (no UI context needed) and writes one .py file per node tree of the
+# currently loaded .blend file. Usage:
+#   blender -b file.blend --python-expr \
+#       "import sys; from material2python import batch_export; sys.exit(batch_export.main())" -- \
+#       --output-dir DIR [--materials] [--worlds] [--node-groups] [--compositor] [--linestyles] [--report FILE]
+#       [--verify] [--package NAME] [--format JSON|BINARY] [--code-cache] [--save-baseline FILE] [--patch-from FILE]
+#       [--export-scope SELECTED|UPSTREAM|DOWNSTREAM]
+# If no tree type filter is given then all types of trees are exported. With --verify, each exported tree is also
+# re-created from its script in a scratch datablock and compared with the original (see verify.py), and the exit status
+# is 1 if any tree is not re-created faithfully (Blender ignores the return value of main(), so it must be passed to
+# sys.exit() as above). With --package, trees are written as modules of a Python package
+# (see package_export.py), including the node groups used by the trees. With --format JSON or BINARY, all trees are
+# written to one tree file (see tree_format.py), including the node groups used by the trees, to be re-created by the
+# generic loader (see tree_loader.py) instead of by scripts. With --code-cache, the compiled code of each script is
+# written next to it (see code_cache.py), and of each package module to the package's __pycache__ directory.
+# With --save-baseline, the exported trees are also written to a snapshot file, and with --patch-from, the script of
+# each tree found in the given snapshot file is a patch script, that changes only what changed since the snapshot
+# (see tree_patch.py), trees not found in the snapshot file are exported as usual. With --export-scope, only the nodes
+# selected in the .blend file (optionally with the nodes upstream or downstream of them) are exported (see subgraph.py).
+# Scripts and tree files are named after the .blend file (and tree type and owner), with a short hash of the full path
+# of the .blend file (and tree type and owner name), see get_export_filename, the report maps each tree to its file.
+# See batch_driver.py to export many .blend files with a pool of Blender processes.
+
+import argparse
+import fnmatch
+import hashlib
+import importlib.util
+import json
+import os
+import re
+import sys
+import time
+import traceback
+
+import bpy
+
+from .code_cache import write_code_cache
+from .code_sink import FileSink
+from .mat2py import (create_code_text, LOC_DEC_PLACES_UNI_NODE_OPT, WRITE_DEFAULTS_UNI_NODE_OPT,
+    WRITE_LINKED_DEFAULTS_UNI_NODE_OPT, WRITE_ATTR_NAME_UNI_NODE_OPT, WRITE_ATTR_WIDTH_HEIGHT_UNI_NODE_OPT,
+    WRITE_ATTR_SELECT_UNI_NODE_OPT, OUTPUT_STYLE_UNROLLED, OUTPUT_STYLE_COMPACT, get_baseline_key)
+from .package_export import get_missing_node_groups, get_module_name, write_tree_module, write_package_index
+from .snapshot import capture_tree, get_tree_kind, get_used_node_groups
+from .subgraph import EXPORT_SCOPE_ALL, EXPORT_SCOPE_SELECTED, EXPORT_SCOPE_UPSTREAM, EXPORT_SCOPE_DOWNSTREAM
+from .tree_format import (TREE_FORMAT_JSON, TREE_FORMAT_BINARY, TREE_FORMAT_EXTENSIONS, get_tree_record,
+    write_tree_file, write_snapshot_file, read_snapshot_file)
+from .verify import verify_tree, get_verify_summary
+
+TREE_FILTER_MATERIALS = "materials"
+TREE_FILTER_WORLDS = "worlds"
+TREE_FILTER_NODE_GROUPS = "node_groups"
+TREE_FILTER_COMPOSITOR = "compositor"
+TREE_FILTER_LINESTYLES = "linestyles"
+ALL_TREE_FILTERS = [TREE_FILTER_MATERIALS, TREE_FILTER_WORLDS, TREE_FILTER_NODE_GROUPS, TREE_FILTER_COMPOSITOR,
+                    TREE_FILTER_LINESTYLES]
+
+# export format of Python scripts, other formats are tree file formats (see tree_format.py)
+EXPORT_FORMAT_PY = "PY"
+
+# get the list of (tree filter type, node tree, tree owner) to export from the current .blend file
+def get_export_trees(tree_filters, name_pattern=None):
+    trees = []
+    if TREE_FILTER_MATERIALS in tree_filters:
+        for mat in bpy.data.materials:
+            if mat.use_nodes and mat.node_tree != None:
+                trees.append((TREE_FILTER_MATERIALS, mat.node_tree, mat))
+    if TREE_FILTER_WORLDS in tree_filters:
+        for world in bpy.data.worlds:
+            if world.use_nodes and world.node_tree != None:
+                trees.append((TREE_FILTER_WORLDS, world.node_tree, world))
+    if TREE_FILTER_NODE_GROUPS in tree_filters:
+        for node_group in bpy.data.node_groups:
+            trees.append((TREE_FILTER_NODE_GROUPS, node_group, node_group))
+    if TREE_FILTER_COMPOSITOR in tree_filters:
+        for scene in bpy.data.scenes:
+            if scene.use_nodes and scene.node_tree != None:
+                trees.append((TREE_FILTER_COMPOSITOR, scene.node_tree, scene))
+    if TREE_FILTER_LINESTYLES in tree_filters:
+        for linestyle in bpy.data.linestyles:
+            if linestyle.use_nodes and linestyle.node_tree != None:
+                trees.append((TREE_FILTER_LINESTYLES, linestyle.node_tree, linestyle))
+    if name_pattern != None:
+        trees = [t for t in trees if fnmatch.fnmatchcase(t[2].name, name_pattern)]
+    return trees
+
+# get short hash of the full path of the .blend file and the given (unsanitized) names, to make file names unique
+def get_name_hash(blend_path, *names):
+    return hashlib.sha1("\0".join((os.path.abspath(blend_path),) + names).encode()).hexdigest()[:8]
+
+def get_blend_name(blend_path):
+    return os.path.splitext(os.path.basename(blend_path))[0] or "untitled"
+
+# make a file name from the names of .blend file, tree type, and tree owner, and a hash of the full path of the .blend
+# file, tree type, and owner name, so names are unique even if .blend files in different directories have the same
+# name (e.g. a/lib.blend and b/lib.blend), or owner names are the same after sanitizing (e.g. "Mat A" and "Mat_A")
+def get_export_filename(blend_path, tree_filter, owner_name):
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", "%s__%s__%s__%s" % (get_blend_name(blend_path), tree_filter, owner_name,
+        get_name_hash(blend_path, tree_filter, owner_name))) + ".py"
+
+# make a tree file name from the name of .blend file, and a hash of its full path (see get_export_filename)
+def get_tree_filename(blend_path, export_format):
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", "%s__%s" % (get_blend_name(blend_path), get_name_hash(blend_path))) + \
+        TREE_FORMAT_EXTENSIONS[export_format]
+
+def get_uni_node_options(args):
+    return {
+        LOC_DEC_PLACES_UNI_NODE_OPT: args.loc_decimal_places,
+        WRITE_DEFAULTS_UNI_NODE_OPT: args.write_defaults,
+        WRITE_LINKED_DEFAULTS_UNI_NODE_OPT: args.write_linked_defaults,
+        WRITE_ATTR_NAME_UNI_NODE_OPT: args.write_name,
+        WRITE_ATTR_WIDTH_HEIGHT_UNI_NODE_OPT: args.write_width_height,
+        WRITE_ATTR_SELECT_UNI_NODE_OPT: args.write_select,
+    }
+
+def make_arg_parser():
+    parser = argparse.ArgumentParser(prog="batch_export", description="Export node trees of the loaded .blend " +
+                                     "file to Python scripts, one script per tree")
+    parser.add_argument("--output-dir", required=True, help="Directory to write .py files into")
+    parser.add_argument("--report", help="Write JSON report of exported trees (timing, errors) to this file")
+    parser.add_argument("--name", help="Export only trees whose owner name matches this pattern (fnmatch)")
+    for tree_filter in ALL_TREE_FILTERS:
+        parser.add_argument("--" + tree_filter.replace("_", "-"), dest=tree_filter, action="store_true",
+                            help="Export %s node trees" % tree_filter.replace("_", " "))
+    parser.add_argument("--output-style", choices=[OUTPUT_STYLE_UNROLLED, OUTPUT_STYLE_COMPACT],
+                        default=OUTPUT_STYLE_UNROLLED)
+    parser.add_argument("--codegen-workers", type=int, default=1, help="Number of processes that generate the code " +
+                        "of very large trees (unrolled style), 0 is one process per CPU (default 1)")
+    parser.add_argument("--export-scope", choices=[EXPORT_SCOPE_ALL, EXPORT_SCOPE_SELECTED, EXPORT_SCOPE_UPSTREAM,
+                        EXPORT_SCOPE_DOWNSTREAM], default=EXPORT_SCOPE_ALL, help="Export only the selected nodes " +
+                        "of each tree, and optionally the nodes upstream or downstream of them (default ALL)")
+    parser.add_argument("--deferred-update", action="store_true", help="Scripts create nodes in a datablock " +
+                        "that is not used, and replace the existing datablock of the same name with it in all users")
+    parser.add_argument("--dedupe-configs", action="store_true", help="Create nodes of the same type and " +
+                        "settings by calling a shared function, written once per configuration (unrolled style)")
+    parser.add_argument("--num-space-pad", type=int, default=4)
+    parser.add_argument("--keep-links", action="store_true")
+    parser.add_argument("--no-make-function", dest="make_function", action="store_false")
+    parser.add_argument("--no-delete-existing", dest="delete_existing", action="store_false")
+    parser.add_argument("--ng-output-min-max-def", action="store_true")
+    parser.add_argument("--link-socket-identifiers", action="store_true")
+    parser.add_argument("--export-dependencies", action="store_true", help="Include node groups used by group " +
+                        "nodes in each exported script")
+    parser.add_argument("--gzip", action="store_true", help="Write gzip compressed files (.py.gz)")
+    parser.add_argument("--atomic", action="store_true", help="Write each file to a temporary file first, and " +
+                        "rename it when complete, so files are never left partly written")
+    parser.add_argument("--profile", action="store_true", help="Add time per export phase and per node type, and " +
+                        "counts of nodes, links, lines, and bytes, to the stats of each tree in the report")
+    parser.add_argument("--stats-header", action="store_true", help="Write export stats as a comment at the top " +
+                        "of each script")
+    parser.add_argument("--verify", action="store_true", help="Re-create each tree by running its script in a " +
+                        "scratch datablock, compare it with the original tree, and time the script's execution")
+    parser.add_argument("--format", dest="export_format", default=EXPORT_FORMAT_PY,
+                        choices=[EXPORT_FORMAT_PY, TREE_FORMAT_JSON, TREE_FORMAT_BINARY], help="Write Python " +
+                        "scripts (PY), or one tree file with all trees, loaded by tree_loader.py (JSON or BINARY)")
+    parser.add_argument("--package", help="Write trees as modules of a Python package with this name (a directory " +
+                        "in the output directory), imported lazily, instead of one script per tree")
+    parser.add_argument("--code-cache", action="store_true", help="Write the compiled code of each script next to " +
+                        "it, to be loaded instead of compiling the script (see code_cache.py)")
+    parser.add_argument("--save-baseline", help="Also write the exported trees to this snapshot file, to be used " +
+                        "as the baseline of later exports with --patch-from")
+    parser.add_argument("--patch-from", help="Write patch scripts, that change only the nodes, values, and links " +
+                        "that changed since the trees were written to this snapshot file (by --save-baseline)")
+    parser.add_argument("--loc-decimal-places", type=int, default=0)
+    parser.add_argument("--write-defaults", action="store_true")
+    parser.add_argument("--write-linked-defaults", action="store_true")
+    parser.add_argument("--write-name", action="store_true")
+    parser.add_argument("--write-width-height", action="store_true")
+    parser.add_argument("--write-select", action="store_true")
+    return parser
+
+# export trees of the current .blend file, returns report dict with per tree timing and errors
+def batch_export(args):
+    tree_filters = [f for f in ALL_TREE_FILTERS if getattr(args, f)]
+    if len(tree_filters) == 0:
+        tree_filters = ALL_TREE_FILTERS
+    uni_node_options = get_uni_node_options(args)
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    report = { "blend_file": bpy.data.filepath, "trees": [], "failed": 0, "mismatched": 0 }
+    export_trees = get_export_trees(tree_filters, args.name)
+    if args.export_format != EXPORT_FORMAT_PY:
+        tree_filepath = os.path.join(args.output_dir, get_tree_filename(bpy.data.filepath, args.export_format))
+        # node groups used by the trees are loaded from the same file, even if filtered out
+        export_trees.extend([(TREE_FILTER_NODE_GROUPS, group, group)
+                             for group in get_missing_node_groups([t[1] for t in export_trees])])
+        tree_records = []
+        report["tree_file"] = tree_filepath
+    elif args.package != None:
+        package_dir = os.path.join(args.output_dir, args.package)
+        os.makedirs(package_dir, exist_ok=True)
+        # node groups used by the trees are needed by the package, even if filtered out
+        export_trees.extend([(TREE_FILTER_NODE_GROUPS, group, group)
+                             for group in get_missing_node_groups([t[1] for t in export_trees])])
+        module_names = set()
+        tree_modules = []
+        report["package"] = package_dir
+    # baselines of patch scripts, and trees captured for the snapshot file
+    baselines = read_snapshot_file(args.patch_from) if args.patch_from != None else {}
+    baseline_trees = []
+    # node groups used by many trees are captured only once
+    group_memo = {}
+    for tree_filter, node_tree, tree_owner in export_trees:
+        if args.export_format != EXPORT_FORMAT_PY:
+            filepath = tree_filepath
+        elif args.package != None:
+            module_name = get_module_name(get_tree_kind(node_tree, tree_owner), tree_owner.name, module_names)
+            filepath = os.path.join(package_dir, module_name + ".py")
+        else:
+            filepath = os.path.join(args.output_dir, get_export_filename(bpy.data.filepath, tree_filter,
+                                                                       tree_owner.name))
+            if args.gzip:
+                filepath = filepath + ".gz"
+        tree_report = { "type": tree_filter, "name": tree_owner.name, "file": filepath, "error": None }
+        stats = {}
+        start_time = time.perf_counter()
+        try:
+            if args.export_format != EXPORT_FORMAT_PY:
+                tree = capture_tree(node_tree, tree_owner, elide_defaults=not args.write_defaults)
+                tree_records.append(get_tree_record(tree, uni_node_options, args.ng_output_min_max_def,
+                    args.link_socket_identifiers, [group.name for group in get_used_node_groups(node_tree)]))
+            elif args.package != None:
+                tree_key = write_tree_module(filepath, node_tree, tree_owner, uni_node_options, args.num_space_pad,
+                    args.keep_links, args.ng_output_min_max_def, args.link_socket_identifiers, stats,
+                    args.output_style, args.profile, args.stats_header, args.dedupe_configs, args.atomic)
+                tree_modules.append((tree_key, module_name))
+                if args.code_cache:
+                    tree_report["code_cache"] = write_code_cache(filepath,
+                                                                 cache_path=importlib.util.cache_from_source(filepath))
+            else:
+                baseline = baselines.get(get_baseline_key(node_tree, tree_owner))
+                tree_report["patch"] = baseline != None
+                create_code_text(node_tree, tree_owner, args.num_space_pad, args.keep_links, args.make_function,
+                                 args.delete_existing, args.ng_output_min_max_def, uni_node_options,
+                                 sink=FileSink(filepath, compress=args.gzip, atomic=args.atomic),
+                                 use_socket_identifiers=args.link_socket_identifiers,
+                                 stats=stats, export_dependencies=args.export_dependencies, group_memo=group_memo,
+                                 output_style=args.output_style, profile=args.profile,
+                                 stats_header=args.stats_header, dedupe_configs=args.dedupe_configs,
+                                 baseline=baseline, workers=args.codegen_workers, export_scope=args.export_scope,
+                                 deferred_update=args.deferred_update)
+                if args.code_cache:
+                    tree_report["code_cache"] = write_code_cache(filepath)
+        except Exception:
+            tree_report["error"] = traceback.format_exc()
+            report["failed"] = report["failed"] + 1
+        tree_report["seconds"] = time.perf_counter() - start_time
+        tree_report["stats"] = stats
+        if args.save_baseline != None and tree_report["error"] == None:
+            baseline_trees.append(capture_tree(node_tree, tree_owner))
+        if args.verify and tree_report["error"] == None:
+            try:
+                tree_report["verify"] = verify_tree(node_tree, tree_owner, uni_node_options, args.num_space_pad,
+                    args.keep_links, args.ng_output_min_max_def, args.link_socket_identifiers, args.output_style,
+                    args.dedupe_configs)
+                if len(tree_report["verify"]["mismatches"]) > 0:
+                    report["mismatched"] = report["mismatched"] + 1
+            except Exception:
+                tree_report["error"] = traceback.format_exc()
+                report["failed"] = report["failed"] + 1
+        report["trees"].append(tree_report)
+    if args.export_format != EXPORT_FORMAT_PY:
+        write_tree_file(tree_filepath, tree_records, args.export_format, os.path.basename(bpy.data.filepath),
+                        args.atomic)
+    elif args.package != None:
+        index_filepath = write_package_index(package_dir, os.path.basename(bpy.data.filepath) or "untitled",
+                                             tree_modules, args.atomic)
+        if args.code_cache:
+            write_code_cache(index_filepath, cache_path=importlib.util.cache_from_source(index_filepath))
+    if args.save_baseline != None:
+        report["baseline"] = write_snapshot_file(args.save_baseline, baseline_trees,
+                                                 os.path.basename(bpy.data.filepath), args.atomic)
+    return report
+
+def main(argv=None):
+    # Blender passes script arguments after "--"
+    if argv == None:
+        argv = sys.argv[sys.argv.index("--")+1:] if "--" in sys.argv else []
+    parser = make_arg_parser()
+    args = parser.parse_args(argv)
+    if args.package != None and (args.gzip or not args.package.isidentifier()):
+        parser.error("--package must be a valid Python identifier, and cannot be used with --gzip")
+    if args.export_format != EXPORT_FORMAT_PY and (args.package != None or args.gzip or args.verify or
+                                                   args.code_cache):
+        parser.error("--format %s cannot be used with --package, --gzip, --verify, or --code-cache" %
+                     args.export_format)
+    # patch scripts change an existing tree, so they cannot be verified by re-creating the tree
+    if args.patch_from != None and (args.export_format != EXPORT_FORMAT_PY or args.package != None or args.verify):
+        parser.error("--patch-from cannot be used with --format, --package, or --verify")
+    # a subgraph is not a faithful copy of its tree, so it cannot be verified
+    if args.export_scope != EXPORT_SCOPE_ALL and (args.export_format != EXPORT_FORMAT_PY or args.package != None or
+                                                  args.verify):
+        parser.error("--export-scope cannot be used with --format, --package, or --verify")
+    # package modules and tree files re-create trees in their own way, without replacing datablocks in their users
+    if args.deferred_update and (args.export_format != EXPORT_FORMAT_PY or args.package != None):
+        parser.error("--deferred-update cannot be used with --format or --package")
+    report = batch_export(args)
+    for tree_report in report["trees"]:
+        print("m2p batch: %s %s: %.3f sec%s" % (tree_report["type"], tree_report["name"], tree_report["seconds"],
+                                                "" if tree_report["error"] == None else " FAILED"))
+        if tree_report["error"] != None:
+            print(tree_report["error"])
+        if "verify" in tree_report:
+            print("\n".join(["m2p verify: " + line for line in get_verify_summary(tree_report["verify"])]))
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=1)
+    return 1 if report["failed"] > 0 or report["mismatched"] > 0 else 0
@@ -0,0 +1,218 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 3
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# Code cache of exported scripts: the compiled code object of a script is written next to the script, e.g.
+# tree.cpython-310.pyc next to tree.py, so scripts that are run many times (e.g. at the start of each render farm job)
+# are loaded without parsing and compiling their source again. Caches use the hash-based .pyc format (PEP 552), i.e.
+# keyed by the hash of the script's source and by the Python version (magic number), so a cache is used only if the
+# script did not change, and only by the version of Python that wrote it (the Python version is in the cache's file
+# name too, so caches of different versions of Blender do not replace each other). Stale caches are ignored, and
+# replaced after the script is compiled again. Runner usage:
+#   blender -b file.blend --python-expr \
+#       "import sys; from material2python import code_cache; sys.exit(code_cache.main())" -- \
+#       SCRIPT [SCRIPT ...] [--no-update-cache] [--compare] [--report FILE]
+# With --compare, the time to start each script (read and compile its source, or read and load its cache) is measured
+# both with and without the cache.
+
+import argparse
+import gzip
+import importlib.util
+import json
+import marshal
+import os
+import sys
+import time
+
+from .code_sink import write_file_bytes
+
+# flags of hash-based .pyc files, where the source hash is checked when the cache is loaded (see PEP 552)
+PYC_FLAGS_CHECKED_HASH = 0b11
+PYC_HEADER_SIZE = 16
+
+CACHE_STATUS_HIT = "hit"
+CACHE_STATUS_STALE = "stale"
+CACHE_STATUS_MISSING = "missing"
+
+# get path of the code cache of a script, i.e. in the same directory, with the script's name (without .py or .py.gz
+# extension) and the Python version's cache tag, e.g. tree.cpython-310.pyc, returns None if this version of Python
+# does not cache compiled code
+def get_code_cache_path(script_path):
+    cache_tag = sys.implementation.cache_tag
+    if cache_tag == None:
+        return None
+    base_path = script_path
+    for ext in (".gz", ".py"):
+        if base_path.endswith(ext):
+            base_path = base_path[:-len(ext)]
+    return base_path + "." + cache_tag + ".pyc"
+
+# read source of script, as bytes, gzip compressed scripts (.gz) are decompressed
+def read_script_source(script_path):
+    if script_path.endswith(".gz"):
+        with gzip.open(script_path, "rb") as f:
+            return f.read()
+    with open(script_path, "rb") as f:
+        return f.read()
+
+def compile_script(source, script_path):
+    return compile(source, script_path, "exec", dont_inherit=True)
+
+# get contents of a code cache file for the compiled code of the source
+def make_code_cache_data(code_obj, source):
+    return importlib.util.MAGIC_NUMBER + PYC_FLAGS_CHECKED_HASH.to_bytes(4, "little") + \
+        importlib.util.source_hash(source) + marshal.dumps(code_obj)
+
+# get code object from contents of a code cache file, returns None if the cache is stale, i.e. it was written by
+# another version of Python, or for another source
+def load_code_cache_data(data, source):
+    if len(data) < PYC_HEADER_SIZE or data[:4] != importlib.util.MAGIC_NUMBER or \
+            int.from_bytes(data[4:8], "little") != PYC_FLAGS_CHECKED_HASH or \
+            data[8:16] != importlib.util.source_hash(source):
+        return None
+    try:
+        return marshal.loads(data[PYC_HEADER_SIZE:])
+    except (EOFError, ValueError, TypeError):
+        return None
+
+# compile source of script and write its code cache, if 'cache_path' is None then the cache is written next to the
+# script (see get_code_cache_path), e.g. importlib.util.cache_from_source(script_path) gives the path of the cache
+# used by Python's import system, returns path of cache file, or None if this version of Python has no caches,
+# if 'source' is None then it is read from the script, if 'code_obj' is None then the source is compiled, the cache
+# file is written atomically, so scripts run at the same time never read a partly written cache
+def write_code_cache(script_path, source=None, cache_path=None, code_obj=None):
+    if cache_path == None:
+        cache_path = get_code_cache_path(script_path)
+        if cache_path == None:
+            return None
+    if source == None:
+        source = read_script_source(script_path)
+    if code_obj == None:
+        code_obj = compile_script(source, script_path)
+    # e.g. __pycache__ directory
+    os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+    return write_file_bytes(cache_path, [make_code_cache_data(code_obj, source)], atomic=True)
+
+# get code object of script, loaded from its code cache if the cache is valid, otherwise compiled from source (and
+# the cache is written, if 'update_cache' is True), returns (code object, cache status, dict of times in seconds:
+# "read" (source and cache), "load" (from cache) or "compile")
+def get_script_code(script_path, update_cache=True):
+    times = {}
+    start_time = time.perf_counter()
+    source = read_script_source(script_path)
+    cache_path = get_code_cache_path(script_path)
+    cache_data = None
+    if cache_path != None:
+        try:
+            with open(cache_path, "rb") as f:
+                cache_data = f.read()
+        except OSError:
+            pass
+    times["read"] = time.perf_counter() - start_time
+
+    if cache_data != None:
+        start_time = time.perf_counter()
+        code_obj = load_code_cache_data(cache_data, source)
+        if code_obj != None:
+            times["load"] = time.perf_counter() - start_time
+            return code_obj, CACHE_STATUS_HIT, times
+    start_time = time.perf_counter()
+    code_obj = compile_script(source, script_path)
+    times["compile"] = time.perf_counter() - start_time
+    if update_cache and cache_path != None:
+        try:
+            write_code_cache(script_path, source, cache_path, code_obj)
+        # script directory might be read-only, script still runs without a cache
+        except OSError:
+            pass
+    return code_obj, CACHE_STATUS_STALE if cache_data != None else CACHE_STATUS_MISSING, times
+
+# run script, loading its code from the code cache if the cache is valid, returns dict of results:
+#   "cache": cache status (CACHE_STATUS_HIT, CACHE_STATUS_STALE, or CACHE_STATUS_MISSING)
+#   "times": times in seconds of reading, loading from cache or compiling, and running ("exec")
+def run_script(script_path, update_cache=True):
+    code_obj, cache_status, times = get_script_code(script_path, update_cache)
+    start_time = time.perf_counter()
+    exec(code_obj, { "__name__": "__main__", "__file__": script_path })
+    times["exec"] = time.perf_counter() - start_time
+    return { "cache": cache_status, "times": times }
+
+# measure time to start script without and with its code cache, i.e. read and compile source, and read source and
+# cache and load code from cache (best of 'repeat' runs), the script is not run, returns dict of times in seconds,
+# with None for "cached" if there is no valid cache
+def compare_startup_times(script_path, repeat=3):
+    uncached_times = []
+    cached_times = []
+    cache_path = get_code_cache_path(script_path)
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        compile_script(read_script_source(script_path), script_path)
+        uncached_times.append(time.perf_counter() - start_time)
+        if cache_path == None or not os.path.exists(cache_path):
+            continue
+        start_time = time.perf_counter()
+        source = read_script_source(script_path)
+        with open(cache_path, "rb") as f:
+            code_obj = load_code_cache_data(f.read(), source)
+        if code_obj != None:
+            cached_times.append(time.perf_counter() - start_time)
+    return { "uncached": min(uncached_times), "cached": min(cached_times) if len(cached_times) > 0 else None }
+
+def get_run_summary(script_path, result):
+    times = result["times"]
+    summary = "m2p run: %s: cache %s, read %.1f ms, " % (script_path, result["cache"], times["read"] * 1000)
+    if "load" in times:
+        summary = summary + "load %.1f ms, " % (times["load"] * 1000)
+    else:
+        summary = summary + "compile %.1f ms, " % (times["compile"] * 1000)
+    summary = summary + "exec %.1f ms" % (times["exec"] * 1000)
+    startup = result.get("startup")
+    if startup != None:
+        summary = summary + "\nm2p run: %s: startup without cache %.1f ms, " % (script_path,
+                                                                              startup["uncached"] * 1000)
+        if startup["cached"] == None:
+            summary = summary + "no valid cache"
+        else:
+            summary = summary + "with cache %.1f ms (%.1fx faster)" % (startup["cached"] * 1000,
+                startup["uncached"] / startup["cached"] if startup["cached"] > 0.0 else 0.0)
+    return summary
+
+def main(argv=None):
+    # Blender passes script arguments after "--"
+    if argv == None:
+        argv = sys.argv[sys.argv.index("--")+1:] if "--" in sys.argv else []
+    parser = argparse.ArgumentParser(prog="code_cache", description="Run exported scripts, loading their compiled " +
+                                     "code from code caches written next to the scripts")
+    parser.add_argument("scripts", nargs="+", help="Scripts to run, in order")
+    parser.add_argument("--no-update-cache", dest="update_cache", action="store_false", help="Do not write caches " +
+                        "of scripts whose cache is missing or stale")
+    parser.add_argument("--compare", action="store_true", help="Also measure time to start each script (read and " +
+                        "compile, or load from cache) without and with its cache")
+    parser.add_argument("--report", help="Write JSON report of cache status and times of each script to this file")
+    args = parser.parse_args(argv)
+    report = { "scripts": [] }
+    for script_path in args.scripts:
+        result = run_script(script_path, args.update_cache)
+        if args.compare:
+            result["startup"] = compare_startup_times(script_path)
+        print(get_run_summary(script_path, result))
+        result["script"] = script_path
+        report["scripts"].append(result)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=1)
+    return 0
@@ -0,0 +1,206 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 3
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# Code sinks receive the generated Python code. Code generation only calls sink.write(), so the same generator can
+# target a str, a file, or a Blender text-block. Output is buffered in memory (or written in fixed-size chunks), so
+# export time scales with bytes produced instead of with the number of Text.write() RNA calls.
+
+import gzip
+import io
+import os
+import tempfile
+
+# default number of characters buffered by streaming sinks before a chunk is written out
+DEFAULT_CHUNK_SIZE = 1 << 16
+
+# base sink, collects written strings in a list and joins them once when the sink is closed
+class CodeSink:
+    def __init__(self):
+        self.pieces = []
+
+    def write(self, s):
+        self.pieces.append(s)
+
+    # return all code written so far as one str
+    def getvalue(self):
+        return "".join(self.pieces)
+
+    # finish writing, and return the sink's result (e.g. the str, text-block, or file path)
+    def close(self):
+        return self.getvalue()
+
+    # stop writing without a result, e.g. because code generation failed
+    def abort(self):
+        self.pieces = []
+
+# sink that returns the generated code as a str
+class StringSink(CodeSink):
+    pass
+
+# sink that writes the generated code into a Blender text-block, with a single from_string() call when closed
+class TextBlockSink(CodeSink):
+    def __init__(self, text):
+        CodeSink.__init__(self)
+        self.text = text
+
+    def close(self):
+        self.text.from_string(self.getvalue())
+        self.pieces = []
+        # scroll to top of lines of text, so user sees start of script immediately upon opening the textblock
+        self.text.current_line_index = 0
+        self.text.cursor_set(0)
+        return self.text
+
+# sink that streams the generated code to an open file object (or any object with a write() method) in chunks of
+# approximately chunk_size characters
+class StreamSink(CodeSink):
+    def __init__(self, stream, chunk_size=DEFAULT_CHUNK_SIZE):
+        CodeSink.__init__(self)
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.buffered_len = 0
+
+    def write(self, s):
+        self.pieces.append(s)
+        self.buffered_len = self.buffered_len + len(s)
+        if self.buffered_len >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self.pieces:
+            self.stream.write("".join(self.pieces))
+            self.pieces = []
+            self.buffered_len = 0
+
+    def close(self):
+        self.flush()
+        return self.stream
+
+    def abort(self):
+        self.pieces = []
+        self.buffered_len = 0
+
+# open a temporary file (binary mode) in the directory of 'filepath', returns (file object, temporary file path), see
+# finish_atomic_file
+def open_atomic_file(filepath):
+    fd, write_path = tempfile.mkstemp(prefix="." + os.path.basename(filepath) + ".", suffix=".tmp",
+                                      dir=os.path.dirname(os.path.abspath(filepath)))
+    return os.fdopen(fd, "wb"), write_path
+
+# flush and close the temporary file opened by open_atomic_file, and move it to 'filepath', replacing the file at
+# 'filepath' (if any) in one step
+def finish_atomic_file(f, write_path, filepath):
+    f.flush()
+    os.fsync(f.fileno())
+    f.close()
+    # temporary files are created readable only by owner, so set default permissions of new files
+    umask = os.umask(0)
+    os.umask(umask)
+    os.chmod(write_path, 0o666 & ~umask)
+    os.replace(write_path, filepath)
+
+# write bytes to a file, 'chunks' is a list of bytes objects, if 'atomic' is True then the bytes are written to a
+# temporary file in the same directory, which replaces the file at 'filepath' only when all bytes are written (as
+# FileSink), returns 'filepath'
+def write_file_bytes(filepath, chunks, atomic=False):
+    if atomic:
+        f, write_path = open_atomic_file(filepath)
+    else:
+        f = open(filepath, "wb")
+    try:
+        for chunk in chunks:
+            f.write(chunk)
+    except BaseException:
+        f.close()
+        if atomic:
+            os.remove(write_path)
+        raise
+    if atomic:
+        finish_atomic_file(f, write_path, filepath)
+    else:
+        f.close()
+    return filepath
+
+# sink that writes the generated code to a file on disk, given by file path, in chunks (so memory used by the sink
+# stays bounded by chunk size),
+# if 'compress' is True then the file is gzip compressed,
+# if 'atomic' is True then code is written to a temporary file in the same directory, which replaces the file at
+# 'filepath' only when the sink is closed, so the file is never left partly written (e.g. if export fails)
+class FileSink(StreamSink):
+    def __init__(self, filepath, chunk_size=DEFAULT_CHUNK_SIZE, encoding="utf-8", compress=False, atomic=False):
+        self.filepath = filepath
+        self.write_path = filepath
+        if atomic:
+            self.file, self.write_path = open_atomic_file(filepath)
+        else:
+            self.file = open(filepath, "wb")
+        self.gzip_file = None
+        if compress:
+            # zero modification time, so same code gives same compressed file
+            self.gzip_file = gzip.GzipFile(filename=os.path.basename(filepath), mode="wb", fileobj=self.file,
+                                           mtime=0)
+            stream = io.TextIOWrapper(self.gzip_file, encoding=encoding)
+        else:
+            stream = io.TextIOWrapper(self.file, encoding=encoding)
+        StreamSink.__init__(self, stream, chunk_size)
+        self.atomic = atomic
+
+    def close_file(self):
+        self.stream.close()
+        # closing the gzip file does not close the file object it writes to
+        if not self.file.closed:
+            self.file.close()
+
+    def close(self):
+        StreamSink.close(self)
+        self.stream.flush()
+        if self.gzip_file != None:
+            self.gzip_file.close()
+        if self.atomic:
+            # stream is flushed, so closing the file first leaves nothing to write when the stream is closed
+            finish_atomic_file(self.file, self.write_path, self.filepath)
+        self.close_file()
+        return self.filepath
+
+    def abort(self):
+        StreamSink.abort(self)
+        self.close_file()
+        if self.atomic:
+            os.remove(self.write_path)
+
+# sink that forwards code to another sink, and counts the lines and bytes (UTF-8 encoded) written
+class CountingSink(CodeSink):
+    def __init__(self, sink):
+        CodeSink.__init__(self)
+        self.sink = sink
+        self.lines = 0
+        self.bytes = 0
+
+    def write(self, s):
+        self.lines = self.lines + s.count("\n")
+        self.bytes = self.bytes + len(s.encode("utf-8"))
+        self.sink.write(s)
+
+    def getvalue(self):
+        return self.sink.getvalue()
+
+    def close(self):
+        return self.sink.close()
+
+    def abort(self):
+        self.sink.abort()
@@ -0,0 +1,1104 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 3
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# Generation phase of export: write Python code from a node tree snapshot (see tree_ir.py). This module is pure
+# Python, it must not import bpy.
+
+import time
+
+from .code_sink import StringSink
+from .export_steps import run_steps
+from .export_stats import (PHASE_GROUP_INTERFACE, PHASE_UNI_ATTRS, PHASE_NODE_PROPS, PHASE_SOCKET_DEFAULTS,
+    PHASE_NODE_TABLES, PHASE_PARALLEL, PHASE_PARENTING, PHASE_LINKS, add_phase_time_since, add_node_type_time,
+    count_shared_configs)
+from .fragment_cache import get_node_fingerprint, get_links_fingerprint
+from .node_schema import (SCHEMA_KIND_COLOR_RAMP, SCHEMA_KIND_CURVE_MAPPING)
+from .tree_ir import (IDRef, TREE_KIND_GROUP, TREE_KIND_COMPOSITOR, TREE_KIND_WORLD, TREE_KIND_LINESTYLE,
+    TREE_KIND_COLLECTIONS)
+from .worker_pool import CHUNKS_PER_WORKER, worker_state, get_num_workers, get_chunk_ranges, iter_run_tasks
+
+WRITE_DEFAULTS_UNI_NODE_OPT = "write_defaults"
+WRITE_LINKED_DEFAULTS_UNI_NODE_OPT = "write_linked_defaults"
+LOC_DEC_PLACES_UNI_NODE_OPT = "loc_decimal_places"
+WRITE_ATTR_NAME_UNI_NODE_OPT = "write_attr_name"
+WRITE_ATTR_WIDTH_HEIGHT_UNI_NODE_OPT = "write_attr_width_height"
+WRITE_ATTR_SELECT_UNI_NODE_OPT = "write_attr_select"
+
+# code generation options, see make_gen_options
+LINE_PREFIX_GEN_OPT = "line_prefix"
+KEEP_LINKS_GEN_OPT = "keep_links"
+MAKE_FUNCTION_GEN_OPT = "make_function"
+DELETE_EXISTING_GEN_OPT = "delete_existing"
+NG_OUTPUT_MIN_MAX_DEF_GEN_OPT = "ng_output_min_max_def"
+SOCKET_IDENTIFIERS_GEN_OPT = "socket_identifiers"
+OUTPUT_STYLE_GEN_OPT = "output_style"
+STATS_GEN_OPT = "stats"
+CALL_FUNCTION_GEN_OPT = "call_function"
+DEDUPE_CONFIGS_GEN_OPT = "dedupe_configs"
+WORKERS_GEN_OPT = "workers"
+DEFERRED_UPDATE_GEN_OPT = "deferred_update"
+
+# unrolled style writes a few lines of code per node attribute and link, compact style writes literal tables of
+# nodes and links, applied by generic builder loops (smaller scripts that are faster to parse and compile)
+OUTPUT_STYLE_UNROLLED = "UNROLLED"
+OUTPUT_STYLE_COMPACT = "COMPACT"
+
+FLOAT_MAX = 340282346638528859811704183484516925440.0
+
+# minimum number of nodes with the same configuration (type and settings) for the configuration to be written once, as
+# a shared function (unrolled style with dedupe configs option)
+MIN_SHARED_CONFIG_NODES = 2
+SHARED_CONFIG_FUNC_NAME = "new_config_node_%d"
+
+# escape sequences of characters that cannot be written as is in a double-quoted Python string
+STRING_ESCAPES = str.maketrans({"\\": "\\\\", "\"": "\\\"", "\n": "\\n", "\r": "\\r", "\t": "\\t"})
+
+# add escape characters to backslashes, double-quote chars, and line breaks/tabs in given string
+def esc_char_string(in_str):
+    # most strings have no characters to escape, and checking is faster than translating
+    if '\\' in in_str or '"' in in_str or '\n' in in_str or '\r' in in_str or '\t' in in_str:
+        return in_str.translate(STRING_ESCAPES)
+    return in_str
+
+def format_code_string(in_str):
+    return "\"" + esc_char_string(in_str) + "\""
+
+# get code for an element of a set or tuple (numbers are written with full precision)
+def format_item(item):
+    if isinstance(item, str):
+        return format_code_string(item)
+    return str(item)
+
+# write elements of a set in braces
+def format_set_value(value):
+    return "{" + ", ".join([format_item(item) for item in value]) + "}"
+
+# write elements of a Vector, Color, etc. in a tuple
+def format_tuple_value(value):
+    for item in value:
+        if isinstance(item, str):
+            return "(" + ", ".join([format_item(item) for item in value]) + ")"
+    # no strings, so elements are written with one join
+    return "(" + ", ".join(map(str, value)) + ")"
+
+def format_id_ref_value(value):
+    return "bpy.data." + value.collection + ".get(" + format_code_string(value.name) + ")"
+
+def format_unknown_value(value):
+    return None
+
+# functions to get Python code for captured values, by exact type of value (see snapshot.capture_value), for
+# subclasses of these types the function of the first base type found in this dict is used
+value_formatters = {
+    str: format_code_string,
+    bool: str,
+    int: "%d".__mod__,
+    float: "%f".__mod__,
+    set: format_set_value,
+    tuple: format_tuple_value,
+    IDRef: format_id_ref_value,
+}
+
+# get Python code string for a captured value (see snapshot.capture_value), returns None if value type is unknown
+def format_value(value):
+    formatter = value_formatters.get(type(value))
+    if formatter == None:
+        # unknown types are formatted as None
+        formatter = format_unknown_value
+        for value_type, type_formatter in list(value_formatters.items()):
+            if isinstance(value, value_type):
+                formatter = type_formatter
+                break
+        value_formatters[type(value)] = formatter
+    return formatter(value)
+
+def compare_to_value(value, va):
+    if hasattr(value, '__len__') and hasattr(va, '__len__'):
+        # False if lengths of objects are different
+        if len(value) != len(va):
+            return False
+        # is it a set?
+        if isinstance(value, set):
+            c = 0
+            for item in value:
+                if item != va[c]:
+                    return False
+                c = c + 1
+        else:
+            for val_index in range(len(value)):
+                if value[val_index] != va[val_index]:
+                    return False
+        return True
+    else:
+        return value == va
+
+def get_line_prefix(space_pad):
+    if isinstance(space_pad, int):
+        return " " * space_pad
+    elif isinstance(space_pad, str):
+        return space_pad
+    return ""
+
+def make_gen_options(space_pad=4, keep_links=False, make_into_function=True, delete_existing=True,
+                     ng_output_min_max_def=False, use_socket_identifiers=False, output_style=OUTPUT_STYLE_UNROLLED,
+                     stats=None, call_function=True, dedupe_configs=False, num_workers=1, deferred_update=False):
+    return {
+        LINE_PREFIX_GEN_OPT: get_line_prefix(space_pad),
+        KEEP_LINKS_GEN_OPT: keep_links,
+        MAKE_FUNCTION_GEN_OPT: make_into_function,
+        DELETE_EXISTING_GEN_OPT: delete_existing,
+        NG_OUTPUT_MIN_MAX_DEF_GEN_OPT: ng_output_min_max_def,
+        SOCKET_IDENTIFIERS_GEN_OPT: use_socket_identifiers,
+        OUTPUT_STYLE_GEN_OPT: output_style,
+        # export stats dict (see export_stats.py) to add time per phase and per node type to, or None
+        STATS_GEN_OPT: stats,
+        # if False then the function is defined but not called, e.g. so the caller can call it to create nodes in a
+        # datablock of its choice (see verify.py)
+        CALL_FUNCTION_GEN_OPT: call_function,
+        # if True then nodes with the same configuration are created by calling a shared function, written once per
+        # configuration (unrolled style only)
+        DEDUPE_CONFIGS_GEN_OPT: dedupe_configs,
+        # number of worker processes that generate code of nodes and links of very large trees (unrolled style
+        # without dedupe configs), 0 is one worker per CPU, the code is the same as code generated in one process
+        # (see worker_pool.py)
+        WORKERS_GEN_OPT: num_workers,
+        # if True then nodes are created in a datablock that is not used (a new node group, or a copy of the
+        # material), which then replaces the old datablock in all its users, so users are not updated after each
+        # change of the tree (not possible for compositor node trees, which are part of their scene)
+        DEFERRED_UPDATE_GEN_OPT: deferred_update,
+    }
+
+# escape '%' characters so string can be part of a format template
+def escape_format(in_str):
+    return in_str.replace("%", "%%")
+
+# get flat list of values from lists of equal length, taking one value from each list in turn, e.g. lists [x0, x1]
+# and [y0, y1] give [x0, y0, x1, y1]
+def interleave_values(value_lists):
+    stride = len(value_lists)
+    values = [None] * (len(value_lists[0]) * stride)
+    for list_index, value_list in enumerate(value_lists):
+        values[list_index::stride] = value_list
+    return values
+
+# get Python code for a tuple of floats, formatted with one format operation
+def format_float_tuple(values):
+    if len(values) == 1:
+        return "(%f,)" % values[0]
+    return "(" + ", ".join(["%f"] * len(values)) % tuple(values) + ")"
+
+def write_color_ramp(m2p_text, line_prefix, attr_name, ramp):
+    m2p_text.write(line_prefix + "node." + attr_name + ".color_mode = \"%s\"\n" % ramp.color_mode)
+    m2p_text.write(line_prefix + "node." + attr_name + ".interpolation = \"%s\"\n" % ramp.interpolation)
+    # remove one element before adding any new elements, leaving the minimum of one element in list
+    # (deleting last element causes Blender error, but one elements needs to be deleted in case only 1 is used)
+    m2p_text.write(line_prefix + "node." + attr_name + ".elements.remove(" + "node." + attr_name +
+                   ".elements[0])\n")
+    num_elements = len(ramp.positions)
+    if num_elements == 0:
+        return
+    # code of all elements is formatted at once, from one template with values of each element: position, and
+    # color (R, G, B, A)
+    template_prefix = escape_format(line_prefix)
+    template_attr = escape_format(attr_name)
+    color_template = template_prefix + "elem.color = (%f, %f, %f, %f)\n"
+    # if writing first element then don't create new element, else create new element
+    template = template_prefix + "elem = node." + template_attr + ".elements[0]\n" + \
+        template_prefix + "elem.position = %f\n" + color_template + \
+        (template_prefix + "elem = node." + template_attr + ".elements.new(%f)\n" + color_template) * \
+        (num_elements - 1)
+    m2p_text.write(template % tuple(interleave_values([ramp.positions, ramp.colors[0::4], ramp.colors[1::4],
+                                                       ramp.colors[2::4], ramp.colors[3::4]])))
+
+def write_curve_mapping(m2p_text, line_prefix, attr_name, mapping):
+    m2p_text.write(line_prefix + "node." + attr_name + ".use_clip = %s\n" % mapping.use_clip)
+    m2p_text.write(line_prefix + "node." + attr_name + ".clip_min_x = %f\n" % mapping.clip_min_x)
+    m2p_text.write(line_prefix + "node." + attr_name + ".clip_min_y = %f\n" % mapping.clip_min_y)
+    m2p_text.write(line_prefix + "node." + attr_name + ".clip_max_x = %f\n" % mapping.clip_max_x)
+    m2p_text.write(line_prefix + "node." + attr_name + ".clip_max_y = %f\n" % mapping.clip_max_y)
+    m2p_text.write(line_prefix + "node." + attr_name + ".extend = \"%s\"\n" % mapping.extend)
+    template_prefix = escape_format(line_prefix)
+    template_attr = escape_format(attr_name)
+    handle_template = template_prefix + "point.handle_type = \"%s\"\n"
+    # note: Float Curve and Time Curve have 1 curve, RGB curve has 4 curves (C, R, G, B)
+    for curve_index, curve in enumerate(mapping.curves):
+        num_points = len(curve.handle_types)
+        # code of all points of the curve is formatted at once, from one template with values of each point:
+        # location x, location y, handle type
+        # each curve starts with 2 points by default, so write into these points before creating more
+        # (2 points minimum, cannot delete them)
+        template = "".join([template_prefix + "point = node." + template_attr + ".curves[%d].points[%d]\n" %
+                            (curve_index, point_index) + template_prefix + "point.location = (%f, %f)\n" +
+                            handle_template for point_index in range(min(num_points, 2))])
+        # create new points
+        if num_points > 2:
+            template = template + (template_prefix + "point = node." + template_attr +
+                                   ".curves[%d].points.new(%%f, %%f)\n" % curve_index + handle_template) * \
+                                  (num_points - 2)
+        m2p_text.write(template % tuple(interleave_values([curve.locations[0::2], curve.locations[1::2],
+                                                           curve.handle_types])))
+
+    # reset the clipping view
+    m2p_text.write(line_prefix + "node." + attr_name + ".reset_view()\n")
+    # update the view of the mapping (trigger UI update)
+    m2p_text.write(line_prefix + "node." + attr_name + ".update()\n")
+
+# write node type specific attributes, 'props' is a list of (attribute name, schema kind, value)
+def write_node_props(m2p_text, line_prefix, props):
+    for attr_name, attr_kind, value in props:
+        # if type is Color Ramp
+        if attr_kind == SCHEMA_KIND_COLOR_RAMP:
+            write_color_ramp(m2p_text, line_prefix, attr_name, value)
+        # if type is Curve Mapping, e.g. nodes Float Curve (Shader), RGB Curve (Shader), Time Curve (Compositor)
+        elif attr_kind == SCHEMA_KIND_CURVE_MAPPING:
+            write_curve_mapping(m2p_text, line_prefix, attr_name, value)
+        # remaining types are String, Integer, Float, etc. (including bpy.types, e.g. bpy.types.Collection)
+        else:
+            val_str = format_value(value)
+            if val_str != None:
+                m2p_text.write(line_prefix + "node." + attr_name + " = " + val_str + "\n")
+
+# returns True if group input/output default value needs to be written
+def is_interface_default_written(ng_socket):
+    return ng_socket.default_value != None and ng_socket.default_value != 0.0 and \
+        not compare_to_value(ng_socket.default_value, (0.0, 0.0, 0.0)) and \
+        not ( ng_socket.bl_socket_idname == 'NodeSocketColor' and \
+              compare_to_value(ng_socket.default_value, (0.0, 0.0, 0.0, 1.0)) )
+
+def write_group_interface(m2p_text, line_prefix, tree, ng_output_min_max_def):
+    if len(tree.group_inputs) > 0 or len(tree.group_outputs) > 0:
+        m2p_text.write(line_prefix + "# create new group inputs and outputs\n")
+    # write group inputs
+    for ng_input in tree.group_inputs:
+        # collect lines to be written before writing, to allow for checking if input attributes need to be written
+        lines_to_write = []
+        # check/write the min, max, default, and 'hide value' data
+        if ng_input.min_value != None and ng_input.min_value != -FLOAT_MAX:
+            lines_to_write.append(line_prefix + "new_input.min_value = " + format_value(ng_input.min_value) + "\n")
+        if ng_input.max_value != None and ng_input.max_value != FLOAT_MAX:
+            lines_to_write.append(line_prefix + "new_input.max_value = " + format_value(ng_input.max_value) + "\n")
+        if is_interface_default_written(ng_input):
+            lines_to_write.append(line_prefix + "new_input.default_value = " +
+                                  format_value(ng_input.default_value) + "\n")
+        if ng_input.hide_value:
+            lines_to_write.append(line_prefix + "new_input.hide_value = True\n")
+        # create new_input variable only if necessary, i.e. if input attribute values differ from default values
+        if len(lines_to_write) > 0:
+            m2p_text.write(line_prefix + "new_input = new_node_group.inputs.new(type='" +
+                           ng_input.bl_socket_idname + "', name=" + format_code_string(ng_input.name) + ")\n")
+            m2p_text.write("".join(lines_to_write))
+        else:
+            m2p_text.write(line_prefix + "new_node_group.inputs.new(type='" + ng_input.bl_socket_idname +
+                           "', name=" + format_code_string(ng_input.name) + ")\n")
+    # write group outputs
+    for ng_output in tree.group_outputs:
+        # collect lines to be written before writing, to allow for checking if input attributes need to be
+        # written
+        lines_to_write = []
+        # write values for node group output min/max/default if needed
+        if ng_output_min_max_def:
+            # check/write the min, max, default, and 'hide value' data
+            if ng_output.min_value != None and ng_output.min_value != -FLOAT_MAX:
+                lines_to_write.append(line_prefix + "new_output.min_value = " +
+                                      format_value(ng_output.min_value) + "\n")
+            if ng_output.max_value != None and ng_output.max_value != FLOAT_MAX:
+                lines_to_write.append(line_prefix + "new_output.max_value = " +
+                                      format_value(ng_output.max_value) + "\n")
+            if is_interface_default_written(ng_output):
+                lines_to_write.append(line_prefix + "new_output.default_value = " +
+                                      format_value(ng_output.default_value) + "\n")
+        if ng_output.hide_value:
+            lines_to_write.append(line_prefix + "new_output.hide_value = True\n")
+        if ng_output.attribute_domain != None and ng_output.attribute_domain != "POINT":
+            lines_to_write.append(line_prefix + "new_output.attribute_domain = '" + ng_output.attribute_domain +
+                                  "'\n")
+        if ng_output.default_attribute_name != None and ng_output.default_attribute_name != "":
+            lines_to_write.append(line_prefix + "new_output.default_attribute_name = " +
+                                  format_value(ng_output.default_attribute_name) + "\n")
+        # create new_output variable only if necessary, i.e. if output attribute values differ from default
+        # values
+        if len(lines_to_write) > 0:
+            m2p_text.write(line_prefix + "new_output = new_node_group.outputs.new(type='" +
+                           ng_output.bl_socket_idname + "', name=" + format_code_string(ng_output.name) + ")\n")
+            m2p_text.write("".join(lines_to_write))
+        else:
+            m2p_text.write(line_prefix + "new_node_group.outputs.new(type='" + ng_output.bl_socket_idname +
+                           "', name=" + format_code_string(ng_output.name) + ")\n")
+
+# get list of (attribute name, captured value) of the attributes common to all nodes that need to be written
+def get_written_uni_attr_values(node, uni_node_options):
+    written_attrs = []
+    for attr, value, is_default in node.uni_attrs:
+        # if write defaults is not enabled, and a default value is found, then skip the default value
+        if not uni_node_options[WRITE_DEFAULTS_UNI_NODE_OPT] and is_default:
+            continue
+        # if not writing 'name' then skip
+        elif attr == 'name' and uni_node_options[WRITE_ATTR_NAME_UNI_NODE_OPT] == False:
+            continue
+        # if not writing width and height then skip
+        elif (attr == 'width' or attr == 'height') and \
+                uni_node_options[WRITE_ATTR_WIDTH_HEIGHT_UNI_NODE_OPT] == False:
+            continue
+        # if not writing select state then skip
+        elif attr == 'select' and uni_node_options[WRITE_ATTR_SELECT_UNI_NODE_OPT] == False:
+            continue
+        written_attrs.append((attr, value))
+    return written_attrs
+
+# get list of (attribute name, value code string) of the attributes common to all nodes that need to be written
+def get_written_uni_attrs(node, uni_node_options):
+    return [(attr, format_value(value)) for attr, value in get_written_uni_attr_values(node, uni_node_options)]
+
+# returns True if default value of node input needs to be written
+def is_input_value_written(node_input, uni_node_options):
+    if node_input.hide_value or node_input.default_value == None:
+        return False
+    # if 'do not write linked default values', and this input socket is linked then skip
+    return uni_node_options[WRITE_LINKED_DEFAULTS_UNI_NODE_OPT] or not node_input.is_linked
+
+# get list of (socket index, default value code string) of node input default values that need to be written,
+# each input might be [ float, (R, G, B, A), (X, Y, Z), shader ]
+# TODO: this part needs more testing re: different node input default value(s) and type(s)
+def get_written_input_values(node, uni_node_options):
+    written_values = []
+    for node_input in node.inputs:
+        if not is_input_value_written(node_input, uni_node_options):
+            continue
+        value_str = format_value(node_input.default_value)
+        if value_str != None:
+            written_values.append((node_input.index, value_str))
+    return written_values
+
+# get list of (socket index, default value code string) of node output default values that need to be written
+# (only captured for nodes with written outputs, and always written even if linked, because the node is special)
+def get_written_output_values(node):
+    written_values = []
+    for node_output in node.outputs:
+        if node_output.default_value == None:
+            continue
+        value_str = format_value(node_output.default_value)
+        if value_str != None:
+            written_values.append((node_output.index, value_str))
+    return written_values
+
+# do rounding of location values, if needed, and get the location code string
+def format_location(location, uni_node_options):
+    precision = uni_node_options[LOC_DEC_PLACES_UNI_NODE_OPT]
+    return "(%0.*f, %0.*f)" % (precision, location[0], precision, location[1])
+
+# if 'stats' is not None then time taken by each part of the node's code is added to the phases of export stats
+def write_node(m2p_text, line_prefix, node, uni_node_options, stats=None):
+    if stats != None:
+        start_time = time.perf_counter()
+    m2p_text.write(line_prefix + "node = tree_nodes.new(type=\"%s\")\n" % node.bl_idname)
+    for attr, value_str in get_written_uni_attrs(node, uni_node_options):
+        m2p_text.write(line_prefix + "node." + attr + " = " + value_str + "\n")
+    m2p_text.write(line_prefix + "node.location = " + format_location(node.location, uni_node_options) + "\n")
+    if stats != None:
+        add_phase_time_since(stats, PHASE_UNI_ATTRS, start_time)
+        start_time = time.perf_counter()
+
+    write_node_props(m2p_text, line_prefix, node.props)
+    if stats != None:
+        add_phase_time_since(stats, PHASE_NODE_PROPS, start_time)
+        start_time = time.perf_counter()
+
+    for index, value_str in get_written_input_values(node, uni_node_options):
+        m2p_text.write(line_prefix+"node.inputs["+str(index)+"].default_value = "+value_str+"\n")
+    for index, value_str in get_written_output_values(node):
+        m2p_text.write(line_prefix+"node.outputs["+str(index)+"].default_value = "+value_str+"\n")
+
+    m2p_text.write(line_prefix + "new_nodes[" + format_code_string(node.name) + "] = node\n\n")
+    if stats != None:
+        add_phase_time_since(stats, PHASE_SOCKET_DEFAULTS, start_time)
+
+# get the configuration code of one node (unrolled style), i.e. the code that sets the node's attributes (except name),
+# node type specific attributes, and socket default values, as a tuple of (attributes code, properties and socket
+# values code), the location of the node is set between the two parts (see write_node), nodes with equal
+# configuration code and type can be created by one shared function,
+# if 'stats' is not None then time taken by each part of the code is added to the phases of export stats
+def get_node_config_code(node, line_prefix, uni_node_options, stats=None):
+    if stats != None:
+        start_time = time.perf_counter()
+    attrs_text = StringSink()
+    for attr, value_str in get_written_uni_attrs(node, uni_node_options):
+        if attr != 'name':
+            attrs_text.write(line_prefix + "node." + attr + " = " + value_str + "\n")
+    if stats != None:
+        add_phase_time_since(stats, PHASE_UNI_ATTRS, start_time)
+        start_time = time.perf_counter()
+
+    props_text = StringSink()
+    write_node_props(props_text, line_prefix, node.props)
+    if stats != None:
+        add_phase_time_since(stats, PHASE_NODE_PROPS, start_time)
+        start_time = time.perf_counter()
+
+    for index, value_str in get_written_input_values(node, uni_node_options):
+        props_text.write(line_prefix+"node.inputs["+str(index)+"].default_value = "+value_str+"\n")
+    for index, value_str in get_written_output_values(node):
+        props_text.write(line_prefix+"node.outputs["+str(index)+"].default_value = "+value_str+"\n")
+    if stats != None:
+        add_phase_time_since(stats, PHASE_SOCKET_DEFAULTS, start_time)
+    return attrs_text.getvalue(), props_text.getvalue()
+
+# write code of one node from its configuration code (see get_node_config_code)
+def write_config_node(m2p_text, line_prefix, node, config_code, uni_node_options):
+    m2p_text.write(line_prefix + "node = tree_nodes.new(type=\"%s\")\n" % node.bl_idname)
+    if uni_node_options[WRITE_ATTR_NAME_UNI_NODE_OPT]:
+        m2p_text.write(line_prefix + "node.name = " + format_code_string(node.name) + "\n")
+    m2p_text.write(config_code[0] + line_prefix + "node.location = " +
+                   format_location(node.location, uni_node_options) + "\n" + config_code[1] +
+                   line_prefix + "new_nodes[" + format_code_string(node.name) + "] = node\n\n")
+
+# write function that creates a node with the given configuration code (see get_node_config_code), with name and
+# location given by the function's arguments
+def write_shared_config_function(m2p_text, line_prefix, func_name, bl_idname, config_code, uni_node_options):
+    # configuration code is indented by line prefix, which is only spaces, so the function body is indented by
+    # adding spaces to each line
+    body_prefix = line_prefix + "    "
+    m2p_text.write(line_prefix + "def " + func_name + "(name, location):\n" +
+                   body_prefix + "node = tree_nodes.new(type=\"%s\")\n" % bl_idname)
+    if uni_node_options[WRITE_ATTR_NAME_UNI_NODE_OPT]:
+        m2p_text.write(body_prefix + "node.name = name\n")
+    attrs_code, props_code = config_code
+    m2p_text.write("".join(["    " + line + "\n" for line in attrs_code.splitlines()]) +
+                   body_prefix + "node.location = location\n" +
+                   "".join(["    " + line + "\n" for line in props_code.splitlines()]) +
+                   body_prefix + "new_nodes[name] = node\n\n")
+
+# write nodes in unrolled style, with nodes of the same configuration (type and settings, i.e. differing only in name
+# and location) created by calling a function shared by the nodes, written once per configuration, in steps (yields
+# after the configuration of each node is generated, see export_steps.py)
+def iter_write_shared_config_nodes(m2p_text, line_prefix, tree, gen_options, uni_node_options, fragment_cache=None):
+    stats = gen_options[STATS_GEN_OPT]
+    node_configs = []
+    config_counts = {}
+    for node in tree.nodes:
+        if stats != None:
+            node_start_time = time.perf_counter()
+        config_code = None
+        if fragment_cache != None:
+            key = (line_prefix, DEDUPE_CONFIGS_GEN_OPT, get_node_fingerprint(node))
+            config_code = fragment_cache.get(key)
+        if config_code == None:
+            config_code = get_node_config_code(node, line_prefix, uni_node_options, stats)
+            if fragment_cache != None:
+                fragment_cache.put(key, config_code)
+        # configuration code is hashed as is, i.e. nodes share a function only if they would be written with the
+        # exact same code
+        config_key = (node.bl_idname, config_code)
+        node_configs.append(config_key)
+        config_counts[config_key] = config_counts.get(config_key, 0) + 1
+        if stats != None:
+            add_node_type_time(stats, node.bl_idname, time.perf_counter() - node_start_time)
+        yield
+
+    if stats != None:
+        start_time = time.perf_counter()
+    # functions are numbered in order of first use
+    config_funcs = {}
+    for config_key in node_configs:
+        if config_counts[config_key] >= MIN_SHARED_CONFIG_NODES and config_key not in config_funcs:
+            config_funcs[config_key] = SHARED_CONFIG_FUNC_NAME % len(config_funcs)
+    if len(config_funcs) > 0:
+        m2p_text.write(line_prefix + "# shared node configurations, i.e. functions that create nodes of the same " +
+                       "type and settings\n")
+        for config_key, func_name in config_funcs.items():
+            write_shared_config_function(m2p_text, line_prefix, func_name, config_key[0], config_key[1],
+                                         uni_node_options)
+    # calls of shared functions are written one per line, runs of calls are separated from other nodes by an empty line
+    is_call_run = False
+    for node, config_key in zip(tree.nodes, node_configs):
+        func_name = config_funcs.get(config_key)
+        if func_name == None:
+            if is_call_run:
+                m2p_text.write("\n")
+                is_call_run = False
+            write_config_node(m2p_text, line_prefix, node, config_key[1], uni_node_options)
+        else:
+            m2p_text.write(line_prefix + func_name + "(" + format_code_string(node.name) + ", " +
+                           format_location(node.location, uni_node_options) + ")\n")
+            is_call_run = True
+    if is_call_run:
+        m2p_text.write("\n")
+    if stats != None:
+        add_phase_time_since(stats, PHASE_NODE_TABLES, start_time)
+        count_shared_configs(stats, len(config_funcs), sum([config_counts[k] for k in config_funcs]))
+
+# get Python code that references the socket at the end of a link, e.g. new_nodes["Math"].inputs[1]
+def get_link_socket_str(node_name, io_attr, index, identifier, use_socket_identifiers):
+    sockets_str = "new_nodes[" + format_code_string(node_name) + "]." + io_attr
+    if use_socket_identifiers and identifier != None:
+        return "link_socket(" + sockets_str + ", \"" + esc_char_string(identifier) + "\", " + str(index) + ")"
+    return sockets_str + "[" + str(index) + "]"
+
+# write start of links code, returns True if links need to be written by socket identifier
+def write_links_header(m2p_text, line_prefix, tree, keep_links, use_socket_identifiers):
+    m2p_text.write(line_prefix + "# create links\n")
+    if keep_links:
+        m2p_text.write(line_prefix + "new_links = []\n")
+    if tree.kind == TREE_KIND_GROUP:
+        m2p_text.write(line_prefix + "tree_links = new_node_group.links\n")
+    else:
+        m2p_text.write(line_prefix + "tree_links = material.node_tree.links\n")
+    if use_socket_identifiers and len(tree.links) > 0:
+        write_link_socket_function(m2p_text, line_prefix)
+        return True
+    return False
+
+# write function that gets the socket of a link by identifier (see get_link_socket_str)
+def write_link_socket_function(m2p_text, line_prefix):
+    # sockets are found by identifier, so links stay correct if sockets are hidden, unavailable, or reordered
+    m2p_text.write(line_prefix + "def link_socket(sockets, identifier, index):\n" +
+                   line_prefix + "    if index < len(sockets) and sockets[index].identifier == identifier:\n" +
+                   line_prefix + "        return sockets[index]\n" +
+                   line_prefix + "    for s in sockets:\n" +
+                   line_prefix + "        if s.identifier == identifier:\n" +
+                   line_prefix + "            return s\n" +
+                   line_prefix + "    return sockets[index]\n")
+
+def write_links(m2p_text, line_prefix, tree, keep_links, use_socket_identifiers):
+    use_socket_identifiers = write_links_header(m2p_text, line_prefix, tree, keep_links, use_socket_identifiers)
+    write_link_lines(m2p_text, line_prefix, tree.links, keep_links, use_socket_identifiers)
+
+# write the code that creates the captured links, after the links header (see write_links_header)
+def write_link_lines(m2p_text, line_prefix, links, keep_links, use_socket_identifiers):
+    flint = ""
+    if keep_links:
+        flint = "link = "
+    for link in links:
+        m2p_text.write(line_prefix + flint + "tree_links.new(" +
+            get_link_socket_str(link.from_node, "outputs", link.from_index, link.from_identifier,
+                                use_socket_identifiers) + ", " +
+            get_link_socket_str(link.to_node, "inputs", link.to_index, link.to_identifier, use_socket_identifiers) +
+            ")\n")
+        if keep_links:
+            m2p_text.write(line_prefix + "new_links.append(link)\n")
+
+# get code of a range of nodes of the tree in worker_state (unrolled style), run by a worker process
+def format_node_range(start, end):
+    m2p_text = StringSink()
+    for node in worker_state["tree"].nodes[start:end]:
+        write_node(m2p_text, worker_state["line_prefix"], node, worker_state["uni_node_options"])
+    return m2p_text.getvalue()
+
+# get code of a range of links of the tree in worker_state, run by a worker process
+def format_link_range(start, end):
+    m2p_text = StringSink()
+    write_link_lines(m2p_text, worker_state["line_prefix"], worker_state["tree"].links[start:end],
+                     worker_state["keep_links"], worker_state["use_socket_identifiers"])
+    return m2p_text.getvalue()
+
+# write code of all nodes (unrolled style) generated in 'num_workers' worker processes, while the workers also generate
+# the code of the link lines (see write_link_lines), yields after the code of each node is written (see
+# export_steps.py), and returns the code of the link lines, chunks of code are joined in order, so the code is the
+# same as code generated in one process
+def iter_write_parallel_nodes(m2p_text, line_prefix, tree, gen_options, uni_node_options, num_workers):
+    tasks = [(format_node_range, start, end) for start, end in
+             get_chunk_ranges(len(tree.nodes), num_workers * CHUNKS_PER_WORKER)]
+    num_node_tasks = len(tasks)
+    tasks.extend([(format_link_range, start, end) for start, end in
+                  get_chunk_ranges(len(tree.links), num_workers * CHUNKS_PER_WORKER)])
+    state = { "tree": tree, "line_prefix": line_prefix, "uni_node_options": uni_node_options,
+              "keep_links": gen_options[KEEP_LINKS_GEN_OPT],
+              "use_socket_identifiers": gen_options[SOCKET_IDENTIFIERS_GEN_OPT] }
+    link_codes = []
+    results = iter_run_tasks(tasks, state, num_workers)
+    try:
+        for task_index, code in enumerate(results):
+            if task_index >= num_node_tasks:
+                link_codes.append(code)
+                continue
+            m2p_text.write(code)
+            _, start, end = tasks[task_index]
+            for _ in range(end - start):
+                yield
+    finally:
+        # stop the workers now, if export is cancelled
+        results.close()
+    return "".join(link_codes)
+
+# get Python code for a tuple with the given code strings as elements
+def format_code_tuple(items):
+    if len(items) == 1:
+        return "(" + items[0] + ",)"
+    return "(" + ", ".join(items) + ")"
+
+# write a literal table (list of tuples), one row per line
+def write_code_table(m2p_text, line_prefix, table_name, rows):
+    m2p_text.write(line_prefix + table_name + " = [\n")
+    for row in rows:
+        m2p_text.write(line_prefix + "    " + row + ",\n")
+    m2p_text.write(line_prefix + "]\n")
+
+# get compact style table rows of node, returns (node row, list of color ramp rows, list of curve mapping rows),
+# if 'stats' is not None then time taken by each part of the rows is added to the phases of export stats
+def get_compact_node_rows(node, uni_node_options, stats=None):
+    if stats != None:
+        start_time = time.perf_counter()
+    color_ramp_rows = []
+    curve_mapping_rows = []
+    # attributes and socket default values are flat tuples of (name, value) and (index, value) pairs, fewer
+    # nested literals make the script faster to compile
+    attrs = []
+    for attr, value_str in get_written_uni_attrs(node, uni_node_options):
+        attrs.extend([format_code_string(attr), value_str])
+    if stats != None:
+        add_phase_time_since(stats, PHASE_UNI_ATTRS, start_time)
+        start_time = time.perf_counter()
+    for attr_name, attr_kind, value in node.props:
+        # element positions and colors, and curve point locations, are flat tuples of floats, set in bulk with
+        # foreach_set()
+        if attr_kind == SCHEMA_KIND_COLOR_RAMP:
+            color_ramp_rows.append(format_code_tuple([format_code_string(node.name),
+                format_code_string(attr_name), format_code_string(value.color_mode),
+                format_code_string(value.interpolation), format_float_tuple(value.positions),
+                format_float_tuple(value.colors)]))
+        elif attr_kind == SCHEMA_KIND_CURVE_MAPPING:
+            curves = []
+            for curve in value.curves:
+                curves.append(format_code_tuple([format_float_tuple(curve.locations),
+                    format_code_tuple([format_code_string(handle_type) for handle_type in curve.handle_types])]))
+            curve_mapping_rows.append(format_code_tuple([format_code_string(node.name),
+                format_code_string(attr_name), "%s" % value.use_clip, "%f" % value.clip_min_x,
+                "%f" % value.clip_min_y, "%f" % value.clip_max_x, "%f" % value.clip_max_y,
+                format_code_string(value.extend), format_code_tuple(curves)]))
+        else:
+            val_str = format_value(value)
+            if val_str != None:
+                attrs.extend([format_code_string(attr_name), val_str])
+    if stats != None:
+        add_phase_time_since(stats, PHASE_NODE_PROPS, start_time)
+        start_time = time.perf_counter()
+    input_values = []
+    for index, value_str in get_written_input_values(node, uni_node_options):
+        input_values.extend([str(index), value_str])
+    output_values = []
+    for index, value_str in get_written_output_values(node):
+        output_values.extend([str(index), value_str])
+    node_row = format_code_tuple([format_code_string(node.bl_idname), format_code_string(node.name),
+        format_location(node.location, uni_node_options), format_code_tuple(attrs),
+        format_code_tuple(input_values), format_code_tuple(output_values)])
+    if stats != None:
+        add_phase_time_since(stats, PHASE_SOCKET_DEFAULTS, start_time)
+    return node_row, color_ramp_rows, curve_mapping_rows
+
+# get the code of one node (unrolled style), or the table rows of one node (compact style), re-using the fragment
+# in 'fragment_cache' (see fragment_cache.py) if the same node data was written before
+def get_node_fragment(node, line_prefix, gen_options, uni_node_options, fragment_cache):
+    if fragment_cache != None:
+        key = (line_prefix, get_node_fingerprint(node))
+        fragment = fragment_cache.get(key)
+        if fragment != None:
+            return fragment
+    if gen_options[OUTPUT_STYLE_GEN_OPT] == OUTPUT_STYLE_COMPACT:
+        fragment = get_compact_node_rows(node, uni_node_options, gen_options[STATS_GEN_OPT])
+    else:
+        node_text = StringSink()
+        write_node(node_text, line_prefix, node, uni_node_options, gen_options[STATS_GEN_OPT])
+        fragment = node_text.getvalue()
+    if fragment_cache != None:
+        fragment_cache.put(key, fragment)
+    return fragment
+
+# get the code that creates the links of the tree, re-using the fragment in 'fragment_cache' if the same links were
+# written before
+def get_links_fragment(tree, line_prefix, gen_options, fragment_cache):
+    key = (line_prefix, tree.kind == TREE_KIND_GROUP, get_links_fingerprint(tree.links))
+    fragment = fragment_cache.get(key)
+    if fragment == None:
+        links_text = StringSink()
+        if gen_options[OUTPUT_STYLE_GEN_OPT] == OUTPUT_STYLE_COMPACT:
+            write_compact_links(links_text, line_prefix, tree, gen_options[KEEP_LINKS_GEN_OPT],
+                                gen_options[SOCKET_IDENTIFIERS_GEN_OPT])
+        else:
+            write_links(links_text, line_prefix, tree, gen_options[KEEP_LINKS_GEN_OPT],
+                        gen_options[SOCKET_IDENTIFIERS_GEN_OPT])
+        fragment = links_text.getvalue()
+        fragment_cache.put(key, fragment)
+    return fragment
+
+# write nodes in compact style, i.e. as literal tables of node data, applied by generic builder loops, in steps (yields
+# after the table rows of each node are generated, see export_steps.py)
+def iter_write_compact_nodes(m2p_text, line_prefix, tree, gen_options, uni_node_options, fragment_cache=None):
+    stats = gen_options[STATS_GEN_OPT]
+    node_rows = []
+    color_ramp_rows = []
+    curve_mapping_rows = []
+    for node in tree.nodes:
+        if stats != None:
+            node_start_time = time.perf_counter()
+        node_row, node_color_ramp_rows, node_curve_mapping_rows = get_node_fragment(node, line_prefix, gen_options,
+                                                                                    uni_node_options, fragment_cache)
+        node_rows.append(node_row)
+        color_ramp_rows.extend(node_color_ramp_rows)
+        curve_mapping_rows.extend(node_curve_mapping_rows)
+        if stats != None:
+            add_node_type_time(stats, node.bl_idname, time.perf_counter() - node_start_time)
+        yield
+
+    if stats != None:
+        start_time = time.perf_counter()
+
+    m2p_text.write(line_prefix + "# node table: (type, name, location, (attribute name, value, ...), (input index, " +
+                   "default value, ...), (output index, default value, ...))\n")
+    write_code_table(m2p_text, line_prefix, "node_table", node_rows)
+    m2p_text.write(line_prefix + "for bl_idname, name, location, attrs, input_values, output_values in " +
+                   "node_table:\n" +
+                   line_prefix + "    node = tree_nodes.new(type=bl_idname)\n" +
+                   line_prefix + "    node.location = location\n" +
+                   line_prefix + "    for attr, value in zip(attrs[0::2], attrs[1::2]):\n" +
+                   line_prefix + "        setattr(node, attr, value)\n" +
+                   line_prefix + "    for index, value in zip(input_values[0::2], input_values[1::2]):\n" +
+                   line_prefix + "        node.inputs[index].default_value = value\n" +
+                   line_prefix + "    for index, value in zip(output_values[0::2], output_values[1::2]):\n" +
+                   line_prefix + "        node.outputs[index].default_value = value\n" +
+                   line_prefix + "    new_nodes[name] = node\n\n")
+
+    if len(color_ramp_rows) > 0:
+        m2p_text.write(line_prefix + "# color ramp table: (node name, attribute name, color mode, interpolation, " +
+                       "element positions, element colors (R, G, B, A per element))\n")
+        write_code_table(m2p_text, line_prefix, "color_ramp_table", color_ramp_rows)
+        # add or remove elements (leaving the minimum of one element in list) to get the needed number of elements,
+        # then set all positions and colors in bulk, positions are in ascending order, so elements stay sorted
+        m2p_text.write(line_prefix + "for name, attr, color_mode, interpolation, positions, colors in " +
+                       "color_ramp_table:\n" +
+                       line_prefix + "    ramp = getattr(new_nodes[name], attr)\n" +
+                       line_prefix + "    ramp.color_mode = color_mode\n" +
+                       line_prefix + "    ramp.interpolation = interpolation\n" +
+                       line_prefix + "    elements = ramp.elements\n" +
+                       line_prefix + "    while len(elements) > len(positions):\n" +
+                       line_prefix + "        elements.remove(elements[-1])\n" +
+                       line_prefix + "    for _ in range(len(positions) - len(elements)):\n" +
+                       line_prefix + "        elements.new(1.0)\n" +
+                       line_prefix + "    elements.foreach_set(\"position\", positions)\n" +
+                       line_prefix + "    elements.foreach_set(\"color\", colors)\n\n")
+
+    if len(curve_mapping_rows) > 0:
+        m2p_text.write(line_prefix + "# curve mapping table: (node name, attribute name, use clip, clip min x/y, " +
+                       "clip max x/y, extend, curves (point locations (x, y per point), point handle types))\n")
+        write_code_table(m2p_text, line_prefix, "curve_mapping_table", curve_mapping_rows)
+        # add or remove points (2 points minimum) to get the needed number of points, then set all locations in
+        # bulk, locations are in ascending order of x, so points stay sorted
+        m2p_text.write(line_prefix + "for name, attr, use_clip, min_x, min_y, max_x, max_y, extend, curves in " +
+                       "curve_mapping_table:\n" +
+                       line_prefix + "    mapping = getattr(new_nodes[name], attr)\n" +
+                       line_prefix + "    mapping.use_clip = use_clip\n" +
+                       line_prefix + "    mapping.clip_min_x = min_x\n" +
+                       line_prefix + "    mapping.clip_min_y = min_y\n" +
+                       line_prefix + "    mapping.clip_max_x = max_x\n" +
+                       line_prefix + "    mapping.clip_max_y = max_y\n" +
+                       line_prefix + "    mapping.extend = extend\n" +
+                       line_prefix + "    for curve_index, (locations, handle_types) in enumerate(curves):\n" +
+                       line_prefix + "        curve_points = mapping.curves[curve_index].points\n" +
+                       line_prefix + "        while len(curve_points) > len(handle_types):\n" +
+                       line_prefix + "            curve_points.remove(curve_points[-1])\n" +
+                       line_prefix + "        for _ in range(len(handle_types) - len(curve_points)):\n" +
+                       line_prefix + "            curve_points.new(1.0, 1.0)\n" +
+                       line_prefix + "        curve_points.foreach_set(\"location\", locations)\n" +
+                       line_prefix + "        for point, handle_type in zip(curve_points, handle_types):\n" +
+                       line_prefix + "            point.handle_type = handle_type\n" +
+                       line_prefix + "    mapping.reset_view()\n" +
+                       line_prefix + "    mapping.update()\n\n")
+    if stats != None:
+        add_phase_time_since(stats, PHASE_NODE_TABLES, start_time)
+        start_time = time.perf_counter()
+
+    parent_rows = [format_code_tuple([format_code_string(node.name), format_code_string(node.parent)])
+                   for node in tree.nodes if node.parent != None]
+    if len(parent_rows) > 0:
+        m2p_text.write(line_prefix + "# parenting of nodes: (node name, parent node name)\n")
+        write_code_table(m2p_text, line_prefix, "parent_table", parent_rows)
+        m2p_text.write(line_prefix + "for name, parent_name in parent_table:\n" +
+                       line_prefix + "    new_nodes[name].parent = new_nodes[parent_name]\n\n")
+    if stats != None:
+        add_phase_time_since(stats, PHASE_PARENTING, start_time)
+
+# write links in compact style, i.e. as a literal table of links, applied by a generic builder loop
+def write_compact_links(m2p_text, line_prefix, tree, keep_links, use_socket_identifiers):
+    use_socket_identifiers = write_links_header(m2p_text, line_prefix, tree, keep_links, use_socket_identifiers)
+    if len(tree.links) == 0:
+        return
+    if use_socket_identifiers:
+        link_rows = [format_code_tuple([format_code_string(link.from_node), str(link.from_index),
+            "None" if link.from_identifier == None else format_code_string(link.from_identifier),
+            format_code_string(link.to_node), str(link.to_index),
+            "None" if link.to_identifier == None else format_code_string(link.to_identifier)])
+            for link in tree.links]
+        m2p_text.write(line_prefix + "# link table: (from node name, from output index, from output identifier, " +
+                       "to node name, to input index, to input identifier)\n")
+        write_code_table(m2p_text, line_prefix, "link_table", link_rows)
+        m2p_text.write(line_prefix + "for from_name, from_index, from_id, to_name, to_index, to_id in link_table:\n")
+        new_link_str = "tree_links.new(link_socket(new_nodes[from_name].outputs, from_id, from_index), " + \
+            "link_socket(new_nodes[to_name].inputs, to_id, to_index))"
+    else:
+        link_rows = [format_code_tuple([format_code_string(link.from_node), str(link.from_index),
+            format_code_string(link.to_node), str(link.to_index)]) for link in tree.links]
+        m2p_text.write(line_prefix + "# link table: (from node name, from output index, to node name, " +
+                       "to input index)\n")
+        write_code_table(m2p_text, line_prefix, "link_table", link_rows)
+        m2p_text.write(line_prefix + "for from_name, from_index, to_name, to_index in link_table:\n")
+        new_link_str = "tree_links.new(new_nodes[from_name].outputs[from_index], new_nodes[to_name].inputs[to_index])"
+    if keep_links:
+        m2p_text.write(line_prefix + "    new_links.append(" + new_link_str + ")\n")
+    else:
+        m2p_text.write(line_prefix + "    " + new_link_str + "\n")
+
+# write the code that replaces the old datablock of the tree by the new datablock (see DEFERRED_UPDATE_GEN_OPT) in all
+# its users, removes the old datablock, and gives its name to the new datablock
+def write_deferred_update_swap(m2p_text, line_prefix, tree):
+    data_collection = "bpy.data." + TREE_KIND_COLLECTIONS[tree.kind]
+    if tree.kind == TREE_KIND_GROUP:
+        m2p_text.write("\n" + line_prefix + "# replace old node group by new node group in all users\n" +
+                       line_prefix + "if old_node_group != None:\n" +
+                       line_prefix + "    old_node_group.user_remap(new_node_group)\n" +
+                       line_prefix + "    " + data_collection + ".remove(old_node_group)\n" +
+                       line_prefix + "    new_node_group.name = node_group_name\n")
+    else:
+        m2p_text.write("\n" + line_prefix + "# replace material by its copy in all users\n" +
+                       line_prefix + "material_name = old_material.name\n" +
+                       line_prefix + "old_material.user_remap(material)\n" +
+                       line_prefix + data_collection + ".remove(old_material)\n" +
+                       line_prefix + "material.name = material_name\n")
+
+# write the body of the function that re-creates the captured node tree, i.e. all code except header and function
+# call, in steps, yields after the code of each node is generated (see export_steps.py)
+def iter_write_tree_body(m2p_text, tree, gen_options, uni_node_options, fragment_cache=None):
+    line_prefix = gen_options[LINE_PREFIX_GEN_OPT]
+    stats = gen_options[STATS_GEN_OPT]
+    is_tree_node_group = (tree.kind == TREE_KIND_GROUP)
+    # code of link lines, if generated by worker processes
+    links_code = None
+    is_deferred_update = gen_options[DEFERRED_UPDATE_GEN_OPT] and tree.kind != TREE_KIND_COMPOSITOR
+    if is_tree_node_group:
+        m2p_text.write(line_prefix + "# initialize variables\n")
+        m2p_text.write(line_prefix + "new_nodes = {}\n")
+        if is_deferred_update:
+            m2p_text.write(line_prefix + "# old node group is replaced by the new node group when it is complete\n" +
+                           line_prefix + "old_node_group = bpy.data.node_groups.get(node_group_name)\n")
+        m2p_text.write(line_prefix + "new_node_group = bpy.data.node_groups.new(name=node_group_name, type='" +
+                       tree.bl_idname + "')\n")
+        m2p_text.write("\n" + line_prefix + "# remove old group inputs and outputs\n")
+        m2p_text.write(line_prefix + "new_node_group.inputs.clear()\n")
+        m2p_text.write(line_prefix + "new_node_group.outputs.clear()\n")
+        if stats != None:
+            start_time = time.perf_counter()
+        write_group_interface(m2p_text, line_prefix, tree, gen_options[NG_OUTPUT_MIN_MAX_DEF_GEN_OPT])
+        if stats != None:
+            add_phase_time_since(stats, PHASE_GROUP_INTERFACE, start_time)
+        m2p_text.write(line_prefix + "tree_nodes = new_node_group.nodes\n")
+    else:
+        m2p_text.write(line_prefix + "# initialize variables\n")
+        m2p_text.write(line_prefix + "new_nodes = {}\n")
+        if is_deferred_update:
+            m2p_text.write(line_prefix + "# create nodes in a copy of the material, that is not used, and replace " +
+                           "the material by the copy when it is complete\n" +
+                           line_prefix + "old_material = material\n" +
+                           line_prefix + "material = old_material.copy()\n")
+        m2p_text.write(line_prefix + "tree_nodes = material.node_tree.nodes\n")
+
+    if gen_options[DELETE_EXISTING_GEN_OPT]:
+        m2p_text.write("\n" + line_prefix + "# delete all nodes\n")
+        m2p_text.write(line_prefix + "tree_nodes.clear()\n")
+    m2p_text.write("\n" + line_prefix + "# create nodes\n")
+
+    if gen_options[OUTPUT_STYLE_GEN_OPT] == OUTPUT_STYLE_COMPACT:
+        yield from iter_write_compact_nodes(m2p_text, line_prefix, tree, gen_options, uni_node_options,
+                                            fragment_cache)
+    else:
+        if gen_options[DEDUPE_CONFIGS_GEN_OPT]:
+            yield from iter_write_shared_config_nodes(m2p_text, line_prefix, tree, gen_options, uni_node_options,
+                                                      fragment_cache)
+        else:
+            num_workers = 1
+            if fragment_cache == None:
+                num_workers = get_num_workers(gen_options[WORKERS_GEN_OPT], len(tree.nodes))
+            if num_workers > 1:
+                if stats != None:
+                    start_time = time.perf_counter()
+                    stats["workers"] = num_workers
+                links_code = yield from iter_write_parallel_nodes(m2p_text, line_prefix, tree, gen_options,
+                                                                  uni_node_options, num_workers)
+                if stats != None:
+                    add_phase_time_since(stats, PHASE_PARALLEL, start_time)
+            else:
+                # write info about the individual nodes
+                for node in tree.nodes:
+                    if stats != None:
+                        node_start_time = time.perf_counter()
+                    if fragment_cache != None:
+                        m2p_text.write(get_node_fragment(node, line_prefix, gen_options, uni_node_options,
+                                                         fragment_cache))
+                    else:
+                        write_node(m2p_text, line_prefix, node, uni_node_options, stats)
+                    if stats != None:
+                        add_node_type_time(stats, node.bl_idname, time.perf_counter() - node_start_time)
+                    yield
+
+        # set parenting order of nodes (e.g. parenting to frames) after creating all the nodes in the tree,
+        # so that parent nodes are referenced only after parent nodes are created
+        if stats != None:
+            start_time = time.perf_counter()
+        frame_parenting_lines = [line_prefix + "new_nodes[" + format_code_string(node.name) + "].parent = new_nodes[" +
+                                 format_code_string(node.parent) + "]\n" for node in tree.nodes if node.parent != None]
+        # do node parenting if needed
+        if len(frame_parenting_lines) > 0:
+            m2p_text.write(line_prefix + "# parenting of nodes\n" + "".join(frame_parenting_lines) + "\n")
+        if stats != None:
+            add_phase_time_since(stats, PHASE_PARENTING, start_time)
+
+    if stats != None:
+        start_time = time.perf_counter()
+    if fragment_cache != None:
+        m2p_text.write(get_links_fragment(tree, line_prefix, gen_options, fragment_cache))
+    elif gen_options[OUTPUT_STYLE_GEN_OPT] == OUTPUT_STYLE_COMPACT:
+        write_compact_links(m2p_text, line_prefix, tree, gen_options[KEEP_LINKS_GEN_OPT],
+                            gen_options[SOCKET_IDENTIFIERS_GEN_OPT])
+    elif links_code != None:
+        write_links_header(m2p_text, line_prefix, tree, gen_options[KEEP_LINKS_GEN_OPT],
+                           gen_options[SOCKET_IDENTIFIERS_GEN_OPT])
+        m2p_text.write(links_code)
+    else:
+        write_links(m2p_text, line_prefix, tree, gen_options[KEEP_LINKS_GEN_OPT],
+                    gen_options[SOCKET_IDENTIFIERS_GEN_OPT])
+    if stats != None:
+        add_phase_time_since(stats, PHASE_LINKS, start_time)
+
+    m2p_text.write("\n" + line_prefix + "# deselect all new nodes\n" +
+                   line_prefix + "for n in new_nodes.values(): n.select = False\n")
+
+    if is_deferred_update:
+        write_deferred_update_swap(m2p_text, line_prefix, tree)
+    if is_tree_node_group:
+        m2p_text.write("\n" + line_prefix + "return new_node_group\n")
+    else:
+        m2p_text.write("\n" + line_prefix + "return new_nodes\n")
+
+# write functions that create the node groups used by group nodes, 'dependencies' is a list of captured node groups
+# in dependency order (see snapshot.capture_group_dependencies), followed by the code that calls the functions to
+# create the node groups that do not already exist, in steps (see iter_write_tree_body)
+def iter_write_group_dependencies(m2p_text, dependencies, gen_options, uni_node_options, fragment_cache=None):
+    # function body must be indented
+    if gen_options[LINE_PREFIX_GEN_OPT] == "":
+        gen_options = dict(gen_options)
+        gen_options[LINE_PREFIX_GEN_OPT] = "    "
+    for dep_index, dep_tree in enumerate(dependencies):
+        # line breaks in names would end the comment
+        m2p_text.write("# add nodes and links to node group named " + esc_char_string(dep_tree.name) +
+                       " (used by group nodes)\n" +
+                       "def add_group_nodes_%d(node_group_name):\n" % dep_index)
+        yield from iter_write_tree_body(m2p_text, dep_tree, gen_options, uni_node_options, fragment_cache)
+        m2p_text.write("\n")
+    m2p_text.write("# create node groups used by group nodes, in dependency order, if they do not already exist\n")
+    for dep_index, dep_tree in enumerate(dependencies):
+        m2p_text.write("if bpy.data.node_groups.get(\"" + esc_char_string(dep_tree.name) + "\") == None:\n" +
+                       "    add_group_nodes_%d(\"" % dep_index + esc_char_string(dep_tree.name) + "\")\n")
+    m2p_text.write("\n")
+
+# get code that sets variable 'var_name' to a new datablock with nodes, that owns a tree like the captured tree, or if
+# 'deferred_update' is True then to the existing datablock of the same name, if any, so its nodes are re-created and
+# it is replaced in all its users (see DEFERRED_UPDATE_GEN_OPT)
+def get_owner_code(var_name, tree, deferred_update):
+    data_collection = "bpy.data." + TREE_KIND_COLLECTIONS[tree.kind]
+    new_code = var_name + " = " + data_collection + ".new(" + format_code_string(tree.owner_name) + ")\n" + \
+        var_name + ".use_nodes = True\n"
+    if not deferred_update:
+        return new_code
+    return var_name + " = " + data_collection + ".get(" + format_code_string(tree.owner_name) + ")\n" + \
+        "if " + var_name + " == None:\n" + "".join(["    " + line + "\n" for line in new_code.splitlines()])
+
+# write Python code to re-create the captured node tree 'tree' (see snapshot.capture_tree), and the captured node
+# groups it depends on, if 'dependencies' is not empty, 'gen_options' is a dict from make_gen_options,
+# if 'fragment_cache' is not None then code of unchanged nodes and links is re-used from the cache
+def write_tree_code(m2p_text, tree, gen_options, uni_node_options, dependencies=(), fragment_cache=None):
+    run_steps(iter_write_tree_code(m2p_text, tree, gen_options, uni_node_options, dependencies, fragment_cache))
+
+# write Python code to re-create the captured node tree in steps, yields after the code of each node is generated (see
+# export_steps.py)
+def iter_write_tree_code(m2p_text, tree, gen_options, uni_node_options, dependencies=(), fragment_cache=None):
+    is_tree_node_group = (tree.kind == TREE_KIND_GROUP)
+    make_into_function = gen_options[MAKE_FUNCTION_GEN_OPT]
+    if fragment_cache != None:
+        # cached fragments are valid only for the options they were generated with
+        fragment_cache.validate((gen_options[OUTPUT_STYLE_GEN_OPT], gen_options[KEEP_LINKS_GEN_OPT],
+                                 gen_options[SOCKET_IDENTIFIERS_GEN_OPT], tuple(sorted(uni_node_options.items()))))
+
+    # names are escaped, line breaks in names would end the comment
+    m2p_text.write("# Python script from Blender version " + str(tree.blender_version) + " to create ")
+    # if using Node Group (Shader or Geometry Nodes)
+    if is_tree_node_group:
+        if tree.tree_type == 'GEOMETRY':
+            m2p_text.write("Geometry Nodes node group named " + esc_char_string(tree.name) + "\n\n")
+        else:
+            m2p_text.write("Shader Nodes node group named " + esc_char_string(tree.name) + "\n\n")
+    # if using Compositor node tree
+    elif tree.kind == TREE_KIND_COMPOSITOR:
+        m2p_text.write("Compositor node tree\n\n")
+    # using Material node tree, check if World or Object material
+    elif tree.kind == TREE_KIND_WORLD:
+        m2p_text.write("World Material named " + esc_char_string(tree.owner_name) + "\n\n")
+    elif tree.kind == TREE_KIND_LINESTYLE:
+        m2p_text.write("Linestyle Material named " + esc_char_string(tree.owner_name) + "\n\n")
+    else:
+        m2p_text.write("Object Material named " + esc_char_string(tree.owner_name) + "\n\n")
+
+    if make_into_function or len(dependencies) > 0:
+        m2p_text.write("import bpy\n\n")
+    if len(dependencies) > 0:
+        yield from iter_write_group_dependencies(m2p_text, dependencies, gen_options, uni_node_options,
+                                                 fragment_cache)
+    if make_into_function:
+        if is_tree_node_group:
+            m2p_text.write("# add nodes and links to node group\n" +
+                           "def add_group_nodes(node_group_name):\n")
+        elif tree.kind == TREE_KIND_COMPOSITOR:
+            m2p_text.write("# add nodes and links to compositor node tree\n" +
+                           "def add_shader_nodes(material):\n")
+        else:
+            m2p_text.write("# add nodes and links to material\n" +
+                           "def add_shader_nodes(material):\n")
+
+    yield from iter_write_tree_body(m2p_text, tree, gen_options, uni_node_options, fragment_cache)
+
+    # add function call, if needed
+    deferred_update = gen_options[DEFERRED_UPDATE_GEN_OPT]
+    if make_into_function and gen_options[CALL_FUNCTION_GEN_OPT]:
+        # if using nodes in a group (Shader or Geometry Nodes)
+        if is_tree_node_group:
+            m2p_text.write("\n# use Python script to add nodes, and links between nodes, to new Node Group\n" +
+                           "add_group_nodes(" + format_code_string(tree.name) + ")\n")
+        # if using World material node tree
+        elif tree.kind == TREE_KIND_WORLD:
+            m2p_text.write("\n# use Python script to create World material, including nodes and links\n" +
+                           get_owner_code("world_mat", tree, deferred_update) +
+                           "add_shader_nodes(world_mat)\n")
+        # if using Compositor node tree
+        elif tree.kind == TREE_KIND_COMPOSITOR:
+            m2p_text.write("\n# use Python script to add nodes, and links between nodes, to Compositor node tree\n" +
+                           "add_shader_nodes(bpy.context.scene)\n")
+        # if using Linestyle node tree
+        elif tree.kind == TREE_KIND_LINESTYLE:
+            m2p_text.write("\n# use Python script to create Linestyle, including nodes and links\n" +
+                           get_owner_code("linestyle_mat", tree, deferred_update) +
+                           "add_shader_nodes(linestyle_mat)\n")
+        # else using Object Material Shader Nodes
+        else:
+            m2p_text.write("\n# use Python script to create Material, including nodes and links\n" +
+                           get_owner_code("mat", tree, deferred_update) +
+                           "add_shader_nodes(mat)\n")
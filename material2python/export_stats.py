@@ -0,0 +1,125 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 3
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# Export statistics, i.e. time taken per phase of export and per node type, and counts of nodes, links, lines, and
+# bytes written. Statistics are a plain dict (so they can be written to JSON reports as is), filled by create_code_text
+# when profiling is enabled. This module must not import bpy.
+
+import time
+
+# phases of export
+PHASE_CAPTURE = "capture"
+PHASE_GROUP_INTERFACE = "group_interface"
+PHASE_UNI_ATTRS = "uni_attrs"
+PHASE_NODE_PROPS = "node_props"
+PHASE_SOCKET_DEFAULTS = "socket_defaults"
+PHASE_NODE_TABLES = "node_tables"
+# code of nodes and links generated by worker processes (see worker_pool.py)
+PHASE_PARALLEL = "parallel_nodes_links"
+PHASE_PARENTING = "parenting"
+PHASE_LINKS = "links"
+PHASE_OUTPUT = "output"
+# phases in order of export, for display
+PHASE_ORDER = [PHASE_CAPTURE, PHASE_GROUP_INTERFACE, PHASE_UNI_ATTRS, PHASE_NODE_PROPS, PHASE_SOCKET_DEFAULTS,
+               PHASE_NODE_TABLES, PHASE_PARALLEL, PHASE_PARENTING, PHASE_LINKS, PHASE_OUTPUT]
+
+# number of node types (slowest first) listed in the stats summary
+SUMMARY_NODE_TYPES = 5
+
+def make_export_stats():
+    return {
+        "phase_times": {},
+        "node_type_times": {},
+        "node_type_counts": {},
+        "nodes": 0,
+        "links": 0,
+        "lines": 0,
+        "bytes": 0,
+        # number of shared node configuration functions written (dedupe configs option), and number of nodes
+        # created by these functions
+        "shared_configs": 0,
+        "shared_config_nodes": 0,
+    }
+
+def add_phase_time(stats, phase, seconds):
+    phase_times = stats["phase_times"]
+    phase_times[phase] = phase_times.get(phase, 0.0) + seconds
+
+# add time taken by a node (capture or code generation) to the total time of its type
+def add_node_type_time(stats, bl_idname, seconds):
+    node_type_times = stats["node_type_times"]
+    node_type_times[bl_idname] = node_type_times.get(bl_idname, 0.0) + seconds
+
+# count nodes and links of a captured tree (see tree_ir.py), and its nodes per type
+def count_tree(stats, tree):
+    stats["nodes"] = stats["nodes"] + len(tree.nodes)
+    stats["links"] = stats["links"] + len(tree.links)
+    node_type_counts = stats["node_type_counts"]
+    for node in tree.nodes:
+        node_type_counts[node.bl_idname] = node_type_counts.get(node.bl_idname, 0) + 1
+
+def count_shared_configs(stats, num_configs, num_nodes):
+    stats["shared_configs"] = stats["shared_configs"] + num_configs
+    stats["shared_config_nodes"] = stats["shared_config_nodes"] + num_nodes
+
+# add time from 'start_time' (given by time.perf_counter()) until now to the phase
+def add_phase_time_since(stats, phase, start_time):
+    add_phase_time(stats, phase, time.perf_counter() - start_time)
+
+# get summary of the counts of changes of a patch export (see tree_patch.get_patch_counts) as one line of text
+def get_patch_summary(counts):
+    summary = "%d nodes added, %d removed, %d changed, %d moved, %d links added, %d removed" % \
+        (counts["nodes_added"], counts["nodes_removed"], counts["nodes_changed"], counts["nodes_moved"],
+         counts["links_added"], counts["links_removed"])
+    if counts["interface_rebuilt"]:
+        summary = summary + ", group interface re-created"
+    elif counts["interface_changes"] > 0:
+        summary = summary + ", %d group interface changes" % counts["interface_changes"]
+    return summary
+
+# get summary of export stats as a list of lines of text (without line endings), used by the UI panel and for the
+# stats comment written at the top of scripts
+def get_stats_summary(stats):
+    summary = ["%d nodes, %d links, %d lines, %d bytes" % (stats["nodes"], stats["links"], stats["lines"],
+                                                           stats["bytes"])]
+    if "capture_time" in stats and "generate_time" in stats:
+        summary.append("total %.1f ms (capture %.1f ms, generate %.1f ms)" % (
+            (stats["capture_time"] + stats["generate_time"]) * 1000, stats["capture_time"] * 1000,
+            stats["generate_time"] * 1000))
+    if stats.get("shared_configs", 0) > 0:
+        summary.append("%d nodes created by %d shared configs" % (stats["shared_config_nodes"],
+                                                                 stats["shared_configs"]))
+    if stats.get("workers", 1) > 1:
+        summary.append("code of nodes and links generated by %d worker processes" % stats["workers"])
+    if len(stats.get("leaving_links", [])) > 0:
+        summary.append("%d links to nodes outside the export scope not written" % len(stats["leaving_links"]))
+    if "patch" in stats:
+        summary.append("patch: " + get_patch_summary(stats["patch"]))
+    phase_times = stats["phase_times"]
+    for phase in PHASE_ORDER:
+        if phase in phase_times:
+            summary.append("  %s: %.1f ms" % (phase, phase_times[phase] * 1000))
+    node_type_times = stats["node_type_times"]
+    slowest_types = sorted(node_type_times, key=lambda t: node_type_times[t], reverse=True)[:SUMMARY_NODE_TYPES]
+    for bl_idname in slowest_types:
+        summary.append("  %s x%d: %.1f ms" % (bl_idname, stats["node_type_counts"].get(bl_idname, 0),
+                                              node_type_times[bl_idname] * 1000))
+    return summary
+
+def get_stats_comment(stats):
+    return "# export stats: " + "\n# ".join(get_stats_summary(stats)) + "\n"
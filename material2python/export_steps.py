@@ -0,0 +1,66 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 3
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# Time-sliced export: capture and code generation are written as generators ("steps") that yield after each node, so
+# an export can be run all at once (run_steps), or a few steps at a time from a timer (run_steps_for), keeping the UI
+# responsive while huge trees are exported. This module must not import bpy.
+
+import time
+
+# default target time of one chunk of steps run by a modal export, i.e. the latency added to one UI frame
+DEFAULT_TARGET_LATENCY = 0.03
+# limits of number of steps per chunk
+MIN_CHUNK_SIZE = 1
+MAX_CHUNK_SIZE = 100000
+# maximum factor by which chunk size grows between chunks, so one slow step after many fast steps does not freeze
+# the UI for long
+MAX_CHUNK_GROWTH = 2.0
+
+# run all steps of the generator, and return the generator's return value
+def run_steps(steps):
+    while True:
+        try:
+            next(steps)
+        except StopIteration as stop:
+            return stop.value
+
+# run at most 'chunk_size' steps of the generator, returns (True, generator's return value) if the generator
+# finished, otherwise (False, None)
+def run_steps_for(steps, chunk_size):
+    for _ in range(chunk_size):
+        try:
+            next(steps)
+        except StopIteration as stop:
+            return True, stop.value
+    return False, None
+
+# get size of next chunk of steps, from size of previous chunk and time it took, so chunks take about 'target_latency'
+# seconds
+def get_next_chunk_size(chunk_size, elapsed, target_latency=DEFAULT_TARGET_LATENCY):
+    if elapsed <= 0.0:
+        next_size = chunk_size * MAX_CHUNK_GROWTH
+    else:
+        next_size = chunk_size * min(target_latency / elapsed, MAX_CHUNK_GROWTH)
+    return max(MIN_CHUNK_SIZE, min(MAX_CHUNK_SIZE, int(next_size)))
+
+# run one chunk of steps of the generator (see run_steps_for), returns (finished, generator's return value, size of
+# next chunk), where size of next chunk is adapted so a chunk takes about 'time_budget' seconds
+def run_steps_timed(steps, chunk_size, time_budget=DEFAULT_TARGET_LATENCY):
+    start_time = time.perf_counter()
+    finished, result = run_steps_for(steps, chunk_size)
+    return finished, result, get_next_chunk_size(chunk_size, time.perf_counter() - start_time, time_budget)
@@ -0,0 +1,105 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 3
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# Code fragment cache for incremental re-export. Generated code of each node, and of each set of links, is cached
+# by a fingerprint of the captured data (see tree_ir.py) it was generated from, so re-exporting a tree after a small
+# edit only generates code for the changed nodes. Fingerprints are nested tuples of the captured values, compared by
+# value when looked up, so a cached fragment is only re-used for identical data. This module must not import bpy.
+
+from collections import OrderedDict
+
+from .tree_ir import ColorRampData, CurveMappingData
+
+# default maximum number of cached fragments, least recently used fragments are evicted first
+DEFAULT_MAX_FRAGMENTS = 20000
+
+class FragmentCache:
+    def __init__(self, max_entries=DEFAULT_MAX_FRAGMENTS):
+        self.fragments = OrderedDict()
+        self.max_entries = max_entries
+        # stamp (e.g. code generation options) used when the cached fragments were generated
+        self.stamp = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def clear(self):
+        self.fragments.clear()
+        self.stamp = None
+
+    # clear the cache if the given stamp differs from the stamp of the cached fragments, e.g. because code
+    # generation options changed
+    def validate(self, stamp):
+        if stamp != self.stamp:
+            self.fragments.clear()
+            self.stamp = stamp
+
+    # returns cached fragment, or None if there is no fragment for the key
+    def get(self, key):
+        fragment = self.fragments.get(key)
+        if fragment is None:
+            self.misses = self.misses + 1
+            return None
+        self.fragments.move_to_end(key)
+        self.hits = self.hits + 1
+        return fragment
+
+    def put(self, key, fragment):
+        self.fragments[key] = fragment
+        self.fragments.move_to_end(key)
+        while len(self.fragments) > self.max_entries:
+            self.fragments.popitem(last=False)
+            self.evictions = self.evictions + 1
+
+# fragments shared by all exports, e.g. by repeated exports of the same tree from the UI
+node_fragment_cache = FragmentCache()
+
+# get hashable version of a captured value (captured values are hashable, except sets, Color Ramps, and Curve
+# Mappings)
+def get_value_key(value):
+    if value.__hash__ != None:
+        return value
+    if isinstance(value, set):
+        return ("set",) + tuple(sorted(value))
+    if isinstance(value, ColorRampData):
+        return ("color_ramp", value.color_mode, value.interpolation, tuple(value.positions), tuple(value.colors))
+    if isinstance(value, CurveMappingData):
+        return ("curve_mapping", value.use_clip, value.clip_min_x, value.clip_min_y, value.clip_max_x,
+                value.clip_max_y, value.extend,
+                tuple([(tuple(c.locations), tuple(c.handle_types)) for c in value.curves]))
+    return ("unknown", repr(value))
+
+# fingerprint of all node data used to generate the node's code: type, name, location, parent, attributes, and
+# socket default values (including linked state of inputs)
+def get_node_fingerprint(node):
+    return (node.bl_idname, node.name, node.location, node.parent, tuple(node.uni_attrs),
+            tuple([(attr, kind, get_value_key(value)) for attr, kind, value in node.props]),
+            tuple([(s.index, s.hide_value, s.is_linked, get_value_key(s.default_value)) for s in node.inputs]),
+            tuple([(s.index, get_value_key(s.default_value)) for s in node.outputs]))
+
+def get_links_fingerprint(links):
+    return tuple([(link.from_node, link.from_index, link.from_identifier, link.to_node, link.to_index,
+                   link.to_identifier) for link in links])
+
+# fingerprint of a whole captured tree, i.e. of its nodes, links, and group interface, e.g. to find out if a tree
+# changed since it was last exported (see live_export.py), hashed so only one number is kept per tree
+def get_tree_fingerprint(tree):
+    return hash((tree.bl_idname, tuple([get_node_fingerprint(node) for node in tree.nodes]),
+                 get_links_fingerprint(tree.links),
+                 tuple([tuple([get_value_key(getattr(s, f)) for f in s.__slots__]) for s in tree.group_inputs]),
+                 tuple([tuple([get_value_key(getattr(s, f)) for f in s.__slots__]) for s in tree.group_outputs])))
@@ -0,0 +1,192 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 3
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# Live export: node trees exported from the UI while live export is enabled are watched (see mat2py.live_export_trees),
+# and re-exported to the same text-block or file when they change. A dependency graph update handler marks the watched
+# trees that were updated, and does nothing else, so it adds very little time to each edit. A timer exports the marked
+# trees when no watched tree was changed for the debounce time, so a burst of edits (e.g. dragging a value slider) is
+# exported once. Each marked tree is captured, and exported only if the fingerprint of the captured tree (see
+# fragment_cache.get_tree_fingerprint) differs from its fingerprint when it was last exported, e.g. a tree is not
+# re-exported if it was updated by a change of another datablock. Edits that do not update the dependency graph (e.g.
+# moving nodes) are exported with the next edit that does.
+
+import time
+
+import bpy
+from bpy.app.handlers import persistent
+
+from .code_sink import TextBlockSink, FileSink
+from .export_steps import run_steps
+from .fragment_cache import get_tree_fingerprint
+from .mat2py import (M2P_TEXT_NAME, live_export_trees, get_export_baseline, get_export_steps, get_uni_node_options,
+    is_elide_defaults)
+from .snapshot import capture_tree
+
+# bpy.data collection names of updated datablocks that may own watched trees, keyed by type name of the datablock
+UPDATE_TYPE_COLLECTIONS = {
+    "GeometryNodeTree": "node_groups",
+    "ShaderNodeTree": "node_groups",
+    "CompositorNodeTree": "node_groups",
+    "TextureNodeTree": "node_groups",
+    "Material": "materials",
+    "World": "worlds",
+    "FreestyleLineStyle": "linestyles",
+    "Scene": "scenes",
+}
+
+# keys of the watched trees changed since the last live export
+changed_tree_keys = set()
+# time of the latest change of a watched tree (time.perf_counter()), and debounce time (seconds) of live export
+live_export_state = { "last_change_time": 0.0, "debounce": 1.0 }
+
+def make_live_export_stats():
+    return {
+        # number of calls of the update handler, and total and maximum time taken by the handler
+        "handler_calls": 0,
+        "handler_time": 0.0,
+        "handler_max_time": 0.0,
+        # number of trees exported, and number of changed trees not exported because their fingerprint did not change
+        "exports": 0,
+        "unchanged": 0,
+        "last_export_time": 0.0,
+        "last_error": None,
+    }
+
+# stats of live export, shown in the panel
+live_export_stats = make_live_export_stats()
+
+# dependency graph update handler of live export, marks the watched trees that were updated
+@persistent
+def live_export_depsgraph_update(scene, depsgraph=None):
+    start_time = time.perf_counter()
+    if len(live_export_trees) > 0:
+        if depsgraph == None:
+            depsgraph = bpy.context.evaluated_depsgraph_get()
+        for update in depsgraph.updates:
+            id_collection = UPDATE_TYPE_COLLECTIONS.get(type(update.id).__name__)
+            if id_collection != None and (id_collection, update.id.name) in live_export_trees:
+                changed_tree_keys.add((id_collection, update.id.name))
+        if len(changed_tree_keys) > 0:
+            live_export_state["last_change_time"] = start_time
+            live_export_state["debounce"] = scene.Mat2Py.live_export_debounce
+            if not bpy.app.timers.is_registered(run_live_export):
+                bpy.app.timers.register(run_live_export, first_interval=live_export_state["debounce"])
+    handler_time = time.perf_counter() - start_time
+    live_export_stats["handler_calls"] = live_export_stats["handler_calls"] + 1
+    live_export_stats["handler_time"] = live_export_stats["handler_time"] + handler_time
+    live_export_stats["handler_max_time"] = max(live_export_stats["handler_max_time"], handler_time)
+
+# timer of live export, exports the changed trees when no watched tree was changed for the debounce time, returns
+# seconds until the timer runs again, or None if the changed trees were exported
+def run_live_export():
+    wait_time = live_export_state["last_change_time"] + live_export_state["debounce"] - time.perf_counter()
+    if wait_time > 0.0:
+        return wait_time
+    scn = bpy.context.scene
+    # error of any tree of this export is shown until the next export
+    live_export_stats["last_error"] = None
+    try:
+        for tree_key in sorted(changed_tree_keys):
+            export_live_tree(scn, tree_key)
+    finally:
+        changed_tree_keys.clear()
+    # show new stats in the panel
+    for window in bpy.context.window_manager.windows:
+        for area in window.screen.areas:
+            if area.type == 'NODE_EDITOR':
+                area.tag_redraw()
+    return None
+
+# export the watched tree, with the export options of scene 'scn', if its fingerprint changed since it was last
+# exported, the tree is no longer watched if its datablock was removed or renamed, errors are shown in the panel (see
+# live_export_stats), so an error in the export of one tree does not stop the export of the other changed trees
+def export_live_tree(scn, tree_key):
+    collection_name, name = tree_key
+    start_time = time.perf_counter()
+    try:
+        tree_owner = getattr(bpy.data, collection_name).get(name)
+        if tree_owner == None:
+            live_export_trees.pop(tree_key, None)
+            return
+        node_tree = tree_owner if collection_name == "node_groups" else tree_owner.node_tree
+        target = live_export_trees.get(tree_key)
+        if node_tree == None or target == None:
+            return
+        elide_defaults = is_elide_defaults(get_uni_node_options(scn), get_export_baseline(scn, node_tree, tree_owner))
+        tree = capture_tree(node_tree, tree_owner, elide_defaults=elide_defaults)
+        fingerprint = get_tree_fingerprint(tree)
+        if fingerprint == target["fingerprint"]:
+            live_export_stats["unchanged"] = live_export_stats["unchanged"] + 1
+            return
+        if target["filepath"] != None:
+            sink = FileSink(target["filepath"], compress=scn.Mat2Py.export_gzip, atomic=scn.Mat2Py.export_atomic)
+        else:
+            # text-block was removed, write to a new text-block
+            text = bpy.data.texts.get(target["text_name"])
+            if text == None:
+                text = bpy.data.texts.new(M2P_TEXT_NAME)
+                target["text_name"] = text.name
+            sink = TextBlockSink(text)
+        run_steps(get_export_steps(scn, node_tree, tree_owner, {}, sink, tree))
+        target["fingerprint"] = fingerprint
+        live_export_stats["exports"] = live_export_stats["exports"] + 1
+    except Exception as e:
+        live_export_stats["last_error"] = name + ": " + (str(e) or type(e).__name__)
+    live_export_stats["last_export_time"] = time.perf_counter() - start_time
+
+def enable_live_export():
+    if live_export_depsgraph_update not in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.append(live_export_depsgraph_update)
+
+# stop live export, and stop watching all trees
+def disable_live_export():
+    if live_export_depsgraph_update in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(live_export_depsgraph_update)
+    if bpy.app.timers.is_registered(run_live_export):
+        bpy.app.timers.unregister(run_live_export)
+    changed_tree_keys.clear()
+    live_export_trees.clear()
+    live_export_stats.update(make_live_export_stats())
+
+# update function of the live export scene property
+def update_live_export(self, context):
+    if self.live_export:
+        enable_live_export()
+    else:
+        disable_live_export()
+
+# trees of the previous file are not watched in a newly loaded file, live export stays enabled if it is enabled in the
+# new file's scene
+@persistent
+def live_export_load_post(dummy):
+    disable_live_export()
+    if bpy.context.scene.Mat2Py.live_export:
+        enable_live_export()
+
+# get summary of live export stats as a list of lines of text, for the panel
+def get_live_export_summary():
+    calls = live_export_stats["handler_calls"]
+    summary = ["watching %d trees" % len(live_export_trees),
+               "handler: %d calls, avg %.1f us, max %.1f us" % (calls,
+                   live_export_stats["handler_time"] * 1000000 / max(1, calls),
+                   live_export_stats["handler_max_time"] * 1000000),
+               "exports: %d (%d unchanged), last %.1f ms" % (live_export_stats["exports"],
+                   live_export_stats["unchanged"], live_export_stats["last_export_time"] * 1000)]
+    if live_export_stats["last_error"] != None:
+        summary.append("error: " + live_export_stats["last_error"])
+    return summary
@@ -16,492 +16,312 @@
 #
 # ##### END GPL LICENSE BLOCK #####
 
+import time
+
 import bpy
-from mathutils import (Color, Vector)
+
+from .code_sink import TextBlockSink, StringSink, CountingSink, FileSink
+from .codegen import (WRITE_DEFAULTS_UNI_NODE_OPT, WRITE_LINKED_DEFAULTS_UNI_NODE_OPT, LOC_DEC_PLACES_UNI_NODE_OPT,
+    WRITE_ATTR_NAME_UNI_NODE_OPT, WRITE_ATTR_WIDTH_HEIGHT_UNI_NODE_OPT, WRITE_ATTR_SELECT_UNI_NODE_OPT,
+    OUTPUT_STYLE_UNROLLED, OUTPUT_STYLE_COMPACT, esc_char_string, format_value, compare_to_value, get_line_prefix,
+    make_gen_options, write_node_props, iter_write_tree_code)
+from .export_stats import (PHASE_CAPTURE, PHASE_OUTPUT, make_export_stats, add_phase_time, count_tree,
+    get_stats_comment)
+from .export_steps import DEFAULT_TARGET_LATENCY, run_steps, run_steps_timed
+from .fragment_cache import node_fragment_cache
+from .node_schema import validate_node_schema_cache
+from .snapshot import (uni_attr_default_list, FILTER_OUT_ATTRIBS, NODES_WITH_WRITE_OUTPUTS, capture_value,
+    capture_node_props, capture_tree, iter_capture_tree, iter_capture_group_dependencies, get_capture_node_count,
+    get_tree_kind)
+from .subgraph import EXPORT_SCOPE_ALL, get_subgraph_tree
+from .tree_ir import TREE_KIND_GROUP, TREE_KIND_COLLECTIONS
+from .tree_patch import iter_write_patch_code
 
 M2P_TEXT_NAME = "m2pText"
 
-uni_attr_default_list = {
-    "name": "",
-    "label": "",
-    "width": 0.0,
-    "width_hidden": 42.0,
-    "height": 100.0,
-    "color": Color((0.608, 0.608, 0.608)),
-    "use_custom_color": False,
-    "mute": False,
-    "hide": False,
-    "select": None,
-}
-
-WRITE_DEFAULTS_UNI_NODE_OPT = "write_defaults"
-WRITE_LINKED_DEFAULTS_UNI_NODE_OPT = "write_linked_defaults"
-LOC_DEC_PLACES_UNI_NODE_OPT = "loc_decimal_places"
-WRITE_ATTR_NAME_UNI_NODE_OPT = "write_attr_name"
-WRITE_ATTR_WIDTH_HEIGHT_UNI_NODE_OPT = "write_attr_width_height"
-WRITE_ATTR_SELECT_UNI_NODE_OPT = "write_attr_select"
-
-FILTER_OUT_ATTRIBS = ['color', 'dimensions', 'height', 'hide', 'inputs', 'internal_links', 'label', 'location',
-                         'mute', 'name', 'outputs', 'parent', 'rna_type', 'select', 'show_options', 'show_preview',
-                         'show_texture', 'type', 'use_custom_color', 'width', 'width_hidden',
-                         'is_active_output', 'interface']
-
-NODES_WITH_WRITE_OUTPUTS = ['ShaderNodeValue', 'ShaderNodeRGB', 'CompositorNodeValue', 'CompositorNodeRGB']
-
-# add escape characters to backslashes and double-quote chars in given string
-def esc_char_string(in_str):
-    return in_str.replace('\\', '\\\\').replace('"', '\\"')
-
-def get_input_num_for_link(tr_link):
-    for c in range(0, len(tr_link.to_socket.node.inputs)):
-        if tr_link.to_socket.node.inputs[c] == tr_link.to_socket:
-            return c
-    return None
-
-def get_output_num_for_link(tr_link):
-    for c in range(0, len(tr_link.from_socket.node.outputs)):
-        if tr_link.from_socket.node.outputs[c] == tr_link.from_socket:
-            return c
-    return None
+# export targets of the UI, code is written to a new text-block, or streamed to a file
+EXPORT_TARGET_TEXT = "TEXT"
+EXPORT_TARGET_FILE = "FILE"
+
+# export stats of the latest export from the UI, shown in the panel
+last_export_stats = {}
+
+# progress of the running modal export (see M2P_CreateTextModal), shown in the panel, key "progress" is the fraction
+# of export done (0.0 to 1.0), empty if no modal export is running
+modal_export_progress = {}
+
+# seconds between timer events of modal export
+MODAL_TIMER_INTERVAL = 0.01
+# events passed through to the UI while a modal export runs (view navigation only, so the node tree cannot be
+# changed while it is being captured)
+MODAL_PASS_THROUGH_EVENTS = {'MOUSEMOVE', 'INBETWEEN_MOUSEMOVE', 'MIDDLEMOUSE', 'WHEELUPMOUSE', 'WHEELDOWNMOUSE',
+                             'TRACKPADPAN', 'TRACKPADZOOM'}
+
+# names of text-blocks written by incremental exports, keyed by (tree owner type name, tree owner name), so
+# re-exporting a tree updates the same text-block
+incremental_text_names = {}
+
+# get the text-block written by the previous incremental export of the tree, or a new text-block if there is none
+def get_incremental_text(tree_owner):
+    text_key = (type(tree_owner).__name__, tree_owner.name)
+    text = bpy.data.texts.get(incremental_text_names.get(text_key, ""))
+    if text == None:
+        text = bpy.data.texts.new(M2P_TEXT_NAME)
+        incremental_text_names[text_key] = text.name
+    return text
+
+# baseline snapshots of node trees, for patch export from the UI (see tree_patch.py), captured trees keyed by
+# (bpy.data collection name, datablock name) of the tree, as in snapshot files (see tree_format.get_tree_key)
+patch_baselines = {}
+
+def get_baseline_key(node_tree, tree_owner):
+    kind = get_tree_kind(node_tree, tree_owner)
+    return (TREE_KIND_COLLECTIONS[kind], node_tree.name if kind == TREE_KIND_GROUP else tree_owner.name)
+
+# node trees watched by live export (see live_export.py), i.e. trees exported from the UI while live export is enabled,
+# keyed by get_baseline_key, values are dicts with the target of the tree's exports (key "text_name" is the name of the
+# text-block, or key "filepath" is the path of the file, the other key is None), and the fingerprint of the tree when
+# it was last exported (key "fingerprint", None if not known)
+live_export_trees = {}
 
 def bpy_value_to_string(value):
-    # write attribute, if it matches a known type
-    if isinstance(value, str):
-        return "\"%s\"" % value
-    elif isinstance(value, bool):
-        return "%s" % value
-    elif isinstance(value, int):
-        return "%d" % value
-    elif isinstance(value, float):
-        return "%f" % value
-    # if attribute has a length then it is a Vector, Color, etc., so write elements of attribute in a tuple,
-    # unless it is a set
-    elif hasattr(value, '__len__'):
-        vec_str = ""
-        # is it a set?
-        if isinstance(value, set):
-            for item in value:
-                if vec_str != "":
-                    vec_str = vec_str + ", "
-                if isinstance(item, str):
-                    vec_str = vec_str + "\"" + str(item) + "\""
-                else:
-                    vec_str = vec_str + str(item)
-            return "{" + vec_str + "}"
-        else:
-            for val_index in range(len(value)):
-                if vec_str != "":
-                    vec_str = vec_str + ", "
-                if isinstance(value[val_index], str):
-                    vec_str = vec_str + "\"" + str(value[val_index]) + "\""
-                else:
-                    vec_str = vec_str + str(value[val_index])
-            return "(" + vec_str + ")"
-    # if the attribute's value has attribute 'name', then check if it is in a Blender built-in data list
-    elif hasattr(value, 'name'):
-        if type(value) == bpy.types.Image:
-            return "bpy.data.images.get(\"" + value.name + "\")"
-        elif type(value) == bpy.types.Mask:
-            return "bpy.data.masks.get(\"" + value.name + "\")"
-        elif type(value) == bpy.types.Scene:
-            return "bpy.data.scenes.get(\"" + value.name + "\")"
-        elif type(value) == bpy.types.Material:
-            return "bpy.data.materials.get(\"" + value.name + "\")"
-        elif type(value) == bpy.types.Object:
-            return "bpy.data.objects.get(\"" + value.name + "\")"
-        elif type(value) == bpy.types.Collection:
-            return "bpy.data.collections.get(\"" + value.name + "\")"
-        elif type(value) == bpy.types.GeometryNodeTree or type(value) == bpy.types.ShaderNodeTree:
-            return "bpy.data.node_groups.get(\"" + value.name + "\")"
-        elif type(value) == bpy.types.Text:
-            return "bpy.data.texts.get(\"" + value.name + "\")"
-    # return None, because attribute type is unknown
-    else:
-        return None
+    return format_value(capture_value(value))
 
 def bpy_compare_to_value(blender_value, va):
-    if hasattr(blender_value, '__len__') and hasattr(va, '__len__'):
-        # False if lengths of objects are different
-        if len(blender_value) != len(va):
-            return False
-        # is it a set?
-        if isinstance(blender_value, set):
-            c = 0
-            for item in blender_value:
-                if item != va[c]:
-                    return False
-                c = c + 1
-        else:
-            for val_index in range(len(blender_value)):
-                if blender_value[val_index] != va[val_index]:
-                    return False
-        return True
-    else:
-        return blender_value == va
+    return compare_to_value(blender_value, va)
 
 def write_filtered_attribs(m2p_text, line_prefix, node, ignore_attribs):
-    # loop through all attributes of 'node' object
-    for attr_name in dir(node):
-        # if attribute is in ignore attributes list, then continue to next attribute
-        if attr_name in ignore_attribs:
-            continue
-        # get the attribute's value
-        the_attr = getattr(node, attr_name)
-        # filter out attributes that are built-ins (Python/Blender), or callable functions, or
-        # attributes that are ignored/handled elsewhere
-        if attr_name.startswith('__') or attr_name.startswith('bl_') or callable(the_attr) or \
-            attr_name in FILTER_OUT_ATTRIBS:
-            continue
-
-        # if type is Color Ramp
-        if type(the_attr) == bpy.types.ColorRamp:
-            m2p_text.write(line_prefix + "node." + attr_name + ".color_mode = \"%s\"\n" % the_attr.color_mode)
-            m2p_text.write(line_prefix + "node." + attr_name + ".interpolation = \"%s\"\n" % the_attr.interpolation)
-            # remove one element before adding any new elements, leaving the minimum of one element in list
-            # (deleting last element causes Blender error, but one elements needs to be deleted in case only 1 is used)
-            m2p_text.write(line_prefix + "node." + attr_name + ".elements.remove(" + "node." + attr_name +
-                           ".elements[0])\n")
-            # add new elements, as needed
-            elem_index = -1
-            for el in the_attr.elements:
-                elem_index = elem_index + 1
-                # if writing first element then don't create new element
-                if elem_index < 1:
-                    m2p_text.write(line_prefix + "elem = node." + attr_name + ".elements[0]\n")
-                    m2p_text.write(line_prefix + "elem.position = %f\n" % el.position)
-                # else create new element
-                else:
-                    m2p_text.write(line_prefix + "elem = node." + attr_name + ".elements.new(%f)\n" % el.position)
-
-                m2p_text.write(line_prefix + "elem.color = (%f, %f, %f, %f)\n" %
-                               (el.color[0], el.color[1], el.color[2], el.color[3]))
-        # if type is Curve Mapping, e.g. nodes Float Curve (Shader), RGB Curve (Shader), Time Curve (Compositor)
-        elif type(the_attr) == bpy.types.CurveMapping:
-            m2p_text.write(line_prefix + "node." + attr_name + ".use_clip = %s\n" % the_attr.use_clip)
-            m2p_text.write(line_prefix + "node." + attr_name + ".clip_min_x = %f\n" % the_attr.clip_min_x)
-            m2p_text.write(line_prefix + "node." + attr_name + ".clip_min_y = %f\n" % the_attr.clip_min_y)
-            m2p_text.write(line_prefix + "node." + attr_name + ".clip_max_x = %f\n" % the_attr.clip_max_x)
-            m2p_text.write(line_prefix + "node." + attr_name + ".clip_max_y = %f\n" % the_attr.clip_max_y)
-            m2p_text.write(line_prefix + "node." + attr_name + ".extend = \"%s\"\n" % the_attr.extend)
-            # note: Float Curve and Time Curve have 1 curve, RGB curve has 4 curves (C, R, G, B)
-            curve_index = -1
-            for curve in the_attr.curves:
-                curve_index = curve_index + 1
-
-                # addd new points, as needed
-                point_index = -1
-                for p in curve.points:
-                    point_index = point_index + 1
-                    # each curve starts with 2 points by default, so write into these points before creating more
-                    # (2 points minimum, cannot delete them)
-                    if point_index < 2:
-                        m2p_text.write(line_prefix + "point = node." + attr_name + ".curves[%d].points[%d]\n" %
-                                       (curve_index, point_index))
-                        m2p_text.write(line_prefix + "point.location = (%f, %f)\n" % (p.location[0], p.location[1]))
-                    # create new point
-                    else:
-                        m2p_text.write(line_prefix + "point = node." + attr_name + ".curves[%d].points.new(%f, %f)\n" %
-                                       (curve_index, p.location[0], p.location[1]))
-                    m2p_text.write(line_prefix + "point.handle_type = \"%s\"\n" % p.handle_type)
-
-            # reset the clipping view
-            m2p_text.write(line_prefix + "node." + attr_name + ".reset_view()\n")
-            # update the view of the mapping (trigger UI update)
-            m2p_text.write(line_prefix + "node." + attr_name + ".update()\n")
-        # remaining types are String, Integer, Float, etc. (including bpy.types, e.g. bpy.types.Collection)
+    write_node_props(m2p_text, line_prefix, capture_node_props(node, ignore_attribs))
+
+# write Python code to re-create 'node_tree', where 'tree_owner' is the datablock that owns the node tree (Material,
+# World, Linestyle, or Scene), or the node group itself,
+# code is written to 'sink' (see code_sink.py), or to a new text-block if sink is None,
+# if 'stats' is a dict then time taken by capture and generation phases is stored in it,
+# if 'export_dependencies' is True then node groups used by group nodes are exported too (recursively), and
+# 'group_memo' can be a dict shared between calls so each node group is captured only once,
+# if uni_node_options[WRITE_DEFAULTS_UNI_NODE_OPT] is False then node attributes and socket default values that equal
+# the defaults of a new node of the same type (see get_node_prototypes in snapshot.py) are not written, so scripts are
+# smaller and faster to run, otherwise all values are written (full output),
+# 'output_style' is OUTPUT_STYLE_UNROLLED (one line of code per attribute and link) or OUTPUT_STYLE_COMPACT (tables
+# of nodes and links, applied by builder loops),
+# if 'incremental' is True then code of unchanged nodes and links is re-used from previous exports (see
+# fragment_cache.py), and the text-block written by the previous incremental export of this tree is updated in place,
+# if 'profile' is True then time per phase and per node type, and counts of nodes, links, lines, and bytes, are added
+# to 'stats' (see export_stats.py), and if 'stats_header' is True then these stats are also written as a comment at
+# the top of the script (the script is then buffered in memory until all code is generated, instead of streamed to
+# the sink),
+# if 'dedupe_configs' is True then nodes of the same configuration are created by shared functions (unrolled style),
+# if 'call_function' is False then the function that creates the nodes is defined but not called (e.g. so the script
+# can be imported as a module, see package_export.py),
+# if 'baseline' is not None then it is a captured tree (see snapshot.capture_tree, captured with all values) of an
+# earlier state of 'node_tree', and a patch script is written instead, that changes a tree equal to the baseline into
+# the current tree, by changing only the nodes and links that changed (see tree_patch.py), node groups used by group
+# nodes are not exported and stats are not written in the script,
+# 'workers' is the number of worker processes that generate the code of very large trees (see worker_pool.py), 0 is
+# one worker per CPU, the code is the same as the code generated in one process, workers are used only in background
+# Blender (e.g. batch_export.py), the code is always generated in one process in the UI,
+# 'export_scope' is one of the EXPORT_SCOPE_ values (see subgraph.py), e.g. to export only the selected nodes and the
+# nodes upstream of them, links between exported and other nodes are not written, and are added to 'stats' (key
+# "leaving_links"), the scope is ignored by patch exports,
+# if 'deferred_update' is True then the script creates the nodes in a datablock that is not used, which then replaces
+# the existing datablock of the same name in all its users (see codegen.DEFERRED_UPDATE_GEN_OPT), so users are updated
+# once instead of after each change, it is ignored by patch exports,
+# if 'tree' is not None then it is the captured 'node_tree', e.g. captured to check if the tree changed, so it is not
+# captured again, it must be captured with the elide defaults option given by is_elide_defaults,
+# if export fails then the sink is aborted (e.g. a temporary file written by an atomic FileSink is removed), and a
+# new text-block created by the export is removed,
+# returns the result of closing the sink (e.g. the text-block)
+def create_code_text(node_tree, tree_owner, space_pad, keep_links, make_into_function, delete_existing,
+                     ng_output_min_max_def, uni_node_options, sink=None, use_socket_identifiers=False, stats=None,
+                     export_dependencies=False, group_memo=None, output_style=OUTPUT_STYLE_UNROLLED,
+                     incremental=False, profile=False, stats_header=False, dedupe_configs=False, call_function=True,
+                     baseline=None, workers=1, export_scope=EXPORT_SCOPE_ALL, deferred_update=False, tree=None):
+    return run_steps(iter_create_code_text(node_tree, tree_owner, space_pad, keep_links, make_into_function,
+        delete_existing, ng_output_min_max_def, uni_node_options, sink, use_socket_identifiers, stats,
+        export_dependencies, group_memo, output_style, incremental, profile, stats_header, dedupe_configs,
+        call_function, baseline, workers, export_scope, deferred_update, tree))
+
+# returns True if node attributes and socket values equal to the defaults of their node type are not captured by
+# exports with the given options (see create_code_text),
+# patches compare all values with the baseline, so values that changed back to their defaults are patched too
+def is_elide_defaults(uni_node_options, baseline):
+    return not uni_node_options[WRITE_DEFAULTS_UNI_NODE_OPT] and baseline == None
+
+# create_code_text in steps, yields after each node is captured, and after the code of each node is generated, and
+# returns the result of closing the sink (see export_steps.py), the number of steps is given by
+# 2 * get_capture_node_count(node_tree, export_dependencies),
+# if the generator is closed before it is finished (i.e. export is cancelled) then the sink is aborted and a new
+# text-block created by the export is removed, as when export fails
+def iter_create_code_text(node_tree, tree_owner, space_pad, keep_links, make_into_function, delete_existing,
+                          ng_output_min_max_def, uni_node_options, sink=None, use_socket_identifiers=False,
+                          stats=None, export_dependencies=False, group_memo=None, output_style=OUTPUT_STYLE_UNROLLED,
+                          incremental=False, profile=False, stats_header=False, dedupe_configs=False,
+                          call_function=True, baseline=None, workers=1, export_scope=EXPORT_SCOPE_ALL,
+                          deferred_update=False, tree=None):
+    # cached node attribute schemas are valid only for the current Blender version and addon options
+    validate_node_schema_cache((bpy.app.version, tuple(FILTER_OUT_ATTRIBS), tuple(sorted(uni_node_options.items()))))
+
+    # stats are needed to write the stats header
+    profile = profile or stats_header
+    if profile and stats == None:
+        stats = {}
+    profile_stats = None
+    if profile:
+        stats.update(make_export_stats())
+        profile_stats = stats
+
+    # workers are forked (see worker_pool.py), which is not safe in the UI process, e.g. its GPU driver and job threads
+    # are not forked with it
+    if not bpy.app.background:
+        workers = 1
+    elide_defaults = is_elide_defaults(uni_node_options, baseline)
+    if baseline != None:
+        export_dependencies = False
+        stats_header = False
+        export_scope = EXPORT_SCOPE_ALL
+    new_text = None
+    try:
+        # capture phase, read the node tree once into Blender independent snapshot
+        start_time = time.perf_counter()
+        if tree == None:
+            tree = yield from iter_capture_tree(node_tree, tree_owner, profile_stats, elide_defaults)
+        tree, leaving_links = get_subgraph_tree(tree, export_scope)
+        if stats != None and export_scope != EXPORT_SCOPE_ALL:
+            stats["leaving_links"] = leaving_links
+        dependencies = []
+        if export_dependencies:
+            # only node groups used by the exported nodes are needed
+            scope_node_names = set([node.name for node in tree.nodes]) if export_scope != EXPORT_SCOPE_ALL else None
+            dependencies = yield from iter_capture_group_dependencies(node_tree, group_memo, profile_stats,
+                                                                      elide_defaults, scope_node_names)
+        capture_time = time.perf_counter() - start_time
+        if profile:
+            add_phase_time(stats, PHASE_CAPTURE, capture_time)
+            for captured_tree in [tree] + dependencies:
+                count_tree(stats, captured_tree)
+
+        # generation phase, pure Python
+        start_time = time.perf_counter()
+        # code is buffered by the sink, and written to the text-block once when the sink is closed
+        if sink is None:
+            if incremental:
+                sink = TextBlockSink(get_incremental_text(tree_owner))
+            else:
+                new_text = bpy.data.texts.new(M2P_TEXT_NAME)
+                sink = TextBlockSink(new_text)
+        fragment_cache = None
+        if incremental:
+            fragment_cache = node_fragment_cache
+            start_hits = fragment_cache.hits
+            start_misses = fragment_cache.misses
+        gen_options = make_gen_options(space_pad, keep_links, make_into_function, delete_existing,
+                                       ng_output_min_max_def, use_socket_identifiers, output_style, profile_stats,
+                                       call_function=call_function, dedupe_configs=dedupe_configs,
+                                       num_workers=workers, deferred_update=deferred_update)
+        # the stats header is known only after all code is generated, so code is buffered before writing the header
+        gen_sink = StringSink() if stats_header else sink
+        if profile:
+            gen_sink = CountingSink(gen_sink)
+        if baseline != None:
+            patch_counts = yield from iter_write_patch_code(gen_sink, baseline, tree, gen_options, uni_node_options)
+            if stats != None:
+                stats["patch"] = patch_counts
         else:
-            val_str = bpy_value_to_string(the_attr)
-            # do not write attributes that have value None
-            # e.g. an 'object' attribute, that is set to None to indicate no object
-            if val_str != None:
-                m2p_text.write(line_prefix + "node." + attr_name + " = " + val_str + "\n")
-
-def get_node_io_value_str(node_io_element, write_linked):
-    # ignore virtual sockets and shader sockets, no default
-    if node_io_element.bl_idname == 'NodeSocketVirtual' or node_io_element.bl_idname == 'NodeSocketShader':
-        return None
-    # if node doesn't have attribute 'default_value', then cannot save the value - so continue
-    if not hasattr(node_io_element, 'default_value'):
+            yield from iter_write_tree_code(gen_sink, tree, gen_options, uni_node_options, dependencies,
+                                            fragment_cache)
+        if profile:
+            stats["lines"] = gen_sink.lines
+            stats["bytes"] = gen_sink.bytes
+        if stats_header:
+            stats["capture_time"] = capture_time
+            stats["generate_time"] = time.perf_counter() - start_time
+            sink.write(get_stats_comment(stats) + "\n")
+            sink.write(gen_sink.getvalue())
+        output_start_time = time.perf_counter()
+        result = sink.close()
+    # export failed, or was cancelled (GeneratorExit)
+    except BaseException:
+        # e.g. remove partly written temporary file of sink
+        if sink != None:
+            sink.abort()
+        if new_text != None:
+            bpy.data.texts.remove(new_text)
+        raise
+    if profile:
+        add_phase_time(stats, PHASE_OUTPUT, time.perf_counter() - output_start_time)
+    if stats != None:
+        stats["capture_time"] = capture_time
+        stats["generate_time"] = time.perf_counter() - start_time
+        if fragment_cache != None:
+            stats["fragment_hits"] = fragment_cache.hits - start_hits
+            stats["fragment_misses"] = fragment_cache.misses - start_misses
+    return result
+
+def get_uni_node_options(scn):
+    return {
+        LOC_DEC_PLACES_UNI_NODE_OPT: scn.Mat2Py.write_loc_decimal_places,
+        WRITE_DEFAULTS_UNI_NODE_OPT: scn.Mat2Py.write_default_values,
+        WRITE_LINKED_DEFAULTS_UNI_NODE_OPT: scn.Mat2Py.write_linked_default_values,
+        WRITE_ATTR_NAME_UNI_NODE_OPT: scn.Mat2Py.write_attrib_name,
+        WRITE_ATTR_WIDTH_HEIGHT_UNI_NODE_OPT: scn.Mat2Py.write_attrib_width_and_height,
+        WRITE_ATTR_SELECT_UNI_NODE_OPT: scn.Mat2Py.write_attrib_select,
+    }
+
+# get baseline of patch export of the node tree, or None if patch export is not enabled in the addon's scene
+# properties, raises RuntimeError if there is no baseline
+def get_export_baseline(scn, node_tree, tree_owner):
+    if not scn.Mat2Py.patch_export:
         return None
-    # if 'do not write linked default values', and this input socket is linked then skip
-    if not write_linked and node_io_element.is_linked:
-        return None
-    return bpy_value_to_string(node_io_element.default_value)
-
-def create_code_text(context, space_pad, keep_links, make_into_function, delete_existing, ng_output_min_max_def,
-                     uni_node_options):
-    line_prefix = ""
-    if isinstance(space_pad, int):
-        line_prefix = " " * space_pad
-    elif isinstance(space_pad, str):
-        line_prefix = space_pad
-
-    mat = context.space_data
-    m2p_text = bpy.data.texts.new(M2P_TEXT_NAME)
-
-    node_group = bpy.data.node_groups.get(mat.edit_tree.name)
-    is_tree_node_group = (node_group != None)
-
-    m2p_text.write("# Python script from Blender version " + str(bpy.app.version) + " to create ")
-    # if using Node Group (Shader or Geometry Nodes)
-    if is_tree_node_group:
-        if mat.edit_tree.type == 'GEOMETRY':
-            m2p_text.write("Geometry Nodes node group named " + mat.edit_tree.name + "\n\n")
-        else:
-            m2p_text.write("Shader Nodes node group named " + mat.edit_tree.name + "\n\n")
-        if make_into_function:
-            m2p_text.write("import bpy\n\n" +
-                           "# add nodes and links to node group\n" +
-                           "def add_group_nodes(node_group_name):\n")
-    # if using Compositor node tree
-    elif mat.edit_tree.bl_idname == 'CompositorNodeTree':
-        m2p_text.write("Compositor node tree\n\n")
-        if make_into_function:
-            m2p_text.write("import bpy\n\n" +
-                           "# add nodes and links to compositor node tree\n" +
-                           "def add_shader_nodes(material):\n")
-    # using Material node tree
-    else:
-        # check if World or Object material
-        if bpy.data.worlds.get(mat.id.name):
-            m2p_text.write("World Material named " + mat.id.name + "\n\n")
-        elif bpy.data.linestyles.get(mat.id.name):
-            m2p_text.write("Linestyle Material named " + mat.id.name + "\n\n")
-        else:
-            m2p_text.write("Object Material named " + mat.id.name + "\n\n")
-        if make_into_function:
-            m2p_text.write("import bpy\n\n" +
-                           "# add nodes and links to material\n" +
-                           "def add_shader_nodes(material):\n")
-
-    if is_tree_node_group:
-        m2p_text.write(line_prefix + "# initialize variables\n")
-        m2p_text.write(line_prefix + "new_nodes = {}\n")
-        m2p_text.write(line_prefix + "new_node_group = bpy.data.node_groups.new(name=node_group_name, type='" +
-                       mat.edit_tree.bl_idname + "')\n")
-        m2p_text.write("\n" + line_prefix + "# remove old group inputs and outputs\n")
-        m2p_text.write(line_prefix + "new_node_group.inputs.clear()\n")
-        m2p_text.write(line_prefix + "new_node_group.outputs.clear()\n")
-        if len(node_group.inputs) > 0 or len(node_group.outputs) > 0:
-            m2p_text.write(line_prefix + "# create new group inputs and outputs\n")
-        # write group inputs
-        for ng_input in node_group.inputs:
-            # collect lines to be written before writing, to allow for checking if input attributes need to be written
-            lines_to_write = []
-            # check/write the min, max, default, and 'hide value' data
-            if hasattr(ng_input, "min_value") and ng_input.min_value != -340282346638528859811704183484516925440.0:
-                lines_to_write.append(line_prefix + "new_input.min_value = " + bpy_value_to_string(ng_input.min_value) +
-                                      "\n")
-            if hasattr(ng_input, "max_value") and ng_input.max_value != 340282346638528859811704183484516925440.0:
-                lines_to_write.append(line_prefix + "new_input.max_value = " + bpy_value_to_string(ng_input.max_value) +
-                                      "\n")
-            if hasattr(ng_input, "default_value") and ng_input.default_value != None and \
-                    ng_input.default_value != 0.0 and \
-                    not bpy_compare_to_value(ng_input.default_value, (0.0, 0.0, 0.0)) and \
-                    not ( ng_input.bl_socket_idname == 'NodeSocketColor' and \
-                          bpy_compare_to_value(ng_input.default_value, (0.0, 0.0, 0.0, 1.0)) ):
-                lines_to_write.append(line_prefix + "new_input.default_value = " +
-                                      bpy_value_to_string(ng_input.default_value) + "\n")
-            if ng_input.hide_value:
-                lines_to_write.append(line_prefix + "new_input.hide_value = True\n")
-            # create new_input variable only if necessary, i.e. if input attribute values differ from default values
-            if len(lines_to_write) > 0:
-                m2p_text.write(line_prefix + "new_input = new_node_group.inputs.new(type='" +
-                               ng_input.bl_socket_idname + "', name=\"" + ng_input.name + "\")\n")
-                for l in lines_to_write:
-                    m2p_text.write(l)
-            else:
-                m2p_text.write(line_prefix + "new_node_group.inputs.new(type='" + ng_input.bl_socket_idname +
-                               "', name=\"" + ng_input.name + "\")\n")
-        # write group outputs
-        for ng_output in node_group.outputs:
-            # collect lines to be written before writing, to allow for checking if input attributes need to be
-            # written
-            lines_to_write = []
-            # write values for node group output min/max/default if needed
-            if ng_output_min_max_def:
-                # check/write the min, max, default, and 'hide value' data
-                if hasattr(ng_output, "min_value") and ng_output.min_value !=-340282346638528859811704183484516925440.0:
-                    lines_to_write.append(line_prefix + "new_output.min_value = " +
-                                          bpy_value_to_string(ng_output.min_value) + "\n")
-                if hasattr(ng_output, "max_value") and ng_output.max_value != 340282346638528859811704183484516925440.0:
-                    lines_to_write.append(line_prefix + "new_output.max_value = " +
-                                          bpy_value_to_string(ng_output.max_value) + "\n")
-                if hasattr(ng_output, "default_value")and ng_output.default_value != None and \
-                        ng_output.default_value != 0.0 and \
-                        not bpy_compare_to_value(ng_output.default_value, (0.0, 0.0, 0.0)) and \
-                        not ( ng_output.bl_socket_idname == 'NodeSocketColor' and \
-                              bpy_compare_to_value(ng_output.default_value, (0.0, 0.0, 0.0, 1.0)) ):
-                    lines_to_write.append(line_prefix + "new_output.default_value = " +
-                                   bpy_value_to_string(ng_output.default_value) + "\n")
-            if ng_output.hide_value:
-                lines_to_write.append(line_prefix + "new_output.hide_value = True\n")
-            if hasattr(ng_output, "attribute_domain") and ng_output.attribute_domain != "POINT":
-                lines_to_write.append(line_prefix + "new_output.attribute_domain = '" + ng_output.attribute_domain+
-                                      "'\n")
-            if hasattr(ng_output, "default_attribute_name") and ng_output.default_attribute_name != "":
-                lines_to_write.append(line_prefix + "new_output.default_attribute_name = " +
-                                      ng_output.default_attribute_name + "\n")
-            # create new_output variable only if necessary, i.e. if output attribute values differ from default
-            # values
-            if len(lines_to_write) > 0:
-                m2p_text.write(line_prefix + "new_output = new_node_group.outputs.new(type='" +
-                               ng_output.bl_socket_idname + "', name=\"" + ng_output.name + "\")\n")
-                for l in lines_to_write:
-                    m2p_text.write(l)
-            else:
-                m2p_text.write(line_prefix + "new_node_group.outputs.new(type='" + ng_output.bl_socket_idname +
-                               "', name=\"" + ng_output.name + "\")\n")
-
-        m2p_text.write(line_prefix + "tree_nodes = new_node_group.nodes\n")
-    else:
-        m2p_text.write(line_prefix + "# initialize variables\n")
-        m2p_text.write(line_prefix + "new_nodes = {}\n")
-        m2p_text.write(line_prefix + "tree_nodes = material.node_tree.nodes\n")
-
-    if delete_existing:
-        m2p_text.write("\n" + line_prefix + "# delete all nodes\n")
-        m2p_text.write(line_prefix + "tree_nodes.clear()\n")
-    m2p_text.write("\n" + line_prefix + "# create nodes\n")
-
-    # set parenting order of nodes (e.g. parenting to frames) after creating all the nodes in the tree,
-    # so that parent nodes are referenced only after parent nodes are created
-    frame_parenting_text = ""
-    # write info about the individual nodes
-    for tree_node in mat.edit_tree.nodes:
-        m2p_text.write(line_prefix + "node = tree_nodes.new(type=\"%s\")\n" % tree_node.bl_idname)
-        ignore_attribs = []
-        for attr in uni_attr_default_list:
-            # Input Color node will write this value, so ignore it for now
-            if tree_node.bl_idname == 'FunctionNodeInputColor' and attr == 'color':
-                continue
-            if hasattr(tree_node, attr):
-                gotten_attr = getattr(tree_node, attr)
-                # if write defaults is not enabled, and a default value is found, then skip the default value
-                if not uni_node_options[WRITE_DEFAULTS_UNI_NODE_OPT] and gotten_attr == uni_attr_default_list[attr]:
-                    continue
-                # if not writing 'name' then skip
-                elif attr == 'name' and uni_node_options[WRITE_ATTR_NAME_UNI_NODE_OPT] == False:
-                    continue
-                # if not writing width and height then skip
-                elif (attr == 'width' or attr == 'height') and \
-                        uni_node_options[WRITE_ATTR_WIDTH_HEIGHT_UNI_NODE_OPT] == False:
-                    continue
-                # if not writing select state then skip
-                elif attr == 'select' and uni_node_options[WRITE_ATTR_SELECT_UNI_NODE_OPT] == False:
-                    continue
-
-                m2p_text.write(line_prefix + "node." + attr + " = " + bpy_value_to_string(gotten_attr) + "\n")
-
-        # node with parent is special, this node is offset by their parent frame's location
-        parent_loc = Vector((0, 0))
-        if tree_node.parent != None:
-            parent_loc = tree_node.parent.location
-
-        # do rounding of location values, if needed, and write the values
-        precision = uni_node_options[LOC_DEC_PLACES_UNI_NODE_OPT]
-        loc_x = tree_node.location.x + parent_loc.x
-        loc_y = tree_node.location.y + parent_loc.y
-        m2p_text.write(line_prefix + "node.location = (%0.*f, %0.*f)\n" % (precision, loc_x, precision, loc_y))
-
-        # Input Color, this attribute is special because this node type's Color attribute is swapped - very strange!
-        # (maybe a dinosaur left over from old versions of Blender)
-        if tree_node.bl_idname == 'FunctionNodeInputColor':
-            m2p_text.write(line_prefix + "node.color = " + bpy_value_to_string(tree_node.color) + "\n")
-            ignore_attribs.append("color")
-
-        write_filtered_attribs(m2p_text, line_prefix, tree_node, ignore_attribs)
-
-        # get node input(s) default value(s), each input might be [ float, (R, G, B, A), (X, Y, Z), shader ]
-        # TODO: this part needs more testing re: different node input default value(s) and type(s)
-        input_count = -1
-        for node_input in tree_node.inputs:
-            input_count = input_count + 1
-            if node_input.hide_value:
-                continue
-            value_str = get_node_io_value_str(node_input, uni_node_options[WRITE_LINKED_DEFAULTS_UNI_NODE_OPT])
-            if value_str != None:
-                m2p_text.write(line_prefix+"node.inputs["+str(input_count)+"].default_value = "+value_str+"\n")
-
-        # get node output(s) default value(s), each output might be [ float, (R, G, B, A), (X, Y, Z), shader ]
-        # TODO: this part needs more testing re: different node output default value(s) and type(s)
-        output_count = -1
-        for node_output in tree_node.outputs:
-            output_count = output_count + 1
-            if tree_node.bl_idname not in NODES_WITH_WRITE_OUTPUTS:
-                continue
-            # always write the value, even if linked, because this node is special
-            value_str = get_node_io_value_str(node_output, True)
-            if value_str != None:
-                m2p_text.write(line_prefix+"node.outputs["+str(output_count)+"].default_value = "+value_str+"\n")
-
-        m2p_text.write(line_prefix + "new_nodes[\"" + tree_node.name + "\"] = node\n\n")
-        # save a reference to parent node for later, if parent node exists
-        if tree_node.parent != None:
-            frame_parenting_text = frame_parenting_text + line_prefix + "new_nodes[\"" + tree_node.name + \
-                "\"].parent = new_nodes[\"" + tree_node.parent.name + "\"]\n"
-
-    # do node parenting if needed
-    if frame_parenting_text != "":
-        m2p_text.write(line_prefix + "# parenting of nodes\n" + frame_parenting_text + "\n")
-
-    m2p_text.write(line_prefix + "# create links\n")
-    if keep_links:
-        m2p_text.write(line_prefix + "new_links = []\n")
-    if is_tree_node_group:
-        m2p_text.write(line_prefix + "tree_links = new_node_group.links\n")
+    baseline = patch_baselines.get(get_baseline_key(node_tree, tree_owner))
+    if baseline == None:
+        raise RuntimeError("No baseline of node tree " + node_tree.name + ", press 'Set Baseline' first")
+    return baseline
+
+# get steps of export (see iter_create_code_text) of the node tree, with options given by the addon's properties of
+# scene 'scn', code is written to 'sink', or if sink is None then to the target given by the scene properties,
+# 'stats' dict is filled by the export, 'tree' is the captured node tree, or None (see create_code_text)
+def get_export_steps(scn, node_tree, tree_owner, stats, sink=None, tree=None):
+    baseline = get_export_baseline(scn, node_tree, tree_owner)
+    # stream code to a file, instead of writing it to a text-block
+    if sink == None and scn.Mat2Py.export_target == EXPORT_TARGET_FILE:
+        sink = FileSink(bpy.path.abspath(scn.Mat2Py.export_filepath), compress=scn.Mat2Py.export_gzip,
+                        atomic=scn.Mat2Py.export_atomic)
+    return iter_create_code_text(node_tree, tree_owner, scn.Mat2Py.num_space_pad, scn.Mat2Py.keep_links,
+        scn.Mat2Py.make_function, scn.Mat2Py.delete_existing, scn.Mat2Py.ng_output_min_max_def,
+        get_uni_node_options(scn), sink=sink, use_socket_identifiers=scn.Mat2Py.link_socket_identifiers,
+        stats=stats, export_dependencies=scn.Mat2Py.export_node_groups, output_style=scn.Mat2Py.output_style,
+        incremental=scn.Mat2Py.incremental_export, profile=scn.Mat2Py.export_stats,
+        stats_header=scn.Mat2Py.export_stats and scn.Mat2Py.export_stats_header,
+        dedupe_configs=scn.Mat2Py.dedupe_configs, baseline=baseline, workers=scn.Mat2Py.codegen_workers,
+        export_scope=scn.Mat2Py.export_scope, deferred_update=scn.Mat2Py.deferred_update, tree=tree)
+
+# get steps of export of the node tree shown in the Node Editor (see get_export_steps)
+def get_ui_export_steps(context, stats):
+    return get_export_steps(context.scene, context.space_data.edit_tree, context.space_data.id, stats)
+
+# report result of export from the UI, and keep its stats for the panel, 'tree_key' is the get_baseline_key of the
+# exported tree, if live export is enabled then the tree is watched by live export, and re-exported to the same
+# text-block or file when it changes
+def finish_ui_export(operator, context, result, stats, tree_key):
+    if context.scene.Mat2Py.export_target == EXPORT_TARGET_FILE:
+        operator.report({'INFO'}, "Python code written to file " + result)
+        live_export_target = { "text_name": None, "filepath": result }
     else:
-        m2p_text.write(line_prefix + "tree_links = material.node_tree.links\n")
-    for tree_link in mat.edit_tree.links:
-        flint = ""
-        if keep_links:
-            flint = "link = "
-        m2p_text.write(line_prefix + flint + "tree_links.new(new_nodes[\"" + tree_link.from_socket.node.name +
-            "\"].outputs[" + str(get_output_num_for_link(tree_link)) + "], new_nodes[\"" +
-            tree_link.to_socket.node.name + "\"].inputs[" + str(get_input_num_for_link(tree_link)) + "])\n")
-        if keep_links:
-            m2p_text.write(line_prefix + "new_links.append(link)\n")
-
-    m2p_text.write("\n" + line_prefix + "# deselect all new nodes\n" +
-                   line_prefix + "for n in new_nodes.values(): n.select = False\n")
-
-    if is_tree_node_group:
-        m2p_text.write("\n" + line_prefix + "return new_node_group\n")
-    else:
-        m2p_text.write("\n" + line_prefix + "return new_nodes\n")
-
-    # add function call, if needed
-    if make_into_function:
-        # if using nodes in a group (Shader or Geometry Nodes)
-        if is_tree_node_group:
-            m2p_text.write("\n# use Python script to add nodes, and links between nodes, to new Node Group\n" +
-                           "add_group_nodes('" + mat.edit_tree.name + "')\n")
-        # if using World material node tree
-        elif bpy.data.worlds.get(mat.id.name):
-            m2p_text.write("\n# use Python script to create World material, including nodes and links\n" +
-                           "world_mat = bpy.data.worlds.new(\""+mat.id.name+"\")\n" +
-                           "world_mat.use_nodes = True\n" +
-                           "add_shader_nodes(world_mat)\n")
-        # if using Compositor node tree
-        elif mat.edit_tree.bl_idname == 'CompositorNodeTree':
-            m2p_text.write("\n# use Python script to add nodes, and links between nodes, to Compositor node tree\n" +
-                           "add_shader_nodes(bpy.context.scene)\n")
-        # if using Linestyle node tree
-        elif bpy.data.linestyles.get(mat.id.name):
-            m2p_text.write("\n# use Python script to create Linestyle, including nodes and links\n" +
-                           "linestyle_mat = bpy.data.linestyles.new(\""+mat.id.name+"\")\n" +
-                           "linestyle_mat.use_nodes = True\n" +
-                           "add_shader_nodes(linestyle_mat)\n")
-        # else using Object Material Shader Nodes
-        else:
-            m2p_text.write("\n# use Python script to create Material, including nodes and links\n" +
-                           "mat = bpy.data.materials.new(\""+mat.id.name+"\")\n" +
-                           "mat.use_nodes = True\n" +
-                           "add_shader_nodes(mat)\n")
-
-    # scroll to top of lines of text, so user sees start of script immediately upon opening the textblock
-    m2p_text.current_line_index = 0
-    m2p_text.cursor_set(0)
+        live_export_target = { "text_name": result.name, "filepath": None }
+    if context.scene.Mat2Py.live_export:
+        live_export_target["fingerprint"] = None
+        live_export_trees[tree_key] = live_export_target
+    if len(stats.get("leaving_links", [])) > 0:
+        operator.report({'WARNING'}, "%d links to nodes outside the export scope not written: %s" %
+                        (len(stats["leaving_links"]), ", ".join(stats["leaving_links"])))
+    last_export_stats.clear()
+    if context.scene.Mat2Py.export_stats:
+        last_export_stats.update(stats)
+
+def is_export_poll(context):
+    s = context.space_data
+    return s.type == 'NODE_EDITOR' and s.node_tree != None and \
+        s.tree_type in ('CompositorNodeTree', 'ShaderNodeTree', 'TextureNodeTree', 'GeometryNodeTree')
 
 class M2P_CreateText(bpy.types.Operator):
     """Make Python text-block from current Material/Geometry node tree"""
@@ -511,22 +331,120 @@ class M2P_CreateText(bpy.types.Operator):
 
     @classmethod
     def poll(cls, context):
-        s = context.space_data
-        if s.type == 'NODE_EDITOR' and s.node_tree != None and \
-            s.tree_type in ('CompositorNodeTree', 'ShaderNodeTree', 'TextureNodeTree', 'GeometryNodeTree'):
-            return True
-        return False
+        return is_export_poll(context) and len(modal_export_progress) == 0
 
     def execute(self, context):
-        scn = context.scene
-        uni_node_options = {
-            LOC_DEC_PLACES_UNI_NODE_OPT: scn.Mat2Py.write_loc_decimal_places,
-            WRITE_DEFAULTS_UNI_NODE_OPT: scn.Mat2Py.write_default_values,
-            WRITE_LINKED_DEFAULTS_UNI_NODE_OPT: scn.Mat2Py.write_linked_default_values,
-            WRITE_ATTR_NAME_UNI_NODE_OPT: scn.Mat2Py.write_attrib_name,
-            WRITE_ATTR_WIDTH_HEIGHT_UNI_NODE_OPT: scn.Mat2Py.write_attrib_width_and_height,
-            WRITE_ATTR_SELECT_UNI_NODE_OPT: scn.Mat2Py.write_attrib_select,
-        }
-        create_code_text(context, scn.Mat2Py.num_space_pad, scn.Mat2Py.keep_links, scn.Mat2Py.make_function,
-                         scn.Mat2Py.delete_existing, scn.Mat2Py.ng_output_min_max_def, uni_node_options)
+        stats = {}
+        try:
+            result = run_steps(get_ui_export_steps(context, stats))
+        except (RuntimeError, OSError) as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+        finish_ui_export(self, context, result, stats, get_baseline_key(context.space_data.edit_tree,
+                                                                        context.space_data.id))
         return {'FINISHED'}
+
+# capture the node tree shown in the Node Editor as the baseline of patch exports of the tree
+class M2P_SetBaseline(bpy.types.Operator):
+    """Keep snapshot of current node tree, so exports with Patch From Baseline write only changes since then"""
+    bl_idname = "mat2py.set_baseline"
+    bl_label = "Set Baseline"
+
+    @classmethod
+    def poll(cls, context):
+        return is_export_poll(context) and len(modal_export_progress) == 0
+
+    def execute(self, context):
+        s = context.space_data
+        patch_baselines[get_baseline_key(s.edit_tree, s.id)] = capture_tree(s.edit_tree, s.id)
+        self.report({'INFO'}, "Baseline of node tree " + s.edit_tree.name + " set")
+        return {'FINISHED'}
+
+# export in time-sliced chunks of steps run from a timer, so the UI stays responsive and shows progress while huge
+# trees are exported, chunk size adapts so each chunk takes about DEFAULT_TARGET_LATENCY seconds, export is
+# cancelled by pressing Esc (leaving no partly written text-block or file)
+class M2P_CreateTextModal(bpy.types.Operator):
+    """Make Python text-block from current node tree without blocking the UI (press Esc to cancel)"""
+    bl_idname = "mat2py.awesome_modal"
+    bl_label = "Nodes 2 Python (Non-blocking)"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    @classmethod
+    def poll(cls, context):
+        return is_export_poll(context) and len(modal_export_progress) == 0
+
+    def invoke(self, context, event):
+        self.stats = {}
+        self.tree_key = get_baseline_key(context.space_data.edit_tree, context.space_data.id)
+        self.steps_done = 0
+        self.chunk_size = 1
+        self.num_steps = max(1, 2 * get_capture_node_count(context.space_data.edit_tree,
+                                                           context.scene.Mat2Py.export_node_groups))
+        try:
+            self.steps = get_ui_export_steps(context, self.stats)
+            # run first step now, so the export's sink is aborted if export is cancelled before the first timer event
+            if self.run_chunk(context):
+                return {'FINISHED'}
+        except (RuntimeError, OSError) as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+        modal_export_progress["progress"] = 0.0
+        wm = context.window_manager
+        wm.progress_begin(0, 100)
+        self.timer = wm.event_timer_add(MODAL_TIMER_INTERVAL, window=context.window)
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    # run one chunk of steps, returns True if export finished
+    def run_chunk(self, context):
+        chunk_size = self.chunk_size
+        finished, result, self.chunk_size = run_steps_timed(self.steps, chunk_size, DEFAULT_TARGET_LATENCY)
+        self.steps_done = self.steps_done + chunk_size
+        if finished:
+            finish_ui_export(self, context, result, self.stats, self.tree_key)
+        return finished
+
+    def modal(self, context, event):
+        if event.type == 'ESC':
+            # close steps, so export aborts its sink and removes its new text-block
+            self.steps.close()
+            self.end_modal(context)
+            self.report({'INFO'}, "Nodes 2 Python cancelled")
+            return {'CANCELLED'}
+        if event.type != 'TIMER' or event.timer != self.timer:
+            if event.type in MODAL_PASS_THROUGH_EVENTS:
+                return {'PASS_THROUGH'}
+            return {'RUNNING_MODAL'}
+        try:
+            finished = self.run_chunk(context)
+        except (RuntimeError, OSError) as e:
+            self.end_modal(context)
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+        except BaseException:
+            # e.g. tree was removed during export, remove timer and progress so other exports can run again
+            self.steps.close()
+            self.end_modal(context)
+            raise
+        if finished:
+            self.end_modal(context)
+            return {'FINISHED'}
+        progress = min(1.0, self.steps_done / self.num_steps)
+        modal_export_progress["progress"] = progress
+        context.window_manager.progress_update(int(progress * 100))
+        context.workspace.status_text_set("Nodes 2 Python: %d%% (Esc to cancel)" % int(progress * 100))
+        self.redraw_panels(context)
+        return {'RUNNING_MODAL'}
+
+    def end_modal(self, context):
+        wm = context.window_manager
+        wm.event_timer_remove(self.timer)
+        wm.progress_end()
+        context.workspace.status_text_set(None)
+        modal_export_progress.clear()
+        self.redraw_panels(context)
+
+    def redraw_panels(self, context):
+        for area in context.screen.areas:
+            if area.type == 'NODE_EDITOR':
+                area.tag_redraw()
@@ -0,0 +1,103 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 3
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# Per node type attribute schema cache. The list of serializable properties of a node type is built once from the
+# type's RNA definition (bl_rna.properties), and re-used for every node of the same type (bl_idname), instead of
+# scanning dir(node) and calling getattr() on every name (including methods) for every node.
+
+# kinds of serializable properties
+SCHEMA_KIND_VALUE = "value"
+SCHEMA_KIND_ENUM = "enum"
+SCHEMA_KIND_FLOAT_VECTOR = "float_vector"
+SCHEMA_KIND_ID = "id"
+SCHEMA_KIND_COLOR_RAMP = "color_ramp"
+SCHEMA_KIND_CURVE_MAPPING = "curve_mapping"
+
+# schemas by node bl_idname, each schema is a tuple of (property name, property kind) tuples
+node_schema_cache = {}
+# stamp (e.g. Blender version and addon options) used when the cached schemas were built
+node_schema_cache_stamp = None
+
+def clear_node_schema_cache():
+    global node_schema_cache_stamp
+    node_schema_cache.clear()
+    node_schema_cache_stamp = None
+
+# clear the cache if the given stamp differs from the stamp of the cached schemas, e.g. because the Blender version
+# or addon options changed
+def validate_node_schema_cache(stamp):
+    global node_schema_cache_stamp
+    if stamp != node_schema_cache_stamp:
+        node_schema_cache.clear()
+        node_schema_cache_stamp = stamp
+
+# returns True if the RNA struct is, or is derived from, the ID struct (i.e. the pointer references a datablock)
+def is_id_struct(rna_struct):
+    while rna_struct != None:
+        if rna_struct.identifier == 'ID':
+            return True
+        rna_struct = rna_struct.base
+    return False
+
+# get the kind of RNA property, returns None if the property cannot be serialized
+def get_rna_prop_kind(rna_prop):
+    if rna_prop.type == 'POINTER':
+        if rna_prop.fixed_type == None:
+            return None
+        if rna_prop.fixed_type.identifier == 'ColorRamp':
+            return SCHEMA_KIND_COLOR_RAMP
+        if rna_prop.fixed_type.identifier == 'CurveMapping':
+            return SCHEMA_KIND_CURVE_MAPPING
+        # Color Ramp and Curve Mapping pointers are read-only, but their data is writable - other read-only
+        # pointers cannot be set
+        if rna_prop.is_readonly:
+            return None
+        if is_id_struct(rna_prop.fixed_type):
+            return SCHEMA_KIND_ID
+        # pointers to other structs, e.g. ImageUser, are not serialized
+        return None
+    # collections cannot be set by assignment
+    if rna_prop.type == 'COLLECTION' or rna_prop.is_readonly:
+        return None
+    if rna_prop.type == 'ENUM':
+        return SCHEMA_KIND_ENUM
+    if rna_prop.type == 'FLOAT' and rna_prop.array_length > 0:
+        return SCHEMA_KIND_FLOAT_VECTOR
+    return SCHEMA_KIND_VALUE
+
+def build_node_schema(node, filter_out_attribs):
+    schema = []
+    for rna_prop in node.bl_rna.properties:
+        attr_name = rna_prop.identifier
+        # filter out attributes that are built-ins (Blender), or attributes that are ignored/handled elsewhere
+        if attr_name.startswith('bl_') or attr_name in filter_out_attribs:
+            continue
+        kind = get_rna_prop_kind(rna_prop)
+        if kind != None:
+            schema.append((attr_name, kind))
+    # sort by name, to keep the same order of attributes as given by dir()
+    schema.sort()
+    return tuple(schema)
+
+# get the schema of the node's type, building and caching it if needed
+def get_node_schema(node, filter_out_attribs):
+    schema = node_schema_cache.get(node.bl_idname)
+    if schema == None:
+        schema = build_node_schema(node, filter_out_attribs)
+        node_schema_cache[node.bl_idname] = schema
+    return schema
@@ -0,0 +1,194 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 3
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# Library export to a Python package: one module per node tree, and a generated index (the package's __init__.py)
+# that imports the module of a tree only when it is first used (module level __getattr__), so re-creating one
+# material of a library does not import or compile the modules of all other trees. Each module defines build(), that
+# creates the tree's datablock with nodes and links, after creating the node groups used by its group nodes through
+# the package. Used by batch_export.py --package.
+
+import keyword
+import os
+import re
+
+from .code_sink import FileSink, StringSink
+from .codegen import OUTPUT_STYLE_UNROLLED, format_code_string
+from .mat2py import create_code_text
+from .snapshot import get_tree_kind, get_used_node_groups
+from .tree_ir import (TREE_KIND_GROUP, TREE_KIND_COMPOSITOR, TREE_KIND_WORLD, TREE_KIND_LINESTYLE,
+    TREE_KIND_MATERIAL, TREE_KIND_COLLECTIONS)
+
+PACKAGE_INDEX_FILENAME = "__init__.py"
+
+# prefix of module names, by kind of tree
+MODULE_NAME_PREFIXES = {
+    TREE_KIND_GROUP: "group_",
+    TREE_KIND_COMPOSITOR: "compositor_",
+    TREE_KIND_WORLD: "world_",
+    TREE_KIND_LINESTYLE: "linestyle_",
+    TREE_KIND_MATERIAL: "material_",
+}
+
+# code of build() function of a tree module, by kind of tree, formatted with the tree's datablock name (as Python
+# code string), 'add_group_nodes' and 'add_shader_nodes' are defined by the exported script
+BUILD_GROUP_CODE = \
+    "def build(name=%s):\n" + \
+    "    from . import ensure_node_groups\n" + \
+    "    ensure_node_groups(USED_NODE_GROUPS)\n" + \
+    "    return add_group_nodes(name)\n"
+BUILD_DATABLOCK_CODE = \
+    "def build(name=%s):\n" + \
+    "    from . import ensure_node_groups\n" + \
+    "    ensure_node_groups(USED_NODE_GROUPS)\n" + \
+    "    datablock = bpy.data.%s.new(name)\n" + \
+    "    datablock.use_nodes = True\n" + \
+    "    add_shader_nodes(datablock)\n" + \
+    "    return datablock\n"
+# compositor node tree is added to the scene of the given name, the scene is created if it does not exist
+BUILD_COMPOSITOR_CODE = \
+    "def build(name=%s):\n" + \
+    "    from . import ensure_node_groups\n" + \
+    "    ensure_node_groups(USED_NODE_GROUPS)\n" + \
+    "    scene = bpy.data.scenes.get(name)\n" + \
+    "    if scene == None:\n" + \
+    "        scene = bpy.data.scenes.new(name)\n" + \
+    "    scene.use_nodes = True\n" + \
+    "    add_shader_nodes(scene)\n" + \
+    "    return scene\n"
+
+PACKAGE_INDEX_CODE = '''# Python package of node trees from Blender file:
+#   %(blend_file)s
+# created by material2python addon. Each node tree is re-created by a module of this package, modules are imported
+# only when first used, e.g.
+#   import %(package_name)s
+#   %(package_name)s.build("materials", "Material")
+# re-creates the material named "Material", after importing only its module (and the modules of the node groups it
+# uses). Modules can also be used by name, e.g. %(package_name)s.material_Material.build()
+
+import importlib
+
+# module name of each node tree, by (bpy.data collection name, datablock name)
+TREE_MODULES = {
+%(tree_rows)s}
+MODULE_NAMES = frozenset(TREE_MODULES.values())
+
+# import the module of a node tree when it is first accessed as an attribute of the package
+def __getattr__(name):
+    if name in MODULE_NAMES:
+        return importlib.import_module("." + name, __name__)
+    raise AttributeError("module %%r has no attribute %%r" %% (__name__, name))
+
+def __dir__():
+    return sorted(set(globals()) | MODULE_NAMES)
+
+def get_tree_module(collection_name, name):
+    module_name = TREE_MODULES.get((collection_name, name))
+    if module_name == None:
+        raise KeyError("No node tree of bpy.data.%%s[%%r] in package %%s" %% (collection_name, name, __name__))
+    return importlib.import_module("." + module_name, __name__)
+
+# create the datablock (e.g. material, or node group) with nodes and links, returns the new datablock
+def build(collection_name, name):
+    return get_tree_module(collection_name, name).build()
+
+# create the node groups, that do not already exist, from their modules
+def ensure_node_groups(names):
+    import bpy
+    for name in names:
+        if bpy.data.node_groups.get(name) == None:
+            build("node_groups", name)
+'''
+
+# get node groups used by group nodes of the node trees (recursively) that are not in the list of node trees, i.e. the
+# node groups that must be added to a package of the node trees, so all group references resolve through the package
+def get_missing_node_groups(node_trees):
+    visited = set([node_tree.as_pointer() for node_tree in node_trees])
+    missing_groups = []
+    groups = []
+    for node_tree in node_trees:
+        groups.extend(get_used_node_groups(node_tree))
+    while len(groups) > 0:
+        group = groups.pop(0)
+        if group.as_pointer() in visited:
+            continue
+        visited.add(group.as_pointer())
+        missing_groups.append(group)
+        groups.extend(get_used_node_groups(group))
+    return missing_groups
+
+# get a valid, unique (not in 'used_names') module name for a tree of the given kind and name, and add it to
+# 'used_names'
+def get_module_name(kind, name, used_names):
+    base_name = MODULE_NAME_PREFIXES[kind] + re.sub(r"[^A-Za-z0-9_]", "_", name)
+    if keyword.iskeyword(base_name):
+        base_name = base_name + "_"
+    module_name = base_name
+    index = 2
+    while module_name in used_names:
+        module_name = "%s_%d" % (base_name, index)
+        index = index + 1
+    used_names.add(module_name)
+    return module_name
+
+def get_build_function_code(kind, name):
+    if kind == TREE_KIND_GROUP:
+        return BUILD_GROUP_CODE % format_code_string(name)
+    elif kind == TREE_KIND_COMPOSITOR:
+        return BUILD_COMPOSITOR_CODE % format_code_string(name)
+    return BUILD_DATABLOCK_CODE % (format_code_string(name), TREE_KIND_COLLECTIONS[kind])
+
+# write module that re-creates the node tree, i.e. the exported script (with its function defined but not called),
+# followed by the build() function, options are as in mat2py.create_code_text (the script always re-creates the tree
+# in a function), returns (bpy.data collection name, datablock name) of the tree, to add to the package index
+def write_tree_module(filepath, node_tree, tree_owner, uni_node_options, space_pad=4, keep_links=False,
+                      ng_output_min_max_def=False, use_socket_identifiers=False, stats=None,
+                      output_style=OUTPUT_STYLE_UNROLLED, profile=False, stats_header=False, dedupe_configs=False,
+                      atomic=False):
+    kind = get_tree_kind(node_tree, tree_owner)
+    name = node_tree.name if kind == TREE_KIND_GROUP else tree_owner.name
+    # function body must be indented
+    code = create_code_text(node_tree, tree_owner, space_pad if space_pad > 0 else 4, keep_links, True, True,
+                            ng_output_min_max_def, uni_node_options, sink=StringSink(),
+                            use_socket_identifiers=use_socket_identifiers, stats=stats, output_style=output_style,
+                            profile=profile, stats_header=stats_header, dedupe_configs=dedupe_configs,
+                            call_function=False)
+    used_group_names = [group.name for group in get_used_node_groups(node_tree)]
+    sink = FileSink(filepath, atomic=atomic)
+    try:
+        sink.write(code)
+        sink.write("\n# node groups used by group nodes of this node tree, created through the package (if they do " +
+                   "not\n# already exist) before nodes are added\n" +
+                   "USED_NODE_GROUPS = [" + ", ".join([format_code_string(n) for n in used_group_names]) + "]\n\n" +
+                   "# create the node tree, with nodes and links, returns the new datablock\n" +
+                   get_build_function_code(kind, name))
+    except BaseException:
+        sink.abort()
+        raise
+    sink.close()
+    return TREE_KIND_COLLECTIONS[kind], name
+
+# write package index (__init__.py), 'tree_modules' is a list of ((bpy.data collection name, datablock name), module
+# name) of the tree modules written to the package
+def write_package_index(package_dir, blend_file, tree_modules, atomic=False):
+    tree_rows = "".join(["    (%s, %s): %s,\n" % (format_code_string(key[0]), format_code_string(key[1]),
+                                                   format_code_string(module_name))
+                         for key, module_name in tree_modules])
+    sink = FileSink(os.path.join(package_dir, PACKAGE_INDEX_FILENAME), atomic=atomic)
+    sink.write(PACKAGE_INDEX_CODE % { "blend_file": blend_file, "package_name": os.path.basename(package_dir),
+                                      "tree_rows": tree_rows })
+    return sink.close()
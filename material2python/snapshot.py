@@ -0,0 +1,463 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 3
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# Capture phase of export: walk a Blender node tree once, reading all data needed for code generation, and return
+# it as a Blender independent snapshot (see tree_ir.py).
+
+import time
+from array import array
+
+import bpy
+from mathutils import Color
+
+from .export_stats import add_node_type_time
+from .export_steps import run_steps
+
+# NumPy is optional, float arrays for bulk reads are Python arrays if NumPy is not available
+try:
+    import numpy
+except ImportError:
+    numpy = None
+from .node_schema import (SCHEMA_KIND_VALUE, SCHEMA_KIND_COLOR_RAMP, SCHEMA_KIND_CURVE_MAPPING, get_node_schema)
+from .tree_diff import values_match
+from .tree_ir import (IDRef, ColorRampData, CurveMapData, CurveMappingData, SocketData, NodeData, LinkData,
+    InterfaceSocketData, TreeData, TREE_KIND_GROUP, TREE_KIND_COMPOSITOR, TREE_KIND_WORLD, TREE_KIND_LINESTYLE,
+    TREE_KIND_MATERIAL)
+
+uni_attr_default_list = {
+    "name": "",
+    "label": "",
+    "width": 0.0,
+    "width_hidden": 42.0,
+    "height": 100.0,
+    "color": Color((0.608, 0.608, 0.608)),
+    "use_custom_color": False,
+    "mute": False,
+    "hide": False,
+    "select": None,
+}
+
+FILTER_OUT_ATTRIBS = ['color', 'dimensions', 'height', 'hide', 'inputs', 'internal_links', 'label', 'location',
+                         'mute', 'name', 'outputs', 'parent', 'rna_type', 'select', 'show_options', 'show_preview',
+                         'show_texture', 'type', 'use_custom_color', 'width', 'width_hidden',
+                         'is_active_output', 'interface']
+
+NODES_WITH_WRITE_OUTPUTS = ['ShaderNodeValue', 'ShaderNodeRGB', 'CompositorNodeValue', 'CompositorNodeRGB']
+
+# name of the temporary node group used to create prototype nodes
+PROTOTYPE_TREE_NAME = ".m2p_prototypes"
+# float values closer than this to the default value are default values
+DEFAULT_FLOAT_TOLERANCE = 0.000001
+
+# plain Python value types, captured as is
+PLAIN_VALUE_TYPES = (str, bool, int, float)
+
+# bpy.data collection name of each datablock type, by type name (RNA identifier) of the collection's items, read from
+# bpy.data's RNA so every type of datablock is known (built on first use, bpy.data is restricted while addons register)
+id_type_collections = None
+
+def get_id_type_collections():
+    global id_type_collections
+    if id_type_collections == None:
+        id_type_collections = {}
+        for rna_prop in bpy.data.bl_rna.properties:
+            if rna_prop.type == 'COLLECTION' and rna_prop.fixed_type != None:
+                id_type_collections.setdefault(rna_prop.fixed_type.identifier, rna_prop.identifier)
+    return id_type_collections
+
+# get name of the bpy.data collection of a datablock type, or of its nearest base type (e.g. 'node_groups' for
+# GeometryNodeTree, by its base type NodeTree), returns None if there is no collection for the type
+def get_id_collection_name(id_type):
+    collections = get_id_type_collections()
+    for base_type in id_type.__mro__:
+        collection_name = collections.get(base_type.__name__)
+        if collection_name != None:
+            return collection_name
+    return None
+
+def capture_plain_value(value):
+    return value
+
+def capture_set_value(value):
+    return set(value)
+
+# capture elements of a Vector, Color, array, etc. in a tuple
+def capture_sequence_value(value):
+    items = tuple(value)
+    for item in items:
+        if type(item) not in PLAIN_VALUE_TYPES:
+            return tuple([capture_value(item) for item in items])
+    return items
+
+def capture_unknown_value(value):
+    return None
+
+# get function to capture datablock references of the given type, as IDRef by the type's bpy.data collection
+def make_id_capturer(id_type):
+    collection_name = get_id_collection_name(id_type)
+    if collection_name == None:
+        return capture_unknown_value
+    return lambda value: IDRef(collection_name, value.name)
+
+# get function to capture values of the given type, for types not already in value_capturers
+def resolve_value_capturer(value_type):
+    if issubclass(value_type, PLAIN_VALUE_TYPES):
+        return capture_plain_value
+    elif issubclass(value_type, (set, frozenset)):
+        return capture_set_value
+    # datablock reference
+    elif issubclass(value_type, bpy.types.ID):
+        return make_id_capturer(value_type)
+    # if value has a length then it is a Vector, Color, etc.
+    elif hasattr(value_type, '__len__'):
+        return capture_sequence_value
+    return capture_unknown_value
+
+# functions to capture values, by exact type of value, types are added when first captured (see
+# resolve_value_capturer), so each value is captured with one dict lookup
+value_capturers = {
+    str: capture_plain_value,
+    bool: capture_plain_value,
+    int: capture_plain_value,
+    float: capture_plain_value,
+    set: capture_set_value,
+}
+
+# convert a Blender value to plain Python data, returns None if the value's type is unknown
+def capture_value(value):
+    capturer = value_capturers.get(type(value))
+    if capturer == None:
+        capturer = resolve_value_capturer(type(value))
+        value_capturers[type(value)] = capturer
+    return capturer(value)
+
+# get array of 'count' 32 bit floats, to be filled by foreach_get()
+def new_float_array(count):
+    if numpy != None:
+        return numpy.zeros(count, dtype=numpy.float32)
+    return array('f', [0.0]) * count
+
+# read float attribute of all items of a collection in bulk, with one foreach_get() call instead of one RNA access per
+# item and element, returns flat list of floats ('width' floats per item)
+def get_collection_floats(collection, attr_name, width):
+    values = new_float_array(len(collection) * width)
+    collection.foreach_get(attr_name, values)
+    return values.tolist()
+
+def capture_color_ramp(color_ramp):
+    elements = color_ramp.elements
+    return ColorRampData(color_ramp.color_mode, color_ramp.interpolation, get_collection_floats(elements, "position", 1),
+                         get_collection_floats(elements, "color", 4))
+
+def capture_curve_mapping(curve_mapping):
+    curves = []
+    for curve in curve_mapping.curves:
+        # enum attributes cannot be read by foreach_get()
+        curves.append(CurveMapData(get_collection_floats(curve.points, "location", 2),
+                                   [p.handle_type for p in curve.points]))
+    return CurveMappingData(curve_mapping.use_clip, curve_mapping.clip_min_x, curve_mapping.clip_min_y,
+                            curve_mapping.clip_max_x, curve_mapping.clip_max_y, curve_mapping.extend, curves)
+
+# capture node type specific attributes, returns list of (attribute name, schema kind, value)
+def capture_node_props(node, ignore_attribs):
+    props = []
+    # loop through the serializable attributes of 'node' object, given by the (cached) schema of the node's type
+    for attr_name, attr_kind in get_node_schema(node, FILTER_OUT_ATTRIBS):
+        # if attribute is in ignore attributes list, then continue to next attribute
+        if attr_name in ignore_attribs:
+            continue
+        the_attr = getattr(node, attr_name)
+        if attr_kind == SCHEMA_KIND_COLOR_RAMP:
+            value = capture_color_ramp(the_attr)
+        elif attr_kind == SCHEMA_KIND_CURVE_MAPPING:
+            value = capture_curve_mapping(the_attr)
+        else:
+            value = capture_value(the_attr)
+            # do not capture attributes that have value None
+            # e.g. an 'object' attribute, that is set to None to indicate no object
+            if value == None:
+                continue
+        props.append((attr_name, attr_kind, value))
+    return props
+
+# capture node inputs or outputs, and add sockets to the socket -> (index, identifier) map used to capture links
+def capture_sockets(sockets, with_default_values, socket_index_map):
+    sockets_data = []
+    for index, socket in enumerate(sockets):
+        identifier = getattr(socket, "identifier", None)
+        socket_index_map[socket.as_pointer()] = (index, identifier)
+        default_value = None
+        # ignore virtual sockets and shader sockets, no default
+        if with_default_values and socket.bl_idname != 'NodeSocketVirtual' and \
+                socket.bl_idname != 'NodeSocketShader' and hasattr(socket, 'default_value'):
+            default_value = capture_value(socket.default_value)
+        sockets_data.append(SocketData(index, identifier, socket.name, socket.bl_idname, socket.hide_value,
+                                       socket.is_linked, default_value))
+    return sockets_data
+
+# capture node, if 'prototype' is not None then attributes and socket values equal to the prototype's values are not
+# captured
+def capture_node(tree_node, socket_index_map, prototype=None):
+    uni_attrs = []
+    for attr in uni_attr_default_list:
+        # Input Color node will write this value with the node type specific attributes
+        if tree_node.bl_idname == 'FunctionNodeInputColor' and attr == 'color':
+            continue
+        if hasattr(tree_node, attr):
+            gotten_attr = getattr(tree_node, attr)
+            uni_attrs.append((attr, capture_value(gotten_attr), gotten_attr == uni_attr_default_list[attr]))
+
+    # node with parent is special, this node is offset by their parent frame's location (and the locations of the
+    # parent's parents, if frames are nested)
+    parent_name = None
+    loc_x = tree_node.location.x
+    loc_y = tree_node.location.y
+    if tree_node.parent != None:
+        parent_name = tree_node.parent.name
+        parent_node = tree_node.parent
+        while parent_node != None:
+            loc_x = loc_x + parent_node.location.x
+            loc_y = loc_y + parent_node.location.y
+            parent_node = parent_node.parent
+
+    props = []
+    ignore_attribs = []
+    # Input Color, this attribute is special because this node type's Color attribute is swapped - very strange!
+    # (maybe a dinosaur left over from old versions of Blender)
+    if tree_node.bl_idname == 'FunctionNodeInputColor':
+        props.append(("color", SCHEMA_KIND_VALUE, capture_value(tree_node.color)))
+        ignore_attribs.append("color")
+    props.extend(capture_node_props(tree_node, ignore_attribs))
+
+    inputs = capture_sockets(tree_node.inputs, True, socket_index_map)
+    outputs = capture_sockets(tree_node.outputs, tree_node.bl_idname in NODES_WITH_WRITE_OUTPUTS, socket_index_map)
+    if prototype != None:
+        props = elide_default_props(props, prototype)
+        elide_default_socket_values(inputs, prototype.inputs)
+        elide_default_socket_values(outputs, prototype.outputs)
+    return NodeData(tree_node.name, tree_node.bl_idname, (loc_x, loc_y), parent_name, uni_attrs, props, inputs,
+                    outputs)
+
+def capture_link(tree_link, socket_index_map):
+    from_index, from_identifier = socket_index_map[tree_link.from_socket.as_pointer()]
+    to_index, to_identifier = socket_index_map[tree_link.to_socket.as_pointer()]
+    return LinkData(tree_link.from_node.name, from_index, from_identifier, tree_link.to_node.name, to_index,
+                    to_identifier)
+
+def capture_interface_socket(ng_socket):
+    def get_value(attr_name):
+        if hasattr(ng_socket, attr_name):
+            return capture_value(getattr(ng_socket, attr_name))
+        return None
+    return InterfaceSocketData(ng_socket.name, ng_socket.bl_socket_idname, get_value("min_value"),
+                               get_value("max_value"), get_value("default_value"), ng_socket.hide_value,
+                               get_value("attribute_domain"), get_value("default_attribute_name"))
+
+def get_tree_kind(node_tree, tree_owner):
+    if bpy.data.node_groups.get(node_tree.name) != None:
+        return TREE_KIND_GROUP
+    elif node_tree.bl_idname == 'CompositorNodeTree':
+        return TREE_KIND_COMPOSITOR
+    # check if World or Linestyle or Object material
+    elif bpy.data.worlds.get(tree_owner.name):
+        return TREE_KIND_WORLD
+    elif bpy.data.linestyles.get(tree_owner.name):
+        return TREE_KIND_LINESTYLE
+    return TREE_KIND_MATERIAL
+
+# node prototype, i.e. the default attribute values and socket default values of a new node of a type, captured from
+# a pristine node created in a scratch node tree
+class NodePrototype:
+    def __init__(self, props, inputs, outputs):
+        # captured value of each attribute, by attribute name
+        self.props = props
+        # (identifier, captured default value) of each input/output socket, by socket index
+        self.inputs = inputs
+        self.outputs = outputs
+
+# prototypes keyed by (node tree bl_idname, node bl_idname), prototype is None if node of that type cannot be
+# created in a scratch node tree
+node_prototype_cache = {}
+# stamp (Blender version) used when the cached prototypes were captured
+node_prototype_cache_stamp = None
+
+# clear the cache if the given stamp differs from the stamp of the cached prototypes
+def validate_node_prototype_cache(stamp):
+    global node_prototype_cache_stamp
+    if stamp != node_prototype_cache_stamp:
+        node_prototype_cache.clear()
+        node_prototype_cache_stamp = stamp
+
+def capture_socket_defaults(sockets):
+    defaults = {}
+    for index, socket in enumerate(sockets):
+        if hasattr(socket, 'default_value'):
+            defaults[index] = (getattr(socket, "identifier", None), capture_value(socket.default_value))
+    return defaults
+
+def capture_prototype(tree_node):
+    props = {}
+    for attr_name, attr_kind, value in capture_node_props(tree_node, []):
+        props[attr_name] = value
+    return NodePrototype(props, capture_socket_defaults(tree_node.inputs), capture_socket_defaults(tree_node.outputs))
+
+# get prototypes of the types of nodes in the node tree, creating pristine nodes of types not already cached (in a
+# scratch node group of the same tree type, removed afterwards), returns dict of prototypes by node bl_idname
+def get_node_prototypes(node_tree):
+    validate_node_prototype_cache(tuple(bpy.app.version))
+    prototypes = {}
+    scratch_tree = None
+    # the scratch node group is removed even if capture fails, or is interrupted, so it is never left in the file
+    try:
+        for tree_node in node_tree.nodes:
+            bl_idname = tree_node.bl_idname
+            if bl_idname in prototypes:
+                continue
+            key = (node_tree.bl_idname, bl_idname)
+            if key not in node_prototype_cache:
+                if scratch_tree == None:
+                    scratch_tree = bpy.data.node_groups.new(PROTOTYPE_TREE_NAME, node_tree.bl_idname)
+                try:
+                    node_prototype_cache[key] = capture_prototype(scratch_tree.nodes.new(bl_idname))
+                # some types of nodes cannot be created in a node group
+                except RuntimeError:
+                    node_prototype_cache[key] = None
+            prototypes[bl_idname] = node_prototype_cache[key]
+    finally:
+        if scratch_tree != None:
+            bpy.data.node_groups.remove(scratch_tree)
+    return prototypes
+
+# returns True if captured value equals captured default value, floats are compared with tolerance
+def is_default_value(value, default_value):
+    return values_match(value, default_value, DEFAULT_FLOAT_TOLERANCE)
+
+# remove captured attributes that have the default value of the node type
+def elide_default_props(props, prototype):
+    return [(attr_name, attr_kind, value) for attr_name, attr_kind, value in props
+            if attr_name not in prototype.props or not is_default_value(value, prototype.props[attr_name])]
+
+# set default value of captured sockets to None, if it is the default value of the socket in the node type, so the
+# value is not written
+def elide_default_socket_values(sockets_data, socket_defaults):
+    for socket_data in sockets_data:
+        if socket_data.default_value == None:
+            continue
+        identifier, default_value = socket_defaults.get(socket_data.index, (None, None))
+        if identifier == socket_data.identifier and is_default_value(socket_data.default_value, default_value):
+            socket_data.default_value = None
+
+# capture node tree, where 'tree_owner' is the datablock that owns the node tree (Material, World, Linestyle, or
+# Scene), or the node group itself, if 'stats' is not None then capture time per node type is added to export stats,
+# if 'elide_defaults' is True then node attributes and socket values that equal the defaults of the node's type (see
+# get_node_prototypes) are not captured, so they are not written
+def capture_tree(node_tree, tree_owner, stats=None, elide_defaults=False):
+    return run_steps(iter_capture_tree(node_tree, tree_owner, stats, elide_defaults))
+
+# capture node tree in steps, yields after each node is captured and returns the captured tree (see export_steps.py)
+def iter_capture_tree(node_tree, tree_owner, stats=None, elide_defaults=False):
+    kind = get_tree_kind(node_tree, tree_owner)
+    group_inputs = []
+    group_outputs = []
+    if kind == TREE_KIND_GROUP:
+        group_inputs = [capture_interface_socket(ng_input) for ng_input in node_tree.inputs]
+        group_outputs = [capture_interface_socket(ng_output) for ng_output in node_tree.outputs]
+    # map of sockets to their index and identifier, filled while capturing nodes and used to capture links,
+    # keyed by socket pointer
+    socket_index_map = {}
+    prototypes = get_node_prototypes(node_tree) if elide_defaults else {}
+    nodes = []
+    for tree_node in node_tree.nodes:
+        if stats != None:
+            start_time = time.perf_counter()
+        nodes.append(capture_node(tree_node, socket_index_map, prototypes.get(tree_node.bl_idname)))
+        if stats != None:
+            add_node_type_time(stats, tree_node.bl_idname, time.perf_counter() - start_time)
+        yield
+    links = [capture_link(tree_link, socket_index_map) for tree_link in node_tree.links]
+    owner_name = node_tree.name if kind == TREE_KIND_GROUP else tree_owner.name
+    return TreeData(node_tree.name, node_tree.bl_idname, node_tree.type, kind, owner_name, tuple(bpy.app.version),
+                    nodes, links, group_inputs, group_outputs)
+
+# node groups directly used by group nodes of the node tree, without duplicates, only by the nodes named in
+# 'node_names' if it is not None
+def get_used_node_groups(node_tree, node_names=None):
+    used_groups = []
+    used_keys = set()
+    for tree_node in node_tree.nodes:
+        if node_names != None and tree_node.name not in node_names:
+            continue
+        group = getattr(tree_node, "node_tree", None)
+        if group != None and group.as_pointer() not in used_keys:
+            used_keys.add(group.as_pointer())
+            used_groups.append(group)
+    return used_groups
+
+# get number of nodes in the node tree, and in the node groups used by its group nodes (recursively) if
+# 'with_dependencies' is True, i.e. the number of steps of capturing the tree (see iter_capture_tree)
+def get_capture_node_count(node_tree, with_dependencies):
+    node_count = len(node_tree.nodes)
+    if with_dependencies:
+        visited = set([node_tree.as_pointer()])
+        groups = get_used_node_groups(node_tree)
+        while len(groups) > 0:
+            group = groups.pop()
+            if group.as_pointer() in visited:
+                continue
+            visited.add(group.as_pointer())
+            node_count = node_count + len(group.nodes)
+            groups.extend(get_used_node_groups(group))
+    return node_count
+
+# capture the node groups used by group nodes of the node tree, following group nodes inside node groups recursively,
+# returns list of captured node groups in dependency order (i.e. a node group is listed after all node groups that it
+# uses), each node group is captured only once, and 'capture_memo' (keyed by datablock pointer) can be shared
+# between exports so node groups used by many trees are captured only once, 'stats' and 'elide_defaults' are passed
+# to capture_tree
+def capture_group_dependencies(node_tree, capture_memo=None, stats=None, elide_defaults=False):
+    return run_steps(iter_capture_group_dependencies(node_tree, capture_memo, stats, elide_defaults))
+
+# capture node groups used by the node tree in steps, yields after each node is captured and returns the list of
+# captured node groups (see export_steps.py), if 'node_names' is not None then only node groups used by the nodes named
+# in it are followed, e.g. the nodes of an export scope (see subgraph.py)
+def iter_capture_group_dependencies(node_tree, capture_memo=None, stats=None, elide_defaults=False, node_names=None):
+    if capture_memo == None:
+        capture_memo = {}
+    dependencies = []
+    # node groups currently being visited (to detect cycles), and node groups already visited
+    visiting = set([node_tree.as_pointer()])
+    visited = set()
+    def visit(group, path):
+        group_key = group.as_pointer()
+        if group_key in visited:
+            return
+        if group_key in visiting:
+            raise RuntimeError("Node group dependency cycle: " + " -> ".join(path + [group.name]))
+        visiting.add(group_key)
+        for used_group in get_used_node_groups(group):
+            yield from visit(used_group, path + [group.name])
+        visiting.remove(group_key)
+        visited.add(group_key)
+        captured_group = capture_memo.get(group_key)
+        if captured_group == None:
+            captured_group = yield from iter_capture_tree(group, group, stats, elide_defaults)
+            capture_memo[group_key] = captured_group
+        dependencies.append(captured_group)
+    for used_group in get_used_node_groups(node_tree, node_names):
+        yield from visit(used_group, [node_tree.name])
+    return dependencies
@@ -0,0 +1,105 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 3
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# Export scopes: export only a subgraph of a captured tree (see tree_ir.py), i.e. the selected nodes, optionally with
+# all nodes upstream (nodes that the selected nodes depend on, through links into their inputs) or downstream (nodes
+# that depend on the selected nodes) of them, e.g. to extract one reusable chain of nodes from a huge tree. The frames
+# that contain the exported nodes are always exported too. Links between exported nodes and other nodes are not
+# exported, and are reported instead. This module is pure Python, it must not import bpy.
+
+from .tree_ir import TreeData
+
+EXPORT_SCOPE_ALL = "ALL"
+EXPORT_SCOPE_SELECTED = "SELECTED"
+EXPORT_SCOPE_UPSTREAM = "UPSTREAM"
+EXPORT_SCOPE_DOWNSTREAM = "DOWNSTREAM"
+
+# get the link adjacency index of a captured tree, built once per export, returns (dict of names of the nodes linked
+# into the inputs of each node, dict of names of the nodes linked from the outputs of each node), keyed by node name
+def get_link_index(tree):
+    upstream = {}
+    downstream = {}
+    for link in tree.links:
+        upstream.setdefault(link.to_node, []).append(link.from_node)
+        downstream.setdefault(link.from_node, []).append(link.to_node)
+    return upstream, downstream
+
+# get names of the selected nodes of a captured tree, i.e. nodes with captured 'select' attribute set to True
+def get_selected_node_names(tree):
+    selected_names = set()
+    for node in tree.nodes:
+        for attr, value, _ in node.uni_attrs:
+            if attr == "select" and value == True:
+                selected_names.add(node.name)
+    return selected_names
+
+# add to 'names' the nodes that are reachable from 'names' by following the links of 'adjacency' (see get_link_index),
+# each node and link is visited once, so the time taken is linear in the size of the subgraph
+def add_linked_nodes(names, adjacency):
+    pending_names = list(names)
+    while len(pending_names) > 0:
+        for linked_name in adjacency.get(pending_names.pop(), ()):
+            if linked_name not in names:
+                names.add(linked_name)
+                pending_names.append(linked_name)
+
+# add to 'names' the frames that contain the nodes of 'names' (recursively, for nested frames)
+def add_parent_frames(names, tree):
+    parents = dict([(node.name, node.parent) for node in tree.nodes if node.parent != None])
+    for name in list(names):
+        parent_name = parents.get(name)
+        while parent_name != None and parent_name not in names:
+            names.add(parent_name)
+            parent_name = parents.get(parent_name)
+
+# get names of the nodes of a captured tree in the export scope, 'scope' is one of EXPORT_SCOPE_SELECTED,
+# EXPORT_SCOPE_UPSTREAM, EXPORT_SCOPE_DOWNSTREAM
+def get_scope_node_names(tree, scope):
+    names = get_selected_node_names(tree)
+    if scope == EXPORT_SCOPE_UPSTREAM or scope == EXPORT_SCOPE_DOWNSTREAM:
+        upstream, downstream = get_link_index(tree)
+        add_linked_nodes(names, upstream if scope == EXPORT_SCOPE_UPSTREAM else downstream)
+    add_parent_frames(names, tree)
+    return names
+
+def format_leaving_link(link):
+    return "%s.outputs[%d] -> %s.inputs[%d]" % (link.from_node, link.from_index, link.to_node, link.to_index)
+
+# get the subgraph of a captured tree in the export scope (see get_scope_node_names), nodes and links are in the order
+# of the tree, returns (captured tree of the subgraph, list of links between nodes of the subgraph and other nodes, as
+# text (see format_leaving_link)), or (tree, []) if 'scope' is EXPORT_SCOPE_ALL, raises RuntimeError if no nodes are
+# selected
+def get_subgraph_tree(tree, scope):
+    if scope == EXPORT_SCOPE_ALL:
+        return tree, []
+    names = get_scope_node_names(tree, scope)
+    if len(names) == 0:
+        raise RuntimeError("No nodes selected in node tree " + tree.name)
+    links = []
+    leaving_links = []
+    for link in tree.links:
+        is_from_in_scope = link.from_node in names
+        is_to_in_scope = link.to_node in names
+        if is_from_in_scope and is_to_in_scope:
+            links.append(link)
+        elif is_from_in_scope or is_to_in_scope:
+            leaving_links.append(format_leaving_link(link))
+    subgraph = TreeData(tree.name, tree.bl_idname, tree.tree_type, tree.kind, tree.owner_name, tree.blender_version,
+                        [node for node in tree.nodes if node.name in names], links, tree.group_inputs,
+                        tree.group_outputs)
+    return subgraph, leaving_links
@@ -0,0 +1,161 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 3
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# Structural diff of two captured node trees (see tree_ir.py), e.g. of a node tree and the node tree re-created by
+# the script exported from it (see verify.py). This module must not import bpy.
+
+from .codegen import (WRITE_LINKED_DEFAULTS_UNI_NODE_OPT, LOC_DEC_PLACES_UNI_NODE_OPT, WRITE_ATTR_NAME_UNI_NODE_OPT,
+    WRITE_ATTR_WIDTH_HEIGHT_UNI_NODE_OPT, WRITE_ATTR_SELECT_UNI_NODE_OPT)
+from .tree_ir import IRRecord
+
+# floats are written with 6 decimal places, and stored by Blender as 32 bit floats, so floats that differ by less than
+# this (relative to the larger value, or absolute for values less than 1) are equal
+DIFF_FLOAT_TOLERANCE = 0.00001
+
+# returns True if captured values are equal, floats are compared with tolerance (relative to the larger value, or
+# absolute for values less than 1), tuples/lists and IR records (e.g. Color Ramp data) are compared item by item
+def values_match(value, other_value, tolerance=DIFF_FLOAT_TOLERANCE):
+    if isinstance(value, float) and isinstance(other_value, (float, int)) and not isinstance(other_value, bool):
+        return abs(value - other_value) <= tolerance * max(1.0, abs(value), abs(other_value))
+    if isinstance(value, (tuple, list)) and isinstance(other_value, (tuple, list)):
+        if len(value) != len(other_value):
+            return False
+        for item, other_item in zip(value, other_value):
+            if not values_match(item, other_item, tolerance):
+                return False
+        return True
+    if isinstance(value, IRRecord):
+        if type(value) != type(other_value):
+            return False
+        for f in value.__slots__:
+            if not values_match(getattr(value, f), getattr(other_value, f), tolerance):
+                return False
+        return True
+    return type(value) == type(other_value) and value == other_value
+
+# get names of the attributes common to all nodes that are compared, i.e. that are written with the given options
+# (node names are compared only if written, because nodes are created with default names otherwise)
+def get_compared_uni_attrs(uni_node_options):
+    skipped = set()
+    if not uni_node_options[WRITE_ATTR_NAME_UNI_NODE_OPT]:
+        skipped.add("name")
+    if not uni_node_options[WRITE_ATTR_WIDTH_HEIGHT_UNI_NODE_OPT]:
+        skipped.update(["width", "height"])
+    if not uni_node_options[WRITE_ATTR_SELECT_UNI_NODE_OPT]:
+        skipped.add("select")
+    return skipped
+
+def add_mismatch(mismatches, path, expected, actual):
+    mismatches.append((path, expected, actual))
+
+# compare lists of values by key, keys found in only one list are mismatches too
+def diff_keyed_values(mismatches, path, expected_items, actual_items):
+    actual_by_key = dict(actual_items)
+    for key, expected_value in expected_items:
+        if key not in actual_by_key:
+            add_mismatch(mismatches, "%s[%r]" % (path, key), expected_value, None)
+            continue
+        actual_value = actual_by_key.pop(key)
+        if not values_match(expected_value, actual_value):
+            add_mismatch(mismatches, "%s[%r]" % (path, key), expected_value, actual_value)
+    for key, actual_value in actual_by_key.items():
+        add_mismatch(mismatches, "%s[%r]" % (path, key), None, actual_value)
+
+# get (socket index, default value) of the sockets whose default values are written with the given options
+def get_compared_socket_values(sockets, write_linked):
+    return [(socket.index, socket.default_value) for socket in sockets if socket.default_value != None and
+            not socket.hide_value and (write_linked or not socket.is_linked)]
+
+def diff_interface_sockets(mismatches, path, expected_sockets, actual_sockets, compare_values):
+    if len(expected_sockets) != len(actual_sockets):
+        add_mismatch(mismatches, path + ".count", len(expected_sockets), len(actual_sockets))
+    compared_attrs = ["name", "bl_socket_idname", "hide_value", "attribute_domain", "default_attribute_name"]
+    if compare_values:
+        compared_attrs.extend(["min_value", "max_value", "default_value"])
+    for index, (expected, actual) in enumerate(zip(expected_sockets, actual_sockets)):
+        for attr in compared_attrs:
+            if not values_match(getattr(expected, attr), getattr(actual, attr)):
+                add_mismatch(mismatches, "%s[%d].%s" % (path, index, attr), getattr(expected, attr),
+                             getattr(actual, attr))
+
+# get structural differences between captured trees 'expected' (e.g. the exported tree) and 'actual' (e.g. the tree
+# re-created by the exported script), comparing only data that is written with the given options (see
+# codegen.make_gen_options and uni_node_options), returns list of mismatches (path, expected value, actual value),
+# where a value is None if it is missing, e.g. nodes['Math'].props['operation'],
+# nodes are matched by order of creation (node names differ if names are not written), and node names in parents and
+# links are mapped to the names of the matched nodes
+def diff_trees(expected, actual, uni_node_options, ng_output_min_max_def=False):
+    mismatches = []
+    if len(expected.nodes) != len(actual.nodes):
+        add_mismatch(mismatches, "nodes.count", len(expected.nodes), len(actual.nodes))
+    node_name_map = {}
+    for expected_node, actual_node in zip(expected.nodes, actual.nodes):
+        node_name_map[expected_node.name] = actual_node.name
+    skipped_uni_attrs = get_compared_uni_attrs(uni_node_options)
+    write_linked = uni_node_options[WRITE_LINKED_DEFAULTS_UNI_NODE_OPT]
+    loc_places = uni_node_options[LOC_DEC_PLACES_UNI_NODE_OPT]
+    for expected_node, actual_node in zip(expected.nodes, actual.nodes):
+        path = "nodes[%r]" % expected_node.name
+        if expected_node.bl_idname != actual_node.bl_idname:
+            add_mismatch(mismatches, path + ".bl_idname", expected_node.bl_idname, actual_node.bl_idname)
+            # other attributes of nodes of different types cannot be compared
+            continue
+        # location is written rounded to the given number of decimal places
+        expected_location = (round(expected_node.location[0], loc_places),
+                             round(expected_node.location[1], loc_places))
+        if not values_match(expected_location, tuple(actual_node.location)):
+            add_mismatch(mismatches, path + ".location", expected_location, actual_node.location)
+        expected_parent = node_name_map.get(expected_node.parent, expected_node.parent)
+        if expected_parent != actual_node.parent:
+            add_mismatch(mismatches, path + ".parent", expected_parent, actual_node.parent)
+        diff_keyed_values(mismatches, path + ".uni_attrs",
+            [(attr, value) for attr, value, _ in expected_node.uni_attrs if attr not in skipped_uni_attrs],
+            [(attr, value) for attr, value, _ in actual_node.uni_attrs if attr not in skipped_uni_attrs])
+        diff_keyed_values(mismatches, path + ".props", [(attr, value) for attr, _, value in expected_node.props],
+                          [(attr, value) for attr, _, value in actual_node.props])
+        diff_keyed_values(mismatches, path + ".inputs", get_compared_socket_values(expected_node.inputs, write_linked),
+                          get_compared_socket_values(actual_node.inputs, write_linked))
+        diff_keyed_values(mismatches, path + ".outputs", get_compared_socket_values(expected_node.outputs, True),
+                          get_compared_socket_values(actual_node.outputs, True))
+
+    expected_links = sorted([(node_name_map.get(link.from_node, link.from_node), link.from_index,
+                              node_name_map.get(link.to_node, link.to_node), link.to_index)
+                             for link in expected.links])
+    actual_links = sorted([(link.from_node, link.from_index, link.to_node, link.to_index) for link in actual.links])
+    if expected_links != actual_links:
+        actual_link_set = set(actual_links)
+        expected_link_set = set(expected_links)
+        for link in expected_links:
+            if link not in actual_link_set:
+                add_mismatch(mismatches, "links", link, None)
+        for link in actual_links:
+            if link not in expected_link_set:
+                add_mismatch(mismatches, "links", None, link)
+
+    diff_interface_sockets(mismatches, "group_inputs", expected.group_inputs, actual.group_inputs, True)
+    diff_interface_sockets(mismatches, "group_outputs", expected.group_outputs, actual.group_outputs,
+                           ng_output_min_max_def)
+    return mismatches
+
+def format_mismatch(mismatch):
+    path, expected, actual = mismatch
+    if expected == None:
+        return "%s: unexpected %r" % (path, actual)
+    elif actual == None:
+        return "%s: missing %r" % (path, expected)
+    return "%s: expected %r, got %r" % (path, expected, actual)
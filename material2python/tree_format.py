@@ -0,0 +1,337 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 3
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# Serialized tree format: captured node trees (see tree_ir.py) as data instead of Python code, re-created in Blender
+# by a generic loader (see tree_loader.py) without compiling or running a script. Each tree is a record of the same
+# tables as compact style scripts (see codegen.iter_write_compact_nodes), with nodes referenced by index:
+#   "nodes": (type, location, (attribute name, value, ...), (input index, default value, ...),
+#             (output index, default value, ...)) per node
+#   "color_ramps": (node index, attribute name, color mode, interpolation, element positions, element colors)
+#   "curve_mappings": (node index, attribute name, use clip, clip min x/y, clip max x/y, extend,
+#                      curves ((point locations, point handle types), ...))
+#   "parents": (node index, parent node index)
+#   "links": (from node index, from output index, to node index, to input index), or with socket identifiers
+#            (from node index, from output index, from identifier, to node index, to input index, to identifier)
+#   "group_inputs", "group_outputs": (socket type, name, (attribute name, value, ...)) per group input/output
+# Sets are written as {"set": [...]}, and datablock references as {"id": [bpy.data collection name, name]}.
+# A tree file holds any number of trees, and starts with a header that indexes the trees by (bpy.data collection
+# name, datablock name), with the offset and length of each tree's record, so selected trees are read without decoding
+# the other trees. Formats:
+#   JSON: JSON Lines, i.e. the header on the first line, followed by one line of compact JSON per tree
+#   BINARY: magic bytes, header length (32 bit unsigned, little endian), header (JSON), followed by the trees as
+#           Python marshal data (faster to decode, but like Python scripts, only load files from trusted sources)
+# Snapshot files hold captured trees as is (all captured values, see tree_ir.py), e.g. baselines of patch export (see
+# tree_patch.py), as one JSON document.
+# This module must not import bpy.
+
+import json
+import marshal
+import mmap
+import os
+import struct
+
+from .code_sink import write_file_bytes
+from .codegen import (FLOAT_MAX, LOC_DEC_PLACES_UNI_NODE_OPT, get_written_uni_attr_values, is_input_value_written,
+    is_interface_default_written)
+from .node_schema import SCHEMA_KIND_COLOR_RAMP, SCHEMA_KIND_CURVE_MAPPING
+from .tree_ir import (IRRecord, IDRef, ColorRampData, CurveMapData, CurveMappingData, SocketData, NodeData, LinkData,
+    InterfaceSocketData, TreeData, TREE_KIND_COLLECTIONS)
+
+TREE_FORMAT_JSON = "JSON"
+TREE_FORMAT_BINARY = "BINARY"
+TREE_FORMAT_EXTENSIONS = {
+    TREE_FORMAT_JSON: ".m2p.jsonl",
+    TREE_FORMAT_BINARY: ".m2pb",
+}
+
+# name and version of the format, written in the header of tree files, files of a later version cannot be read
+TREE_FORMAT_NAME = "material2python"
+TREE_FORMAT_VERSION = 1
+
+BINARY_MAGIC = b"M2PB"
+BINARY_HEADER_LENGTH = struct.Struct("<I")
+# marshal format version, readable by all versions of Python 3 since Python 3.4
+MARSHAL_VERSION = 4
+
+# name and version of the snapshot file format
+SNAPSHOT_FORMAT_NAME = "material2python-snapshot"
+SNAPSHOT_FORMAT_VERSION = 1
+
+# IR record types of snapshots, by type name
+SNAPSHOT_RECORD_TYPES = { record_type.__name__: record_type for record_type in [IDRef, ColorRampData, CurveMapData,
+    CurveMappingData, SocketData, NodeData, LinkData, InterfaceSocketData, TreeData] }
+# keys of tagged values of snapshots, i.e. IR records and tuples (lists are plain JSON lists)
+RECORD_VALUE_KEY = "ir"
+TUPLE_VALUE_KEY = "tuple"
+
+# files of at least this size are memory-mapped instead of read into memory
+MMAP_MIN_FILE_SIZE = 1 << 20
+
+# keys of tagged values, i.e. values that are not plain JSON values
+SET_VALUE_KEY = "set"
+ID_VALUE_KEY = "id"
+
+# get value as plain data (str, bool, int, float, and lists), sets and datablock references are tagged dicts
+def encode_value(value):
+    if type(value) == set:
+        return { SET_VALUE_KEY: sorted(value) }
+    elif type(value) == IDRef:
+        return { ID_VALUE_KEY: [value.collection, value.name] }
+    elif type(value) == tuple:
+        return [encode_value(item) for item in value]
+    return value
+
+# get flat list of names (or indexes) and encoded values, from list of (name, value)
+def encode_value_pairs(pairs):
+    flat_values = []
+    for name, value in pairs:
+        flat_values.extend([name, encode_value(value)])
+    return flat_values
+
+# get list of (attribute name, value) of group input or output, that need to be set after the socket is created,
+# as written by codegen.write_group_interface
+def get_interface_socket_values(ng_socket, with_min_max_default):
+    values = []
+    if with_min_max_default:
+        if ng_socket.min_value != None and ng_socket.min_value != -FLOAT_MAX:
+            values.append(("min_value", ng_socket.min_value))
+        if ng_socket.max_value != None and ng_socket.max_value != FLOAT_MAX:
+            values.append(("max_value", ng_socket.max_value))
+        if is_interface_default_written(ng_socket):
+            values.append(("default_value", ng_socket.default_value))
+    if ng_socket.hide_value:
+        values.append(("hide_value", True))
+    return values
+
+def get_group_interface_rows(tree, ng_output_min_max_def):
+    input_rows = [[ng_input.bl_socket_idname, ng_input.name,
+                   encode_value_pairs(get_interface_socket_values(ng_input, True))]
+                  for ng_input in tree.group_inputs]
+    output_rows = []
+    for ng_output in tree.group_outputs:
+        values = get_interface_socket_values(ng_output, ng_output_min_max_def)
+        if ng_output.attribute_domain != None and ng_output.attribute_domain != "POINT":
+            values.append(("attribute_domain", ng_output.attribute_domain))
+        if ng_output.default_attribute_name != None and ng_output.default_attribute_name != "":
+            values.append(("default_attribute_name", ng_output.default_attribute_name))
+        output_rows.append([ng_output.bl_socket_idname, ng_output.name, encode_value_pairs(values)])
+    return input_rows, output_rows
+
+# get the record of a captured tree (see snapshot.capture_tree), with the values that are written to scripts with the
+# same options (see codegen.make_gen_options and uni_node_options), 'used_groups' is the list of names of node
+# groups used by group nodes of the tree, that the loader creates first (if they do not exist) from the same file
+def get_tree_record(tree, uni_node_options, ng_output_min_max_def=False, use_socket_identifiers=False,
+                    used_groups=()):
+    precision = uni_node_options[LOC_DEC_PLACES_UNI_NODE_OPT]
+    node_indexes = {}
+    for node_index, node in enumerate(tree.nodes):
+        node_indexes[node.name] = node_index
+    node_rows = []
+    color_ramp_rows = []
+    curve_mapping_rows = []
+    for node_index, node in enumerate(tree.nodes):
+        attrs = encode_value_pairs(get_written_uni_attr_values(node, uni_node_options))
+        for attr_name, attr_kind, value in node.props:
+            if attr_kind == SCHEMA_KIND_COLOR_RAMP:
+                color_ramp_rows.append([node_index, attr_name, value.color_mode, value.interpolation,
+                                        list(value.positions), list(value.colors)])
+            elif attr_kind == SCHEMA_KIND_CURVE_MAPPING:
+                curve_mapping_rows.append([node_index, attr_name, value.use_clip, value.clip_min_x,
+                    value.clip_min_y, value.clip_max_x, value.clip_max_y, value.extend,
+                    [[list(curve.locations), list(curve.handle_types)] for curve in value.curves]])
+            else:
+                attrs.extend([attr_name, encode_value(value)])
+        input_values = encode_value_pairs([(node_input.index, node_input.default_value) for node_input in node.inputs
+                                           if is_input_value_written(node_input, uni_node_options)])
+        output_values = encode_value_pairs([(node_output.index, node_output.default_value)
+                                            for node_output in node.outputs if node_output.default_value != None])
+        node_rows.append([node.bl_idname, [round(node.location[0], precision), round(node.location[1], precision)],
+                          attrs, input_values, output_values])
+    if use_socket_identifiers:
+        link_rows = [[node_indexes[link.from_node], link.from_index, link.from_identifier,
+                      node_indexes[link.to_node], link.to_index, link.to_identifier] for link in tree.links]
+    else:
+        link_rows = [[node_indexes[link.from_node], link.from_index, node_indexes[link.to_node], link.to_index]
+                     for link in tree.links]
+    group_input_rows, group_output_rows = get_group_interface_rows(tree, ng_output_min_max_def)
+    return {
+        "name": tree.name,
+        "bl_idname": tree.bl_idname,
+        "kind": tree.kind,
+        "owner_name": tree.owner_name,
+        "blender_version": list(tree.blender_version),
+        "used_groups": list(used_groups),
+        "nodes": node_rows,
+        "color_ramps": color_ramp_rows,
+        "curve_mappings": curve_mapping_rows,
+        "parents": [[node_index, node_indexes[node.parent]] for node_index, node in enumerate(tree.nodes)
+                    if node.parent != None],
+        "links": link_rows,
+        "group_inputs": group_input_rows,
+        "group_outputs": group_output_rows,
+    }
+
+# get the key of a tree record in tree files, i.e. (bpy.data collection name, datablock name)
+def get_record_key(record):
+    return (TREE_KIND_COLLECTIONS[record["kind"]], record["owner_name"])
+
+def encode_record(record, file_format):
+    if file_format == TREE_FORMAT_BINARY:
+        return marshal.dumps(record, MARSHAL_VERSION)
+    return (json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8")
+
+def decode_record(data, file_format):
+    if file_format == TREE_FORMAT_BINARY:
+        return marshal.loads(data)
+    return json.loads(data)
+
+# write tree records to a tree file of the given format (TREE_FORMAT_JSON or TREE_FORMAT_BINARY), 'blend_file' is
+# written in the header for reference, if 'atomic' is True then the file is written to a temporary file in the same
+# directory, which replaces the file at 'filepath' only when complete (see code_sink.write_file_bytes), returns the
+# file path
+def write_tree_file(filepath, records, file_format, blend_file="", atomic=False):
+    payloads = [encode_record(record, file_format) for record in records]
+    index = []
+    offset = 0
+    for record, payload in zip(records, payloads):
+        index.append(list(get_record_key(record)) + [offset, len(payload)])
+        offset = offset + len(payload)
+    header = json.dumps({ "format": TREE_FORMAT_NAME, "version": TREE_FORMAT_VERSION, "encoding": file_format,
+                          "blend_file": blend_file, "trees": index }, separators=(",", ":")).encode("utf-8")
+    if file_format == TREE_FORMAT_BINARY:
+        header = BINARY_MAGIC + BINARY_HEADER_LENGTH.pack(len(header)) + header
+    else:
+        header = header + b"\n"
+    return write_file_bytes(filepath, [header] + payloads, atomic)
+
+# reader of tree files, reads the header when opened, and decodes the record of a tree only when the tree is read,
+# large files are memory-mapped, so only the pages of the trees that are read are loaded from disk
+class TreeFileReader:
+    def __init__(self, filepath):
+        self.file = open(filepath, "rb")
+        self.data = None
+        try:
+            if os.fstat(self.file.fileno()).st_size >= MMAP_MIN_FILE_SIZE:
+                self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self.data = self.file.read()
+            self.read_header()
+        except BaseException:
+            self.close()
+            raise
+
+    def read_header(self):
+        if self.data[:len(BINARY_MAGIC)] == BINARY_MAGIC:
+            header_start = len(BINARY_MAGIC) + BINARY_HEADER_LENGTH.size
+            header_length = BINARY_HEADER_LENGTH.unpack_from(self.data, len(BINARY_MAGIC))[0]
+            self.payload_start = header_start + header_length
+            header = json.loads(self.data[header_start:self.payload_start])
+        else:
+            self.payload_start = self.data.find(b"\n") + 1
+            if self.payload_start == 0:
+                raise ValueError("Not a material2python tree file: " + self.file.name)
+            header = json.loads(self.data[:self.payload_start])
+        if header.get("format") != TREE_FORMAT_NAME or header.get("encoding") not in TREE_FORMAT_EXTENSIONS:
+            raise ValueError("Not a material2python tree file: " + self.file.name)
+        if header["version"] > TREE_FORMAT_VERSION:
+            raise ValueError(("Tree file %s is format version %d, this version of material2python reads only " +
+                              "versions up to %d") % (self.file.name, header["version"], TREE_FORMAT_VERSION))
+        self.file_format = header["encoding"]
+        self.blend_file = header.get("blend_file", "")
+        # (offset, length) of each tree's record, by (bpy.data collection name, datablock name), in file order
+        self.index = {}
+        for collection_name, name, offset, length in header["trees"]:
+            self.index[(collection_name, name)] = (offset, length)
+
+    # get keys (bpy.data collection name, datablock name) of the trees in the file, in file order
+    def get_keys(self):
+        return list(self.index.keys())
+
+    def has_tree(self, key):
+        return key in self.index
+
+    # get the record of the tree with the given key
+    def read_tree(self, key):
+        offset_length = self.index.get(key)
+        if offset_length == None:
+            raise KeyError("No node tree of bpy.data.%s[%r] in tree file %s" % (key[0], key[1], self.file.name))
+        start = self.payload_start + offset_length[0]
+        return decode_record(self.data[start:start+offset_length[1]], self.file_format)
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.data = None
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+# get captured value (e.g. a captured tree, see tree_ir.py) as plain JSON data, IR records are tagged dicts with the
+# record's type name and field values, tuples and sets are tagged dicts too, so they are not decoded as lists
+def get_snapshot_data(value):
+    if isinstance(value, IRRecord):
+        return { RECORD_VALUE_KEY: type(value).__name__,
+                 "fields": [get_snapshot_data(getattr(value, f)) for f in value.__slots__] }
+    elif type(value) == tuple:
+        return { TUPLE_VALUE_KEY: [get_snapshot_data(item) for item in value] }
+    elif type(value) == list:
+        return [get_snapshot_data(item) for item in value]
+    elif type(value) == set:
+        return { SET_VALUE_KEY: sorted(value) }
+    return value
+
+# get captured value from its snapshot data (see get_snapshot_data)
+def get_snapshot_value(data):
+    if type(data) == dict:
+        if RECORD_VALUE_KEY in data:
+            return SNAPSHOT_RECORD_TYPES[data[RECORD_VALUE_KEY]](*[get_snapshot_value(f) for f in data["fields"]])
+        elif TUPLE_VALUE_KEY in data:
+            return tuple([get_snapshot_value(item) for item in data[TUPLE_VALUE_KEY]])
+        return set(data[SET_VALUE_KEY])
+    elif type(data) == list:
+        return [get_snapshot_value(item) for item in data]
+    return data
+
+# get the key of a captured tree, as the key of its record in tree files
+def get_tree_key(tree):
+    return (TREE_KIND_COLLECTIONS[tree.kind], tree.owner_name)
+
+# write captured trees to a snapshot file, returns the file path
+def write_snapshot_file(filepath, trees, blend_file="", atomic=False):
+    data = { "format": SNAPSHOT_FORMAT_NAME, "version": SNAPSHOT_FORMAT_VERSION, "blend_file": blend_file,
+             "trees": [get_snapshot_data(tree) for tree in trees] }
+    return write_file_bytes(filepath, [json.dumps(data, separators=(",", ":")).encode("utf-8")], atomic)
+
+# read captured trees from a snapshot file, returns dict of trees by key (see get_tree_key)
+def read_snapshot_file(filepath):
+    with open(filepath, "rb") as f:
+        data = json.load(f)
+    if data.get("format") != SNAPSHOT_FORMAT_NAME:
+        raise ValueError("Not a material2python snapshot file: " + filepath)
+    if data["version"] > SNAPSHOT_FORMAT_VERSION:
+        raise ValueError(("Snapshot file %s is format version %d, this version of material2python reads only " +
+                          "versions up to %d") % (filepath, data["version"], SNAPSHOT_FORMAT_VERSION))
+    trees = {}
+    for tree_data in data["trees"]:
+        tree = get_snapshot_value(tree_data)
+        trees[get_tree_key(tree)] = tree
+    return trees
@@ -0,0 +1,179 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 3
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# Blender independent intermediate representation (IR) of a node tree. The capture phase (see snapshot.py) walks a
+# node tree once and fills these records with plain Python data (str, bool, int, float, tuple, list, set), so code
+# generation (see codegen.py) can run as pure Python, and the IR can be pickled to cache it or to send it to other
+# processes. This module must not import bpy.
+
+# kinds of node tree
+TREE_KIND_GROUP = "GROUP"
+TREE_KIND_COMPOSITOR = "COMPOSITOR"
+TREE_KIND_WORLD = "WORLD"
+TREE_KIND_LINESTYLE = "LINESTYLE"
+TREE_KIND_MATERIAL = "MATERIAL"
+# bpy.data collection of the datablock that owns the node tree, by kind of tree
+TREE_KIND_COLLECTIONS = {
+    TREE_KIND_GROUP: "node_groups",
+    TREE_KIND_COMPOSITOR: "scenes",
+    TREE_KIND_WORLD: "worlds",
+    TREE_KIND_LINESTYLE: "linestyles",
+    TREE_KIND_MATERIAL: "materials",
+}
+
+# base for IR records, gives a readable repr and field-by-field comparison
+class IRRecord:
+    __slots__ = ()
+
+    def __repr__(self):
+        return "%s(%s)" % (type(self).__name__, ", ".join("%s=%r" % (f, getattr(self, f)) for f in self.__slots__))
+
+    def __eq__(self, other):
+        if type(other) != type(self):
+            return False
+        for f in self.__slots__:
+            if getattr(self, f) != getattr(other, f):
+                return False
+        return True
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    __hash__ = None
+
+# reference to a datablock, by name, in a bpy.data collection, e.g. IDRef("images", "wood.png")
+class IDRef(IRRecord):
+    __slots__ = ("collection", "name")
+
+    def __init__(self, collection, name):
+        self.collection = collection
+        self.name = name
+
+    def __hash__(self):
+        return hash((self.collection, self.name))
+
+# Color Ramp data, positions is a flat list of element positions, colors is a flat list of RGBA values (4 per element)
+class ColorRampData(IRRecord):
+    __slots__ = ("color_mode", "interpolation", "positions", "colors")
+
+    def __init__(self, color_mode, interpolation, positions, colors):
+        self.color_mode = color_mode
+        self.interpolation = interpolation
+        self.positions = positions
+        self.colors = colors
+
+# one curve of a Curve Mapping, locations is a flat list of point locations (x, y per point), handle_types is a list
+# of point handle types
+class CurveMapData(IRRecord):
+    __slots__ = ("locations", "handle_types")
+
+    def __init__(self, locations, handle_types):
+        self.locations = locations
+        self.handle_types = handle_types
+
+# Curve Mapping data, e.g. of nodes Float Curve, RGB Curve, Time Curve
+class CurveMappingData(IRRecord):
+    __slots__ = ("use_clip", "clip_min_x", "clip_min_y", "clip_max_x", "clip_max_y", "extend", "curves")
+
+    def __init__(self, use_clip, clip_min_x, clip_min_y, clip_max_x, clip_max_y, extend, curves):
+        self.use_clip = use_clip
+        self.clip_min_x = clip_min_x
+        self.clip_min_y = clip_min_y
+        self.clip_max_x = clip_max_x
+        self.clip_max_y = clip_max_y
+        self.extend = extend
+        self.curves = curves
+
+# node input or output socket, default_value is None if the socket has no default value to write
+class SocketData(IRRecord):
+    __slots__ = ("index", "identifier", "name", "bl_idname", "hide_value", "is_linked", "default_value")
+
+    def __init__(self, index, identifier, name, bl_idname, hide_value, is_linked, default_value):
+        self.index = index
+        self.identifier = identifier
+        self.name = name
+        self.bl_idname = bl_idname
+        self.hide_value = hide_value
+        self.is_linked = is_linked
+        self.default_value = default_value
+
+# node data:
+#   location is the (x, y) location, offset by parent frame location
+#   parent is the name of the parent node, or None
+#   uni_attrs is a list of (attribute name, value, is default value) for attributes common to all nodes
+#   props is a list of (attribute name, schema kind, value) for node type specific attributes, see node_schema.py
+class NodeData(IRRecord):
+    __slots__ = ("name", "bl_idname", "location", "parent", "uni_attrs", "props", "inputs", "outputs")
+
+    def __init__(self, name, bl_idname, location, parent, uni_attrs, props, inputs, outputs):
+        self.name = name
+        self.bl_idname = bl_idname
+        self.location = location
+        self.parent = parent
+        self.uni_attrs = uni_attrs
+        self.props = props
+        self.inputs = inputs
+        self.outputs = outputs
+
+class LinkData(IRRecord):
+    __slots__ = ("from_node", "from_index", "from_identifier", "to_node", "to_index", "to_identifier")
+
+    def __init__(self, from_node, from_index, from_identifier, to_node, to_index, to_identifier):
+        self.from_node = from_node
+        self.from_index = from_index
+        self.from_identifier = from_identifier
+        self.to_node = to_node
+        self.to_index = to_index
+        self.to_identifier = to_identifier
+
+# node group input or output, attributes not available for the socket type are None
+class InterfaceSocketData(IRRecord):
+    __slots__ = ("name", "bl_socket_idname", "min_value", "max_value", "default_value", "hide_value",
+                 "attribute_domain", "default_attribute_name")
+
+    def __init__(self, name, bl_socket_idname, min_value, max_value, default_value, hide_value, attribute_domain,
+                 default_attribute_name):
+        self.name = name
+        self.bl_socket_idname = bl_socket_idname
+        self.min_value = min_value
+        self.max_value = max_value
+        self.default_value = default_value
+        self.hide_value = hide_value
+        self.attribute_domain = attribute_domain
+        self.default_attribute_name = default_attribute_name
+
+# node tree data:
+#   kind is one of the TREE_KIND_ values
+#   owner_name is the name of the datablock that owns the tree (e.g. Material), or the node group name
+#   group_inputs and group_outputs are lists of InterfaceSocketData, empty if tree is not a node group
+class TreeData(IRRecord):
+    __slots__ = ("name", "bl_idname", "tree_type", "kind", "owner_name", "blender_version", "nodes", "links",
+                 "group_inputs", "group_outputs")
+
+    def __init__(self, name, bl_idname, tree_type, kind, owner_name, blender_version, nodes, links, group_inputs,
+                 group_outputs):
+        self.name = name
+        self.bl_idname = bl_idname
+        self.tree_type = tree_type
+        self.kind = kind
+        self.owner_name = owner_name
+        self.blender_version = blender_version
+        self.nodes = nodes
+        self.links = links
+        self.group_inputs = group_inputs
+        self.group_outputs = group_outputs
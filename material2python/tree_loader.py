@@ -0,0 +1,182 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 3
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# Generic loader of tree files (see tree_format.py): re-creates node trees from their records with the same loops as
+# compact style scripts, without compiling or running generated code, e.g.
+#   from material2python.tree_loader import load_tree_file
+#   load_tree_file("library.m2pb", [("materials", "Wood")])
+# creates the material named "Wood", after creating the node groups it uses (if they do not already exist) from the
+# same file. Only the records of the loaded trees are decoded.
+
+import bpy
+
+from .tree_format import SET_VALUE_KEY, ID_VALUE_KEY, TreeFileReader
+from .tree_ir import TREE_KIND_GROUP, TREE_KIND_COMPOSITOR, TREE_KIND_COLLECTIONS
+
+# get the value to set in Blender from a value of a tree record, i.e. decode tagged sets and datablock references
+def get_record_value(value):
+    if type(value) == dict:
+        if SET_VALUE_KEY in value:
+            return set(value[SET_VALUE_KEY])
+        collection_name, name = value[ID_VALUE_KEY]
+        return getattr(bpy.data, collection_name).get(name)
+    return value
+
+def set_record_values(bpy_struct, flat_values):
+    for attr, value in zip(flat_values[0::2], flat_values[1::2]):
+        setattr(bpy_struct, attr, get_record_value(value))
+
+def set_socket_values(sockets, flat_values):
+    for index, value in zip(flat_values[0::2], flat_values[1::2]):
+        sockets[index].default_value = get_record_value(value)
+
+# get socket by identifier, or by index if no socket has the identifier (e.g. sockets of a different Blender version)
+def get_link_socket(sockets, identifier, index):
+    if index < len(sockets) and sockets[index].identifier == identifier:
+        return sockets[index]
+    for s in sockets:
+        if s.identifier == identifier:
+            return s
+    return sockets[index]
+
+# create the datablock of a tree record, i.e. node group, material, world, linestyle, or the node tree of a scene
+# (created if it does not exist), returns (datablock, node tree)
+def new_record_datablock(record, name):
+    if record["kind"] == TREE_KIND_GROUP:
+        node_group = bpy.data.node_groups.new(name=name, type=record["bl_idname"])
+        return node_group, node_group
+    elif record["kind"] == TREE_KIND_COMPOSITOR:
+        datablock = bpy.data.scenes.get(name)
+        if datablock == None:
+            datablock = bpy.data.scenes.new(name)
+    else:
+        datablock = getattr(bpy.data, TREE_KIND_COLLECTIONS[record["kind"]]).new(name)
+    datablock.use_nodes = True
+    return datablock, datablock.node_tree
+
+def add_group_interface(node_group, record):
+    node_group.inputs.clear()
+    node_group.outputs.clear()
+    for socket_type, name, values in record["group_inputs"]:
+        set_record_values(node_group.inputs.new(type=socket_type, name=name), values)
+    for socket_type, name, values in record["group_outputs"]:
+        set_record_values(node_group.outputs.new(type=socket_type, name=name), values)
+
+# add nodes and links of a tree record to the node tree, after deleting all nodes of the tree, returns list of new
+# nodes
+def add_record_nodes(node_tree, record):
+    tree_nodes = node_tree.nodes
+    tree_nodes.clear()
+    new_nodes = []
+    for bl_idname, location, attrs, input_values, output_values in record["nodes"]:
+        node = tree_nodes.new(type=bl_idname)
+        node.location = location
+        set_record_values(node, attrs)
+        set_socket_values(node.inputs, input_values)
+        set_socket_values(node.outputs, output_values)
+        new_nodes.append(node)
+
+    # add or remove elements (leaving the minimum of one element in list) to get the needed number of elements, then
+    # set all positions and colors in bulk
+    for node_index, attr, color_mode, interpolation, positions, colors in record["color_ramps"]:
+        ramp = getattr(new_nodes[node_index], attr)
+        ramp.color_mode = color_mode
+        ramp.interpolation = interpolation
+        elements = ramp.elements
+        while len(elements) > len(positions):
+            elements.remove(elements[-1])
+        for _ in range(len(positions) - len(elements)):
+            elements.new(1.0)
+        elements.foreach_set("position", positions)
+        elements.foreach_set("color", colors)
+
+    # add or remove points (2 points minimum) to get the needed number of points, then set all locations in bulk
+    for node_index, attr, use_clip, min_x, min_y, max_x, max_y, extend, curves in record["curve_mappings"]:
+        mapping = getattr(new_nodes[node_index], attr)
+        mapping.use_clip = use_clip
+        mapping.clip_min_x = min_x
+        mapping.clip_min_y = min_y
+        mapping.clip_max_x = max_x
+        mapping.clip_max_y = max_y
+        mapping.extend = extend
+        for curve_index, (locations, handle_types) in enumerate(curves):
+            curve_points = mapping.curves[curve_index].points
+            while len(curve_points) > len(handle_types):
+                curve_points.remove(curve_points[-1])
+            for _ in range(len(handle_types) - len(curve_points)):
+                curve_points.new(1.0, 1.0)
+            curve_points.foreach_set("location", locations)
+            for point, handle_type in zip(curve_points, handle_types):
+                point.handle_type = handle_type
+        mapping.reset_view()
+        mapping.update()
+
+    # parents are set after all nodes are created, so parent nodes exist
+    for node_index, parent_index in record["parents"]:
+        new_nodes[node_index].parent = new_nodes[parent_index]
+
+    tree_links = node_tree.links
+    for link in record["links"]:
+        if len(link) == 6:
+            from_index, from_socket_index, from_identifier, to_index, to_socket_index, to_identifier = link
+            tree_links.new(get_link_socket(new_nodes[from_index].outputs, from_identifier, from_socket_index),
+                           get_link_socket(new_nodes[to_index].inputs, to_identifier, to_socket_index))
+        else:
+            from_index, from_socket_index, to_index, to_socket_index = link
+            tree_links.new(new_nodes[from_index].outputs[from_socket_index],
+                           new_nodes[to_index].inputs[to_socket_index])
+
+    for node in new_nodes:
+        node.select = False
+    return new_nodes
+
+# create a node tree from its record (see tree_format.get_tree_record), with the given datablock name, or the name of
+# the tree's datablock if 'name' is None, node groups used by group nodes must already exist, returns the new
+# datablock (node group, material, world, linestyle, or scene)
+def load_tree_record(record, name=None):
+    datablock, node_tree = new_record_datablock(record, record["owner_name"] if name == None else name)
+    if record["kind"] == TREE_KIND_GROUP:
+        add_group_interface(node_tree, record)
+    add_record_nodes(node_tree, record)
+    return datablock
+
+# load tree with the given key from the open tree file, after loading the node groups it uses (that do not already
+# exist, and are in the file), 'loaded' is a dict of datablocks already loaded from the file, by key, the loaded
+# datablocks are added to it
+def load_tree_with_groups(reader, key, loaded):
+    record = reader.read_tree(key)
+    for group_name in record["used_groups"]:
+        group_key = (TREE_KIND_COLLECTIONS[TREE_KIND_GROUP], group_name)
+        if group_key not in loaded and reader.has_tree(group_key) and \
+                bpy.data.node_groups.get(group_name) == None:
+            load_tree_with_groups(reader, group_key, loaded)
+    loaded[key] = load_tree_record(record)
+
+# create node trees from a tree file, 'keys' is a list of (bpy.data collection name, datablock name) of the trees to
+# load, e.g. [("materials", "Wood"), ("node_groups", "Bark")], or None to load all trees of the file, returns list of
+# the new datablocks, in order of 'keys' (or file order)
+def load_tree_file(filepath, keys=None):
+    loaded = {}
+    with TreeFileReader(filepath) as reader:
+        if keys == None:
+            keys = reader.get_keys()
+        for key in keys:
+            key = tuple(key)
+            if key not in loaded:
+                load_tree_with_groups(reader, key, loaded)
+    return [loaded[tuple(key)] for key in keys]
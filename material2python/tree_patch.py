@@ -0,0 +1,453 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 3
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# Patch export: compare a captured node tree with a baseline snapshot of the same tree (captured earlier, e.g. before a
+# look-dev change, see tree_format.write_snapshot_file), and write a script that changes a node tree equal to the
+# baseline into the current tree, by removing, adding, and modifying only the nodes, node attributes, socket default
+# values, and links that changed, instead of deleting and re-creating all nodes. Nodes are matched by name, so nodes
+# that did not change (and anything that refers to them) are left as they are. Both trees must be captured with all
+# values (elide_defaults is False), so values that changed back to their defaults are patched too. This module is pure
+# Python, it must not import bpy.
+
+import time
+
+from .codegen import (LINE_PREFIX_GEN_OPT, NG_OUTPUT_MIN_MAX_DEF_GEN_OPT, SOCKET_IDENTIFIERS_GEN_OPT, STATS_GEN_OPT,
+    CALL_FUNCTION_GEN_OPT, WRITE_ATTR_NAME_UNI_NODE_OPT, esc_char_string, format_value, format_code_string,
+    format_float_tuple, format_location, get_link_socket_str, is_input_value_written, write_link_socket_function,
+    write_group_interface, write_node)
+from .export_steps import run_steps
+from .export_stats import (PHASE_GROUP_INTERFACE, PHASE_PARENTING, PHASE_LINKS, add_phase_time_since,
+    add_node_type_time, get_patch_summary)
+from .node_schema import SCHEMA_KIND_COLOR_RAMP, SCHEMA_KIND_CURVE_MAPPING
+from .tree_diff import values_match, get_compared_uni_attrs
+from .tree_ir import (TREE_KIND_GROUP, TREE_KIND_COMPOSITOR, TREE_KIND_WORLD, TREE_KIND_LINESTYLE,
+    TREE_KIND_COLLECTIONS)
+
+# values of the baseline and the current tree are captured from the same 32 bit floats, so unchanged values are equal
+PATCH_FLOAT_TOLERANCE = 0.0
+
+# types of nodes with sockets given by the group interface
+GROUP_INTERFACE_NODE_TYPES = ("NodeGroupInput", "NodeGroupOutput")
+
+# attributes of group interface sockets that are patched (if captured), min/max/default values of outputs are patched
+# only if 'ng_output_min_max_def' is True
+INTERFACE_INPUT_ATTRS = ["name", "min_value", "max_value", "default_value", "hide_value"]
+INTERFACE_OUTPUT_ATTRS = ["name", "hide_value", "attribute_domain", "default_attribute_name"]
+INTERFACE_OUTPUT_VALUE_ATTRS = ["min_value", "max_value", "default_value"]
+
+def is_value_changed(baseline_value, value):
+    return not values_match(baseline_value, value, PATCH_FLOAT_TOLERANCE)
+
+# get list of (socket index, default value) of sockets with changed default values
+def get_socket_changes(baseline_sockets, sockets):
+    changes = []
+    for socket in sockets:
+        if socket.default_value == None:
+            continue
+        if socket.index >= len(baseline_sockets) or \
+                is_value_changed(baseline_sockets[socket.index].default_value, socket.default_value):
+            changes.append((socket.index, socket.default_value))
+    return changes
+
+# get lists of (socket index, default value) of the input and output sockets of a node with written default values,
+# as written for a new node (see codegen.write_node), returns (inputs list, outputs list)
+def get_written_socket_values(node, uni_node_options):
+    return ([(s.index, s.default_value) for s in node.inputs if is_input_value_written(s, uni_node_options)],
+            [(s.index, s.default_value) for s in node.outputs if s.default_value != None])
+
+# get changes of node attributes and socket values (not location and parent), returns dict with lists of changes:
+#   "uni_attrs": (attribute name, value) of attributes common to all nodes
+#   "props": (attribute name, schema kind, value) of node type specific attributes, value is None if the attribute
+#            was cleared (e.g. an 'object' attribute set to no object)
+#   "inputs" and "outputs": (socket index, default value)
+def get_node_changes(baseline_node, node, skipped_uni_attrs):
+    baseline_uni_attrs = dict([(attr, value) for attr, value, _ in baseline_node.uni_attrs])
+    uni_attrs = [(attr, value) for attr, value, _ in node.uni_attrs if attr not in skipped_uni_attrs and
+                 (attr not in baseline_uni_attrs or is_value_changed(baseline_uni_attrs[attr], value))]
+    baseline_props = dict([(attr, (kind, value)) for attr, kind, value in baseline_node.props])
+    props = []
+    for attr, kind, value in node.props:
+        baseline_kind, baseline_value = baseline_props.pop(attr, (None, None))
+        if baseline_kind == None or is_value_changed(baseline_value, value):
+            props.append((attr, kind, value))
+    # attributes not captured in the current tree have value None
+    for attr, (kind, _) in baseline_props.items():
+        props.append((attr, kind, None))
+    return { "uni_attrs": uni_attrs, "props": props,
+             "inputs": get_socket_changes(baseline_node.inputs, node.inputs),
+             "outputs": get_socket_changes(baseline_node.outputs, node.outputs) }
+
+def is_node_changed(changes):
+    for change_list in changes.values():
+        if len(change_list) > 0:
+            return True
+    return False
+
+# get list of (interface socket list name, socket index, attribute name, value) of changed attributes of group
+# interface sockets, of interfaces with the same socket types
+def get_interface_changes(list_name, baseline_sockets, sockets, attrs):
+    changes = []
+    for index, (baseline_socket, socket) in enumerate(zip(baseline_sockets, sockets)):
+        for attr in attrs:
+            value = getattr(socket, attr)
+            if value != None and is_value_changed(getattr(baseline_socket, attr), value):
+                changes.append((list_name, index, attr, value))
+    return changes
+
+def get_link_key(link):
+    return (link.from_node, link.from_index, link.from_identifier, link.to_node, link.to_index, link.to_identifier)
+
+# get names of nodes that must be moved, i.e. nodes that changed location or parent, and the nodes inside moved frames
+# (nodes keep their location relative to their parent frame, so they are detached and moved with the frame)
+def get_moved_node_names(baseline_nodes, tree, replaced_names):
+    moved_names = set()
+    children = {}
+    for node in tree.nodes:
+        if node.parent != None:
+            children.setdefault(node.parent, []).append(node.name)
+        baseline_node = baseline_nodes.get(node.name)
+        if baseline_node == None or node.name in replaced_names:
+            continue
+        if baseline_node.parent != node.parent or is_value_changed(baseline_node.location, node.location):
+            moved_names.add(node.name)
+    pending_names = list(moved_names)
+    while len(pending_names) > 0:
+        for child_name in children.get(pending_names.pop(), ()):
+            if child_name not in moved_names and child_name not in replaced_names and child_name in baseline_nodes:
+                moved_names.add(child_name)
+                pending_names.append(child_name)
+    return moved_names
+
+# get the changes from captured tree 'baseline' to captured tree 'tree' (see snapshot.capture_tree), comparing only
+# data that is written with the given options, returns dict of the patch:
+#   "removed_nodes", "added_nodes": lists of captured nodes, nodes that changed type are removed and added again
+#   "changed_nodes": list of (captured node, node changes (see get_node_changes))
+#   "moved_nodes": list of captured nodes that must be moved (see get_moved_node_names)
+#   "removed_links", "added_links": lists of captured links
+#   "interface_rebuilt": True if group interface sockets were added, removed, reordered, or changed type
+#   "interface_changes": list of changed attributes of group interface sockets (see get_interface_changes)
+def get_tree_patch(baseline, tree, uni_node_options, ng_output_min_max_def=False):
+    baseline_nodes = dict([(node.name, node) for node in baseline.nodes])
+    nodes = dict([(node.name, node) for node in tree.nodes])
+    removed_nodes = [node for node in baseline.nodes
+                     if node.name not in nodes or nodes[node.name].bl_idname != node.bl_idname]
+    removed_names = set([node.name for node in removed_nodes])
+    # names of nodes of the baseline that are removed, and added again with a different type
+    replaced_names = removed_names.intersection(nodes)
+    added_nodes = [node for node in tree.nodes if node.name not in baseline_nodes or node.name in replaced_names]
+
+    # nodes are matched by name, so names do not change
+    skipped_uni_attrs = get_compared_uni_attrs(uni_node_options)
+    skipped_uni_attrs.add("name")
+    interface_rebuilt = tree.kind == TREE_KIND_GROUP and \
+        ([s.bl_socket_idname for s in baseline.group_inputs] != [s.bl_socket_idname for s in tree.group_inputs] or
+         [s.bl_socket_idname for s in baseline.group_outputs] != [s.bl_socket_idname for s in tree.group_outputs])
+    changed_nodes = []
+    # names of nodes whose links are all removed and added again, because their sockets changed
+    relinked_names = set()
+    for node in tree.nodes:
+        baseline_node = baseline_nodes.get(node.name)
+        if baseline_node == None or node.name in replaced_names:
+            continue
+        changes = get_node_changes(baseline_node, node, skipped_uni_attrs)
+        # sockets of a group node are given by its node group, and clearing the group interface removes the links of
+        # group input and output nodes, the sockets of these nodes get the defaults of the new node group or
+        # interface, so all their socket values are written, as for a new node
+        if "node_tree" in [attr for attr, _, _ in changes["props"]] or \
+                (interface_rebuilt and node.bl_idname in GROUP_INTERFACE_NODE_TYPES):
+            relinked_names.add(node.name)
+            changes["inputs"], changes["outputs"] = get_written_socket_values(node, uni_node_options)
+        if is_node_changed(changes):
+            changed_nodes.append((node, changes))
+
+    interface_changes = []
+    if tree.kind == TREE_KIND_GROUP:
+        if not interface_rebuilt:
+            output_attrs = INTERFACE_OUTPUT_ATTRS + (INTERFACE_OUTPUT_VALUE_ATTRS if ng_output_min_max_def else [])
+            interface_changes = get_interface_changes("inputs", baseline.group_inputs, tree.group_inputs,
+                                                      INTERFACE_INPUT_ATTRS) + \
+                get_interface_changes("outputs", baseline.group_outputs, tree.group_outputs, output_attrs)
+
+    link_keys = set([get_link_key(link) for link in tree.links])
+    baseline_link_keys = set([get_link_key(link) for link in baseline.links])
+    # links of removed nodes are removed with the nodes
+    removed_links = [link for link in baseline.links
+                     if link.from_node not in removed_names and link.to_node not in removed_names and
+                     (get_link_key(link) not in link_keys or link.from_node in relinked_names or
+                      link.to_node in relinked_names)]
+    added_links = [link for link in tree.links
+                   if get_link_key(link) not in baseline_link_keys or link.from_node in removed_names or
+                   link.to_node in removed_names or link.from_node in relinked_names or
+                   link.to_node in relinked_names]
+
+    moved_names = get_moved_node_names(baseline_nodes, tree, replaced_names)
+    return { "removed_nodes": removed_nodes, "added_nodes": added_nodes, "changed_nodes": changed_nodes,
+             "moved_nodes": [node for node in tree.nodes if node.name in moved_names],
+             "removed_links": removed_links, "added_links": added_links,
+             "interface_rebuilt": interface_rebuilt, "interface_changes": interface_changes }
+
+# get counts of changes of a patch (see get_tree_patch), e.g. for export stats (see export_stats.get_patch_summary)
+def get_patch_counts(patch):
+    return { "nodes_added": len(patch["added_nodes"]), "nodes_removed": len(patch["removed_nodes"]),
+             "nodes_changed": len(patch["changed_nodes"]), "nodes_moved": len(patch["moved_nodes"]),
+             "links_added": len(patch["added_links"]), "links_removed": len(patch["removed_links"]),
+             "interface_rebuilt": patch["interface_rebuilt"],
+             "interface_changes": len(patch["interface_changes"]) }
+
+# write code that sets a Color Ramp of 'node' to the captured ramp, adding or removing elements (leaving the minimum of
+# one element) to get the needed number of elements, then setting all positions and colors in bulk (the node's ramp
+# might have any number of elements)
+def write_color_ramp_patch(m2p_text, line_prefix, attr_name, ramp):
+    num_elements = len(ramp.positions)
+    m2p_text.write(line_prefix + "ramp = node." + attr_name + "\n" +
+                   line_prefix + "ramp.color_mode = \"%s\"\n" % ramp.color_mode +
+                   line_prefix + "ramp.interpolation = \"%s\"\n" % ramp.interpolation +
+                   line_prefix + "elements = ramp.elements\n" +
+                   line_prefix + "while len(elements) > %d:\n" % max(1, num_elements) +
+                   line_prefix + "    elements.remove(elements[-1])\n" +
+                   line_prefix + "for _ in range(%d - len(elements)):\n" % num_elements +
+                   line_prefix + "    elements.new(1.0)\n" +
+                   line_prefix + "elements.foreach_set(\"position\", " + format_float_tuple(ramp.positions) + ")\n" +
+                   line_prefix + "elements.foreach_set(\"color\", " + format_float_tuple(ramp.colors) + ")\n")
+
+# write code that sets a Curve Mapping of 'node' to the captured mapping, adding or removing points (2 points minimum)
+# of each curve to get the needed number of points, then setting all locations in bulk
+def write_curve_mapping_patch(m2p_text, line_prefix, attr_name, mapping):
+    m2p_text.write(line_prefix + "mapping = node." + attr_name + "\n" +
+                   line_prefix + "mapping.use_clip = %s\n" % mapping.use_clip +
+                   line_prefix + "mapping.clip_min_x = %f\n" % mapping.clip_min_x +
+                   line_prefix + "mapping.clip_min_y = %f\n" % mapping.clip_min_y +
+                   line_prefix + "mapping.clip_max_x = %f\n" % mapping.clip_max_x +
+                   line_prefix + "mapping.clip_max_y = %f\n" % mapping.clip_max_y +
+                   line_prefix + "mapping.extend = \"%s\"\n" % mapping.extend)
+    for curve_index, curve in enumerate(mapping.curves):
+        num_points = len(curve.handle_types)
+        m2p_text.write(line_prefix + "points = mapping.curves[%d].points\n" % curve_index +
+                       line_prefix + "while len(points) > %d:\n" % max(2, num_points) +
+                       line_prefix + "    points.remove(points[-1])\n" +
+                       line_prefix + "for _ in range(%d - len(points)):\n" % num_points +
+                       line_prefix + "    points.new(1.0, 1.0)\n" +
+                       line_prefix + "points.foreach_set(\"location\", " + format_float_tuple(curve.locations) +
+                       ")\n" +
+                       line_prefix + "for point, handle_type in zip(points, (" +
+                       "".join(["\"%s\", " % handle_type for handle_type in curve.handle_types]) + ")):\n" +
+                       line_prefix + "    point.handle_type = handle_type\n")
+    m2p_text.write(line_prefix + "mapping.reset_view()\n" +
+                   line_prefix + "mapping.update()\n")
+
+# write code that changes the attributes and socket values of a node of the baseline (see get_node_changes)
+def write_node_changes(m2p_text, line_prefix, node, changes):
+    m2p_text.write(line_prefix + "node = new_nodes[" + format_code_string(node.name) + "]\n")
+    for attr, value in changes["uni_attrs"]:
+        value_str = format_value(value)
+        if value_str != None:
+            m2p_text.write(line_prefix + "node." + attr + " = " + value_str + "\n")
+    for attr, kind, value in changes["props"]:
+        if kind == SCHEMA_KIND_COLOR_RAMP:
+            write_color_ramp_patch(m2p_text, line_prefix, attr, value)
+        elif kind == SCHEMA_KIND_CURVE_MAPPING:
+            write_curve_mapping_patch(m2p_text, line_prefix, attr, value)
+        else:
+            value_str = "None" if value == None else format_value(value)
+            if value_str != None:
+                m2p_text.write(line_prefix + "node." + attr + " = " + value_str + "\n")
+    for io_attr in ("inputs", "outputs"):
+        for index, value in changes[io_attr]:
+            value_str = format_value(value)
+            if value_str != None:
+                m2p_text.write(line_prefix + "node." + io_attr + "[%d].default_value = " % index + value_str + "\n")
+    m2p_text.write("\n")
+
+def write_group_interface_patch(m2p_text, line_prefix, tree, patch, ng_output_min_max_def):
+    if patch["interface_rebuilt"]:
+        m2p_text.write(line_prefix + "# remove old group inputs and outputs\n" +
+                       line_prefix + "new_node_group.inputs.clear()\n" +
+                       line_prefix + "new_node_group.outputs.clear()\n")
+        write_group_interface(m2p_text, line_prefix, tree, ng_output_min_max_def)
+        m2p_text.write("\n")
+    elif len(patch["interface_changes"]) > 0:
+        m2p_text.write(line_prefix + "# change group inputs and outputs\n")
+        for list_name, index, attr, value in patch["interface_changes"]:
+            m2p_text.write(line_prefix + "new_node_group.%s[%d].%s = " % (list_name, index, attr) +
+                           format_value(value) + "\n")
+        m2p_text.write("\n")
+
+def get_patch_link_args(link, use_socket_identifiers):
+    return get_link_socket_str(link.from_node, "outputs", link.from_index, link.from_identifier,
+                               use_socket_identifiers) + ", " + \
+        get_link_socket_str(link.to_node, "inputs", link.to_index, link.to_identifier, use_socket_identifiers)
+
+# write code that changes a node tree equal to the captured tree 'baseline' into the captured tree 'tree', i.e. a
+# function that patches the node tree of the datablock given as argument, followed by the code that calls the function
+# to patch the datablock of 'tree' (if gen_options[CALL_FUNCTION_GEN_OPT] is True), 'gen_options' is a dict from
+# codegen.make_gen_options (code is always written as a function, and nodes are never deleted before patching), both
+# trees must be captured with all values (see snapshot.capture_tree with elide_defaults False), returns counts of
+# changes (see get_patch_counts)
+def write_patch_code(m2p_text, baseline, tree, gen_options, uni_node_options):
+    return run_steps(iter_write_patch_code(m2p_text, baseline, tree, gen_options, uni_node_options))
+
+# write patch code in steps, yields after the code of each added or changed node is generated (see export_steps.py),
+# and returns counts of changes
+def iter_write_patch_code(m2p_text, baseline, tree, gen_options, uni_node_options):
+    # function body must be indented
+    line_prefix = gen_options[LINE_PREFIX_GEN_OPT]
+    if line_prefix == "":
+        line_prefix = "    "
+    stats = gen_options[STATS_GEN_OPT]
+    use_socket_identifiers = gen_options[SOCKET_IDENTIFIERS_GEN_OPT]
+    ng_output_min_max_def = gen_options[NG_OUTPUT_MIN_MAX_DEF_GEN_OPT]
+    is_tree_node_group = (tree.kind == TREE_KIND_GROUP)
+    patch = get_tree_patch(baseline, tree, uni_node_options, ng_output_min_max_def)
+    counts = get_patch_counts(patch)
+
+    # names are escaped, line breaks in names would end the comment
+    if is_tree_node_group:
+        tree_desc = "node group named " + esc_char_string(tree.name)
+    elif tree.kind == TREE_KIND_COMPOSITOR:
+        tree_desc = "Compositor node tree"
+    elif tree.kind == TREE_KIND_WORLD:
+        tree_desc = "World Material named " + esc_char_string(tree.owner_name)
+    elif tree.kind == TREE_KIND_LINESTYLE:
+        tree_desc = "Linestyle Material named " + esc_char_string(tree.owner_name)
+    else:
+        tree_desc = "Object Material named " + esc_char_string(tree.owner_name)
+    m2p_text.write("# Python script from Blender version " + str(tree.blender_version) + " to patch " + tree_desc +
+                   ", from its\n# baseline snapshot to its current state, changing only the nodes and links that " +
+                   "changed:\n# " + get_patch_summary(counts) + "\n\n" +
+                   "import bpy\n\n")
+    if is_tree_node_group:
+        m2p_text.write("# change nodes and links of node group\n" +
+                       "def patch_group_nodes(new_node_group):\n")
+        tree_var = "new_node_group"
+    else:
+        m2p_text.write("# change nodes and links of material\n" +
+                       "def patch_shader_nodes(material):\n")
+        tree_var = "material.node_tree"
+    m2p_text.write(line_prefix + "# initialize variables, nodes are found by name\n" +
+                   line_prefix + "tree_nodes = " + tree_var + ".nodes\n" +
+                   line_prefix + "tree_links = " + tree_var + ".links\n" +
+                   line_prefix + "new_nodes = {n.name: n for n in tree_nodes}\n")
+    if use_socket_identifiers and len(patch["removed_links"]) + len(patch["added_links"]) > 0:
+        write_link_socket_function(m2p_text, line_prefix)
+    m2p_text.write("\n")
+
+    if stats != None:
+        start_time = time.perf_counter()
+    if len(patch["removed_links"]) > 0:
+        m2p_text.write(line_prefix + "# remove links\n" +
+                       line_prefix + "def remove_link(from_socket, to_socket):\n" +
+                       line_prefix + "    for link in to_socket.links:\n" +
+                       line_prefix + "        if link.from_socket == from_socket:\n" +
+                       line_prefix + "            tree_links.remove(link)\n" +
+                       line_prefix + "            return\n")
+        for link in patch["removed_links"]:
+            m2p_text.write(line_prefix + "remove_link(" + get_patch_link_args(link, use_socket_identifiers) + ")\n")
+        m2p_text.write("\n")
+    if stats != None:
+        add_phase_time_since(stats, PHASE_LINKS, start_time)
+
+    # links of removed nodes are removed by Blender, and nodes inside removed frames are detached from the frames
+    if len(patch["removed_nodes"]) > 0:
+        m2p_text.write(line_prefix + "# remove nodes\n")
+        for node in patch["removed_nodes"]:
+            m2p_text.write(line_prefix + "tree_nodes.remove(new_nodes.pop(" + format_code_string(node.name) + "))\n")
+        m2p_text.write("\n")
+
+    if is_tree_node_group:
+        if stats != None:
+            start_time = time.perf_counter()
+        write_group_interface_patch(m2p_text, line_prefix, tree, patch, ng_output_min_max_def)
+        if stats != None:
+            add_phase_time_since(stats, PHASE_GROUP_INTERFACE, start_time)
+
+    if len(patch["added_nodes"]) > 0:
+        m2p_text.write(line_prefix + "# create nodes\n")
+        # names of new nodes are always written, so later patches find the nodes by name
+        added_uni_node_options = dict(uni_node_options)
+        added_uni_node_options[WRITE_ATTR_NAME_UNI_NODE_OPT] = True
+        for node in patch["added_nodes"]:
+            if stats != None:
+                node_start_time = time.perf_counter()
+            write_node(m2p_text, line_prefix, node, added_uni_node_options, stats)
+            if stats != None:
+                add_node_type_time(stats, node.bl_idname, time.perf_counter() - node_start_time)
+            yield
+
+    if len(patch["changed_nodes"]) > 0:
+        m2p_text.write(line_prefix + "# change nodes\n")
+        for node, changes in patch["changed_nodes"]:
+            if stats != None:
+                node_start_time = time.perf_counter()
+            write_node_changes(m2p_text, line_prefix, node, changes)
+            if stats != None:
+                add_node_type_time(stats, node.bl_idname, time.perf_counter() - node_start_time)
+            yield
+
+    if stats != None:
+        start_time = time.perf_counter()
+    moved_nodes = patch["moved_nodes"]
+    if len(moved_nodes) > 0:
+        # nodes are detached from their frames, so locations are set in the view space, as locations of new nodes
+        m2p_text.write(line_prefix + "# move nodes, after detaching them from their parent frames\n")
+        for node in moved_nodes:
+            m2p_text.write(line_prefix + "new_nodes[" + format_code_string(node.name) + "].parent = None\n")
+        for node in moved_nodes:
+            m2p_text.write(line_prefix + "new_nodes[" + format_code_string(node.name) + "].location = " +
+                           format_location(node.location, uni_node_options) + "\n")
+        m2p_text.write("\n")
+    # set parenting of new and moved nodes after all nodes are created
+    frame_parenting_lines = [line_prefix + "new_nodes[" + format_code_string(node.name) + "].parent = new_nodes[" +
+                             format_code_string(node.parent) + "]\n"
+                             for node in patch["added_nodes"] + moved_nodes if node.parent != None]
+    if len(frame_parenting_lines) > 0:
+        m2p_text.write(line_prefix + "# parenting of nodes\n" + "".join(frame_parenting_lines) + "\n")
+    if stats != None:
+        add_phase_time_since(stats, PHASE_PARENTING, start_time)
+        start_time = time.perf_counter()
+
+    if len(patch["added_links"]) > 0:
+        m2p_text.write(line_prefix + "# create links\n")
+        for link in patch["added_links"]:
+            m2p_text.write(line_prefix + "tree_links.new(" + get_patch_link_args(link, use_socket_identifiers) +
+                           ")\n")
+        m2p_text.write("\n")
+    if stats != None:
+        add_phase_time_since(stats, PHASE_LINKS, start_time)
+
+    if len(patch["added_nodes"]) > 0:
+        m2p_text.write(line_prefix + "# deselect new nodes\n" +
+                       "".join([line_prefix + "new_nodes[" + format_code_string(node.name) + "].select = False\n"
+                                for node in patch["added_nodes"]]) + "\n")
+    if is_tree_node_group:
+        m2p_text.write(line_prefix + "return new_node_group\n")
+    else:
+        m2p_text.write(line_prefix + "return new_nodes\n")
+
+    # add function call, the datablock must exist
+    if gen_options[CALL_FUNCTION_GEN_OPT]:
+        if is_tree_node_group:
+            m2p_text.write("\n# use Python script to patch node group\n" +
+                           "patch_group_nodes(bpy.data.node_groups[" + format_code_string(tree.name) + "])\n")
+        elif tree.kind == TREE_KIND_COMPOSITOR:
+            m2p_text.write("\n# use Python script to patch Compositor node tree\n" +
+                           "patch_shader_nodes(bpy.context.scene)\n")
+        else:
+            m2p_text.write("\n# use Python script to patch material\n" +
+                           "patch_shader_nodes(bpy.data." + TREE_KIND_COLLECTIONS[tree.kind] + "[" +
+                           format_code_string(tree.owner_name) + "])\n")
+    return counts
@@ -0,0 +1,207 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 3
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# Round-trip verification: export a node tree, run the exported script to re-create the tree in a scratch datablock,
+# and compare the re-created tree with the original (see tree_diff.py). Execution of the script is timed too, broken
+# down by node creation, attribute setting, and link creation. Runs headless, e.g. with batch_export.py --verify.
+
+import ast
+import time
+
+import bpy
+
+from .code_sink import StringSink
+from .codegen import WRITE_DEFAULTS_UNI_NODE_OPT, OUTPUT_STYLE_UNROLLED, make_gen_options, write_tree_code
+from .snapshot import capture_tree
+from .tree_diff import diff_trees, format_mismatch
+from .tree_ir import TREE_KIND_GROUP, TREE_KIND_COLLECTIONS
+
+# name of scratch datablocks that verified scripts create nodes in
+VERIFY_SCRATCH_NAME = ".m2p_verify"
+
+# phases of execution of generated scripts
+EXEC_PHASE_NODES = "nodes"
+EXEC_PHASE_ATTRIBUTES = "attributes"
+EXEC_PHASE_LINKS = "links"
+# time not spent in statements of the above phases, e.g. loop overhead and function calls
+EXEC_PHASE_OTHER = "other"
+EXEC_PHASE_ORDER = [EXEC_PHASE_NODES, EXEC_PHASE_ATTRIBUTES, EXEC_PHASE_LINKS, EXEC_PHASE_OTHER]
+
+# names of the node and link collection variables of generated scripts (see codegen.iter_write_tree_body)
+NODES_VAR_NAME = "tree_nodes"
+LINKS_VAR_NAME = "tree_links"
+
+# names of the timer function and phase times dict added to instrumented scripts
+CLOCK_VAR_NAME = "_m2p_clock"
+TIMES_VAR_NAME = "_m2p_times"
+START_VAR_NAME = "_m2p_start"
+
+# get the execution phase of a statement of a generated script, by the collection it calls new() on
+def get_statement_phase(statement):
+    for sub_node in ast.walk(statement):
+        if isinstance(sub_node, ast.Call) and isinstance(sub_node.func, ast.Attribute) and \
+                sub_node.func.attr == "new" and isinstance(sub_node.func.value, ast.Name):
+            if sub_node.func.value.id == NODES_VAR_NAME:
+                return EXEC_PHASE_NODES
+            elif sub_node.func.value.id == LINKS_VAR_NAME:
+                return EXEC_PHASE_LINKS
+    return EXEC_PHASE_ATTRIBUTES
+
+# get name of the function called by the statement, if the statement is only a call of a function by name, e.g. a call
+# of a shared node configuration function (see codegen.iter_write_shared_config_nodes), otherwise returns None
+def get_called_function_name(statement):
+    if isinstance(statement, ast.Expr) and isinstance(statement.value, ast.Call) and \
+            isinstance(statement.value.func, ast.Name):
+        return statement.value.func.id
+    return None
+
+# add timing code around each simple statement of the list of statements (recursing into loops and conditions),
+# returns new list of statements,
+# functions defined in the statements, and called by statements of their own, are instrumented instead of the
+# statements that call them, so time is counted once, in the phases of the statements of the function
+def instrument_statements(statements):
+    called_functions = set([get_called_function_name(statement) for statement in statements])
+    instrumented_functions = set([statement.name for statement in statements
+                                  if isinstance(statement, ast.FunctionDef) and statement.name in called_functions])
+    instrumented = []
+    for statement in statements:
+        if isinstance(statement, (ast.For, ast.While, ast.If, ast.With)):
+            statement.body = instrument_statements(statement.body)
+            if hasattr(statement, "orelse"):
+                statement.orelse = instrument_statements(statement.orelse)
+            instrumented.append(statement)
+        elif isinstance(statement, ast.FunctionDef) and statement.name in instrumented_functions:
+            statement.body = instrument_statements(statement.body)
+            instrumented.append(statement)
+        elif isinstance(statement, (ast.Return, ast.FunctionDef, ast.Import, ast.ImportFrom)) or \
+                get_called_function_name(statement) in instrumented_functions:
+            instrumented.append(statement)
+        else:
+            instrumented.extend(ast.parse("%s = %s()" % (START_VAR_NAME, CLOCK_VAR_NAME)).body)
+            instrumented.append(statement)
+            instrumented.extend(ast.parse("%s[%r] += %s() - %s" % (TIMES_VAR_NAME, get_statement_phase(statement),
+                                                                   CLOCK_VAR_NAME, START_VAR_NAME)).body)
+    return instrumented
+
+# compile generated script with timing code added to the statements of its functions, the script must be run with
+# globals from get_instrumented_globals()
+def compile_instrumented(code, filename):
+    module = ast.parse(code, filename)
+    for statement in module.body:
+        if isinstance(statement, ast.FunctionDef):
+            statement.body = instrument_statements(statement.body)
+    return compile(ast.fix_missing_locations(module), filename, "exec")
+
+def get_instrumented_globals():
+    return { CLOCK_VAR_NAME: time.perf_counter,
+             TIMES_VAR_NAME: { EXEC_PHASE_NODES: 0.0, EXEC_PHASE_ATTRIBUTES: 0.0, EXEC_PHASE_LINKS: 0.0 } }
+
+def get_scratch_collection(tree_kind):
+    return getattr(bpy.data, TREE_KIND_COLLECTIONS[tree_kind])
+
+# run the function defined by a generated script (script must be generated with call_function=False, see
+# codegen.make_gen_options) to create the nodes in a new scratch datablock, returns (scratch datablock, node tree,
+# seconds taken by the function)
+def run_script_function(code_obj, script_globals, tree_kind):
+    exec(code_obj, script_globals)
+    if tree_kind == TREE_KIND_GROUP:
+        # the function creates the scratch node group, which may be renamed (e.g. to ".m2p_verify.001") if a node group
+        # of the same name exists, so new node groups are found by pointer
+        old_keys = set([group.as_pointer() for group in bpy.data.node_groups])
+        try:
+            start_time = time.perf_counter()
+            scratch = script_globals["add_group_nodes"](VERIFY_SCRATCH_NAME)
+            exec_time = time.perf_counter() - start_time
+        except BaseException:
+            # remove the partly built scratch node group
+            for group in [group for group in bpy.data.node_groups if group.as_pointer() not in old_keys]:
+                remove_scratch(group, tree_kind)
+            raise
+        return scratch, scratch, exec_time
+    scratch = get_scratch_collection(tree_kind).new(VERIFY_SCRATCH_NAME)
+    scratch.use_nodes = True
+    try:
+        start_time = time.perf_counter()
+        script_globals["add_shader_nodes"](scratch)
+        exec_time = time.perf_counter() - start_time
+    except BaseException:
+        remove_scratch(scratch, tree_kind)
+        raise
+    return scratch, scratch.node_tree, exec_time
+
+def remove_scratch(scratch, tree_kind):
+    get_scratch_collection(tree_kind).remove(scratch)
+
+# export node tree to a script, run the script to re-create the tree in a scratch datablock, and compare the
+# re-created tree with the original, options are as in mat2py.create_code_text (the script always re-creates the tree
+# in a function, after deleting existing nodes), returns dict of results:
+#   "mismatches": list of mismatch descriptions (empty if the tree was re-created faithfully)
+#   "bytes", "compile_time", "exec_time": size of script, time to compile it, and time to run it
+#   "exec_times": time of each execution phase (see EXEC_PHASE_ORDER), measured by a second run of the script with
+#                 timers around each statement, and scaled to the time of the first (uninstrumented) run
+# scratch datablocks are removed after the script is run
+def verify_tree(node_tree, tree_owner, uni_node_options, space_pad=4, keep_links=False, ng_output_min_max_def=False,
+                use_socket_identifiers=False, output_style=OUTPUT_STYLE_UNROLLED, dedupe_configs=False):
+    elide_defaults = not uni_node_options[WRITE_DEFAULTS_UNI_NODE_OPT]
+    tree = capture_tree(node_tree, tree_owner, elide_defaults=elide_defaults)
+    gen_options = make_gen_options(space_pad, keep_links, True, True, ng_output_min_max_def, use_socket_identifiers,
+                                   output_style, call_function=False, dedupe_configs=dedupe_configs)
+    sink = StringSink()
+    write_tree_code(sink, tree, gen_options, uni_node_options)
+    code = sink.close()
+    filename = "<m2p verify " + tree.name + ">"
+
+    start_time = time.perf_counter()
+    code_obj = compile(code, filename, "exec")
+    compile_time = time.perf_counter() - start_time
+    scratch, scratch_tree, exec_time = run_script_function(code_obj, {}, tree.kind)
+    try:
+        # compare full captures, i.e. without skipping default values, so values left at default by the script are
+        # compared too
+        expected = tree if not elide_defaults else capture_tree(node_tree, tree_owner)
+        actual = capture_tree(scratch_tree, scratch)
+    finally:
+        remove_scratch(scratch, tree.kind)
+    mismatches = diff_trees(expected, actual, uni_node_options, ng_output_min_max_def)
+
+    script_globals = get_instrumented_globals()
+    scratch, _, instrumented_time = run_script_function(compile_instrumented(code, filename), script_globals,
+                                                        tree.kind)
+    remove_scratch(scratch, tree.kind)
+    exec_times = {}
+    phase_times = script_globals[TIMES_VAR_NAME]
+    for phase in [EXEC_PHASE_NODES, EXEC_PHASE_ATTRIBUTES, EXEC_PHASE_LINKS]:
+        exec_times[phase] = phase_times[phase] * exec_time / instrumented_time if instrumented_time > 0.0 else 0.0
+    exec_times[EXEC_PHASE_OTHER] = max(0.0, exec_time - sum(exec_times.values()))
+    return {
+        "mismatches": [format_mismatch(m) for m in mismatches],
+        "bytes": len(code.encode()),
+        "compile_time": compile_time,
+        "exec_time": exec_time,
+        "exec_times": exec_times,
+    }
+
+# get summary of verify results as a list of lines of text (without line endings)
+def get_verify_summary(result):
+    summary = ["%s, %d mismatches, %d bytes, compile %.1f ms, exec %.1f ms" % (
+        "OK" if len(result["mismatches"]) == 0 else "MISMATCH", len(result["mismatches"]), result["bytes"],
+        result["compile_time"] * 1000, result["exec_time"] * 1000)]
+    for phase in EXEC_PHASE_ORDER:
+        summary.append("  %s: %.1f ms" % (phase, result["exec_times"][phase] * 1000))
+    summary.extend(["  " + m for m in result["mismatches"]])
+    return summary
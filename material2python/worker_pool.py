@@ -0,0 +1,80 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 3
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# Pool of worker processes for pure Python work on captured trees (see tree_ir.py), e.g. code generation of very large
+# trees (see codegen.iter_write_parallel_nodes). Work is split into chunks given by ranges of item indices, and the
+# results of chunks are returned in order. Workers are forked, so they inherit the captured tree and other shared
+# state (see worker_state) instead of receiving it pickled with each chunk, and they do not import the addon again
+# (the addon's package imports bpy, which is only available in Blender's own process). Fork is not safe in GUI
+# processes, so workers are used only in background Blender (see mat2py.iter_create_code_text), and never on macOS.
+# This module must not import bpy.
+
+import multiprocessing
+import os
+import sys
+
+# minimum number of nodes of a tree for work in worker processes, smaller trees are faster in one process, because
+# starting workers and sending results takes longer than the work itself
+PARALLEL_MIN_NODES = 2000
+# chunks of work per worker process, more chunks balance the load between workers better, but the result of each chunk
+# is sent back separately
+CHUNKS_PER_WORKER = 4
+PARALLEL_START_METHOD = "fork"
+
+# state shared with the worker processes, set before the workers are forked, and cleared when the work is done
+worker_state = {}
+
+def is_parallel_supported():
+    return sys.platform != "darwin" and PARALLEL_START_METHOD in multiprocessing.get_all_start_methods()
+
+# get number of worker processes to use for work on a tree with 'num_nodes' nodes, where 'num_workers' is the number
+# of workers wanted (0 is one worker per CPU), returns 1 if the work must run in one process, i.e. if the tree is
+# smaller than PARALLEL_MIN_NODES, or worker processes are not supported
+def get_num_workers(num_workers, num_nodes):
+    if num_workers == 0:
+        num_workers = os.cpu_count() or 1
+    if num_workers < 2 or num_nodes < PARALLEL_MIN_NODES or not is_parallel_supported():
+        return 1
+    return num_workers
+
+# split 'num_items' items into at most 'num_chunks' chunks of about equal size, returns list of (start, end) index
+# ranges, in order
+def get_chunk_ranges(num_items, num_chunks):
+    chunk_size = max(1, -(-num_items // max(1, num_chunks)))
+    return [(start, min(num_items, start + chunk_size)) for start in range(0, num_items, chunk_size)]
+
+def run_task(task):
+    func, start, end = task
+    return func(start, end)
+
+# run tasks in 'num_workers' worker processes, where each task is (function, start index, end index), and the function
+# is a module level function (so it can be sent to the workers by name) that reads shared state from worker_state,
+# 'state' is the shared state, yields results of tasks in order of tasks, as soon as they are done, if the generator is
+# closed before it is finished (e.g. export is cancelled) then the workers are stopped
+def iter_run_tasks(tasks, state, num_workers):
+    worker_state.update(state)
+    try:
+        pool = multiprocessing.get_context(PARALLEL_START_METHOD).Pool(num_workers)
+        try:
+            for result in pool.imap(run_task, tasks):
+                yield result
+        finally:
+            pool.terminate()
+            pool.join()
+    finally:
+        worker_state.clear()